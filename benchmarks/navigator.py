@@ -0,0 +1,90 @@
+"""Measures how long the navigator takes to follow changes to the connections.
+
+A headless app shows a `ConnectionTree` of thousands of saved connections,
+then one connection is added, renamed and deleted, the way the app does
+after each is saved. The time taken by the tree to bring its nodes up to
+date is reported for the first load and for each single change. Exits with
+a non-zero status when the median time of a single change exceeds the
+budget, so it can gate changes.
+
+    python benchmarks/navigator.py --connections 3000 --runs 20 --budget 20
+"""
+
+import argparse
+import statistics
+import sys
+from time import monotonic
+
+from textual.app import App, ComposeResult
+
+from textgres.connection import Connection
+from textgres.widgets.connections.navigator import ConnectionTree
+
+class NavigatorBenchmark(App[None]):
+    def __init__(self, connections: int, runs: int) -> None:
+        super().__init__()
+        self.count = connections
+        self.runs = runs
+        self.timings: dict[str, list[float]] = {"load": [], "add": [], "edit": [], "delete": []}
+
+    def compose(self) -> ComposeResult:
+        yield ConnectionTree(label="connection")
+
+    def timed(self, operation: str, connections: list[Connection]) -> None:
+        tree = self.query_one(ConnectionTree)
+        started = monotonic()
+        tree.connections = connections
+        self.timings[operation].append((monotonic() - started) * 1000)
+
+    async def measure(self) -> None:
+        for run in range(self.runs):
+            connections = [
+                Connection(id=id, name="endpoint-{}".format(id), host="db-{}.internal".format(id))
+                for id in range(1, self.count + 1)
+            ]
+            self.timed("load", connections)
+
+            added = Connection(id=self.count + 1, name="endpoint-new")
+            connections = [*connections, added]
+            self.timed("add", connections)
+
+            # Edits happen in place, as in `ConnectionModal`
+            edited = connections[len(connections) // 2]
+            edited.name = "{}-renamed".format(edited.name)
+            self.timed("edit", list(connections))
+
+            self.timed("delete", [c for c in connections if c.id != added.id])
+
+            # Starts the next run from an empty tree
+            self.timed("load", [])
+            self.timings["load"].pop()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=20.0, help="in milliseconds")
+    args = parser.parse_args()
+
+    app = NavigatorBenchmark(args.connections, args.runs)
+
+    async def run(pilot) -> None:
+        await app.measure()
+        app.exit()
+
+    app.run(headless=True, auto_pilot=run)
+
+    print("{:,} connections, {} runs".format(args.connections, args.runs))
+    for operation, timings in app.timings.items():
+        print("{:<7} {:.2f} ms (median), {:.2f} ms (max)".format(
+            operation + ":", statistics.median(timings), max(timings)
+        ))
+
+    change = max(statistics.median(app.timings[operation]) for operation in ("add", "edit", "delete"))
+    if change > args.budget:
+        print("over budget of {:.0f} ms".format(args.budget))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
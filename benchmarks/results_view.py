@@ -0,0 +1,83 @@
+"""Measures how long the results grid takes to sort, filter and search rows
+already loaded on the client.
+
+A result of integer, float, text, nullable integer and date columns is
+built in memory, then each column is sorted both ways, a filter is applied
+to the sorted rows and the rows are searched. The first sort of a column
+builds its index; later sorts in either direction reuse it. Exits with a
+non-zero status when re-sorting exceeds its budget, or the first sort of a
+column exceeds its own, so it can gate changes.
+
+    python benchmarks/results_view.py --rows 1000000 --budget 100 --index-budget 2000
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+from time import monotonic
+
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_view import ResultView, parse_filter
+
+COLUMNS = ["id", "score", "name", "age", "day"]
+
+def build(rows: int) -> ColumnarBuffer:
+    random.seed(0)
+    start = date(2020, 1, 1)
+    buffer = ColumnarBuffer(COLUMNS)
+    # Added a page at a time, as the grid loads them
+    for offset in range(0, rows, 10000):
+        buffer.extend([
+            (
+                i,
+                random.random(),
+                "customer-{}".format(random.randint(0, 99999)),
+                None if i % 10 == 0 else random.randint(18, 90),
+                start + timedelta(days=i % 1000),
+            )
+            for i in range(offset, min(offset + 10000, rows))
+        ])
+    return buffer
+
+def timed(function) -> float:
+    started = monotonic()
+    function()
+    return (monotonic() - started) * 1000
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--budget", type=float, default=100.0, help="of re-sorting, in milliseconds")
+    parser.add_argument("--index-budget", type=float, default=2000.0, help="of a first sort, in milliseconds")
+    args = parser.parse_args()
+
+    buffer = build(args.rows)
+    view = ResultView(buffer)
+    print("{:,} rows".format(args.rows))
+
+    slowest_first = slowest_again = 0.0
+    for index, name in enumerate(COLUMNS):
+        first = timed(lambda: view.compute((index, False), []))
+        again = timed(lambda: view.compute((index, True), []))
+        slowest_first = max(slowest_first, first)
+        slowest_again = max(slowest_again, again)
+        print("sort {:<6} {:7.0f} ms first, {:5.0f} ms reversed".format(name + ":", first, again))
+
+    filters = parse_filter("age >= 30 and name ~ customer-1 and day < 2021-06-01", COLUMNS)
+    print("filter:      {:7.0f} ms".format(timed(lambda: view.compute((1, True), filters))))
+    print("search:      {:7.0f} ms first, {:5.0f} ms again".format(
+        timed(lambda: view.search("4242")),
+        timed(lambda: view.search("99")),
+    ))
+
+    if slowest_again > args.budget:
+        print("re-sorting over budget of {:.0f} ms".format(args.budget))
+        return 1
+    if slowest_first > args.index_budget:
+        print("first sort over budget of {:.0f} ms".format(args.index_budget))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
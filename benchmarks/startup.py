@@ -0,0 +1,76 @@
+"""Measures how long `textgres` takes to show its first frame.
+
+Each run starts a fresh interpreter which runs the app headless and exits as
+soon as the first frame has been rendered. The time from spawning the process
+to that frame (interpreter startup included) is reported, along with the time
+taken to import the CLI entry point. Exits with a non-zero status when the
+median time to first frame exceeds the budget, so it can gate changes.
+
+    python benchmarks/startup.py --runs 10 --budget 200
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import monotonic
+
+# Run in the child; prints the monotonic clock once the entry point is
+# imported and once the first frame is up. CLOCK_MONOTONIC is shared across
+# processes, so the parent can compare it to its own.
+FIRST_FRAME_SCRIPT = """
+import asyncio
+from time import monotonic
+from textgres.__main__ import make_textgres
+imported = monotonic()
+
+async def first_frame(pilot):
+    refreshed = asyncio.Event()
+    pilot.app.screen.call_after_refresh(refreshed.set)
+    await refreshed.wait()
+    print(imported, monotonic())
+    pilot.app.exit()
+
+make_textgres().run(headless=True, auto_pilot=first_frame)
+"""
+
+def measure(directory: str) -> tuple[float, float]:
+    started = monotonic()
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_FRAME_SCRIPT],
+        cwd=directory,
+        env={**os.environ, "XDG_DATA_HOME": directory},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    imported, first_frame = (float(value) for value in output.split()[-2:])
+    return (imported - started) * 1000, (first_frame - started) * 1000
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=200.0, help="in milliseconds")
+    args = parser.parse_args()
+
+    # Runs against an empty connection store rather than the user's own
+    with tempfile.TemporaryDirectory() as directory:
+        # The first run warms the bytecode and filesystem caches
+        measure(directory)
+        results = [measure(directory) for _ in range(args.runs)]
+
+    imports = statistics.median(imported for imported, _ in results)
+    first_frames = [first_frame for _, first_frame in results]
+    first_frame = statistics.median(first_frames)
+    print("import:      {:.0f} ms (median)".format(imports))
+    print("first frame: {:.0f} ms (median), {:.0f} ms (max)".format(first_frame, max(first_frames)))
+
+    if first_frame > args.budget:
+        print("over budget of {:.0f} ms".format(args.budget))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
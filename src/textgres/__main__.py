@@ -1,8 +1,18 @@
 import click
+import os
+import sys
+from contextlib import redirect_stdout
 from click_default_group import DefaultGroup
+from time import monotonic
+from typing import TYPE_CHECKING
 
-from textgres.app import Textgres
-from textgres.connection import Connection
+# The app is imported by the commands that run it, so that parsing arguments
+# doesn't pay for loading Textual
+if TYPE_CHECKING:
+    from textgres.app import Textgres
+
+# How often `run` reports its progress on an interactive terminal, in seconds
+PROGRESS_INTERVAL = 1.0
 
 @click.group(cls=DefaultGroup, default="default", default_if_no_args=True)
 def cli() -> None:
@@ -11,7 +21,182 @@ def cli() -> None:
 @cli.command()
 def default() -> None:
     app = make_textgres()
-    app.run()
+    try:
+        app.run()
+    finally:
+        from textgres.store import ConnectionStore
+
+        # Writes the history entries still queued
+        app.history.close()
+        ConnectionStore.default().close()
+
+@cli.command()
+@click.argument("connection_name")
+@click.argument("sql_file", type=click.File("r"), default="-")
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    type=click.Choice(["csv", "jsonl", "columnar"]),
+    default="csv",
+    show_default=True,
+    help="Output format; columnar is textgres' compact binary format.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
+    default="-",
+    help="File to write the rows to. Defaults to stdout.",
+)
+@click.option(
+    "--itersize",
+    type=click.IntRange(min=1),
+    default=10000,
+    show_default=True,
+    help="Rows fetched from the server per round-trip.",
+)
+@click.option("-q", "--quiet", is_flag=True, help="Don't report progress on stderr.")
+def run(
+    connection_name: str,
+    sql_file: click.File,
+    output_format: str,
+    output: str,
+    itersize: int,
+    quiet: bool,
+) -> None:
+    """Run the SQL in SQL_FILE (or stdin) on a saved connection without the
+    TUI, streaming the rows it returns to a file or stdout."""
+    import psycopg2
+    import sqlite3
+    from textgres.connection import Connection
+    from textgres.export import WRITERS, write_stream
+    from textgres.store import ConnectionStore
+
+    # Outside the app, Textual's log prints to stdout, where it would mix
+    # with the rows; it still goes to TEXTUAL_LOG if that is set
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            connections = Connection.load()
+    except sqlite3.Error as e:
+        raise click.ClickException(f"can't read the saved connections: {e}")
+    finally:
+        # The store is only needed to find the connection
+        ConnectionStore.default().close()
+
+    connection = next((c for c in connections if c.name == connection_name), None)
+    if connection is None:
+        raise click.BadParameter(
+            f"no saved connection named \"{connection_name}\"",
+            param_hint="CONNECTION_NAME",
+        )
+
+    query = sql_file.read()
+    if not query.strip():
+        raise click.UsageError("no SQL to run")
+
+    report = not quiet and sys.stderr.isatty()
+    started = monotonic()
+    last_report = started
+
+    def progress(rows: int) -> None:
+        nonlocal last_report
+        now = monotonic()
+        if report and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            click.echo(f"\r{rows:,} rows ({rows / (now - started):,.0f} rows/s)", err=True, nl=False)
+
+    writer_type = WRITERS[output_format]
+    try:
+        file = click.open_file(output, "wb" if writer_type.binary else "w")
+    except OSError as e:
+        raise click.FileError(output, e.strerror)
+
+    try:
+        with file, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            try:
+                stream = connection.stream(query, itersize)
+                # Nothing is written for statements which don't return rows
+                rows = write_stream(stream, writer_type(file), progress)
+            finally:
+                connection.disconnect()
+    except psycopg2.Error as e:
+        raise click.ClickException(str(e).strip())
+    except OSError as e:
+        # Such as the reader of stdout going away
+        raise click.ClickException(f"can't write the rows: {e.strerror or e}")
+    except Exception as e:
+        raise click.ClickException(f"{type(e).__name__}: {e}")
+
+    elapsed = monotonic() - started
+    if quiet:
+        return
+    if report:
+        # Clears the progress line
+        click.echo("\r\x1b[K", err=True, nl=False)
+    if stream.columns:
+        click.echo(f"{rows:,} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)", err=True)
+    else:
+        click.echo(f"{max(stream.rowcount, 0):,} rows affected in {elapsed:.2f}s", err=True)
+
+@cli.command("import")
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "-f",
+    "--format",
+    "file_format",
+    type=click.Choice(["yaml", "pgpass", "service"]),
+    help="Format of FILE; guessed from its name when not given.",
+)
+def import_connections(file: click.File, file_format: str) -> None:
+    """Save the connections defined in FILE: a YAML list of connections, a
+    pgpass file or a pg_service.conf file. Connections with the name of a
+    saved connection replace it. Everything is saved in one transaction."""
+    from textgres.connection_files import guess_format, read_connections
+    from textgres.store import ConnectionStore
+
+    file_format = file_format or guess_format(file.name)
+    if file_format is None:
+        raise click.BadParameter("can't tell the format of the file; use --format", param_hint="FILE")
+
+    try:
+        connections = read_connections(file, file_format)
+    except ValueError as e:
+        raise click.ClickException(str(e).strip())
+
+    store = ConnectionStore.default()
+    try:
+        added, updated = store.save_many([connection.values for connection in connections])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        store.close()
+    click.echo(f"{added:,} connections added, {updated:,} updated", err=True)
+
+@cli.command("export")
+@click.argument("file", type=click.File("w"), default="-")
+@click.option(
+    "-f",
+    "--format",
+    "file_format",
+    type=click.Choice(["yaml", "pgpass", "service"]),
+    help="Format of FILE; guessed from its name when not given, else YAML.",
+)
+@click.option("--passwords", is_flag=True, help="Include the passwords, in plain text.")
+def export_connections(file: click.File, file_format: str, passwords: bool) -> None:
+    """Write every saved connection to FILE (or stdout), without passwords
+    unless asked for."""
+    from textgres.connection import Connection
+    from textgres.connection_files import guess_format, write_connections
+    from textgres.store import ConnectionStore
+
+    file_format = file_format or guess_format(file.name) or "yaml"
+    try:
+        write_connections(Connection.load(), file, file_format, passwords=passwords)
+    finally:
+        ConnectionStore.default().close()
+
+def make_textgres() -> "Textgres":
+    from textgres.app import Textgres
 
-def make_textgres() -> Textgres:
-    return Textgres()
\ No newline at end of file
+    return Textgres()
@@ -0,0 +1,243 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from textual import log
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# The longest query text fetched per backend; the rest is cut off on the
+# server so that thousands of backends don't ship their full statements
+QUERY_TEXT_LENGTH = 256
+
+# pg_stat_activity is read once per poll. pg_blocking_pids is costly, so it
+# is only called for backends waiting on a lock, and per-backend lock counts
+# are aggregated on the server. Idle backends are left out unless asked for,
+# except those blocking others.
+ACTIVITY_QUERY = """
+WITH activity AS (
+  SELECT
+    a.pid,
+    a.usename,
+    a.datname,
+    a.application_name,
+    a.client_addr::text AS client_addr,
+    a.backend_type,
+    a.state,
+    a.wait_event_type,
+    a.wait_event,
+    extract(epoch FROM now() - a.xact_start) AS xact_age,
+    extract(epoch FROM now() - a.query_start) AS query_age,
+    left(a.query, %(query_length)s) AS query,
+    CASE WHEN a.wait_event_type = 'Lock' THEN pg_catalog.pg_blocking_pids(a.pid) END AS blocked_by
+  FROM pg_catalog.pg_stat_activity a
+  WHERE a.pid <> pg_catalog.pg_backend_pid()
+),
+locks AS (
+  SELECT l.pid, count(*) AS held, count(*) FILTER (WHERE NOT l.granted) AS waiting
+  FROM pg_catalog.pg_locks l
+  WHERE l.pid IS NOT NULL
+  GROUP BY l.pid
+)
+SELECT
+  a.pid, a.usename, a.datname, a.application_name, a.client_addr,
+  a.backend_type, a.state, a.wait_event_type, a.wait_event,
+  a.xact_age, a.query_age, a.query, a.blocked_by,
+  coalesce(l.held, 0), coalesce(l.waiting, 0)
+FROM activity a
+LEFT JOIN locks l ON l.pid = a.pid
+WHERE %(show_idle)s
+  OR (a.state IS NOT NULL AND a.state <> 'idle')
+  OR a.pid IN (SELECT unnest(b.blocked_by) FROM activity b WHERE b.blocked_by IS NOT NULL)
+ORDER BY a.pid
+"""
+
+CANCEL_BACKEND_QUERY = "SELECT pg_catalog.pg_cancel_backend(%s)"
+TERMINATE_BACKEND_QUERY = "SELECT pg_catalog.pg_terminate_backend(%s)"
+
+@dataclass
+class Backend:
+    pid: int
+    user: Optional[str]
+    database: Optional[str]
+    application: Optional[str]
+    client: Optional[str]
+    backend_type: Optional[str]
+    state: Optional[str]
+    wait_event_type: Optional[str]
+    wait_event: Optional[str]
+    # Seconds since the transaction and the current query started
+    xact_age: Optional[float]
+    query_age: Optional[float]
+    query: Optional[str]
+    locks_held: int = 0
+    locks_waiting: int = 0
+    # The backends this one waits on, see `pg_blocking_pids`
+    blocked_by: list[int] = field(default_factory=list)
+    # Set by `compute_blocking`: how many backends wait on this one,
+    # directly or not, and how far below a root blocker it is shown
+    blocking: int = 0
+    depth: int = 0
+
+    @property
+    def root_blocker(self) -> bool:
+        return self.blocking > 0 and not self.blocked_by
+
+    @property
+    def wait(self) -> Optional[str]:
+        if self.wait_event_type is None:
+            return None
+        return "{}:{}".format(self.wait_event_type, self.wait_event)
+
+@dataclass
+class ActivitySnapshot:
+    # Keyed by pid, in the order of `order_by_blocking`
+    backends: dict[int, Backend]
+
+    @property
+    def active(self) -> int:
+        return sum(1 for backend in self.backends.values() if backend.state == "active")
+
+    @property
+    def waiting_on_locks(self) -> int:
+        return sum(1 for backend in self.backends.values() if backend.blocked_by)
+
+    @property
+    def root_blockers(self) -> list[Backend]:
+        roots = [backend for backend in self.backends.values() if backend.root_blocker]
+        return sorted(roots, key=lambda backend: backend.blocking, reverse=True)
+
+    def wait_events(self, limit: int = 5) -> list[tuple[str, int]]:
+        # The most common wait events of active backends; idle ones all wait
+        # on the client
+        counts = Counter(
+            backend.wait
+            for backend in self.backends.values()
+            if backend.wait is not None and backend.state != "idle"
+        )
+        return counts.most_common(limit)
+
+def compute_blocking(backends: dict[int, Backend]) -> dict[int, Backend]:
+    """Counts the waiters of each backend and orders the backends as a tree
+    of waits.
+
+    Each backend which waits on none of the others is followed by the
+    backends waiting on it, each followed by its own waiters, and so on;
+    `depth` is set to the level a backend is shown at. A backend waiting on
+    several others is shown under the first of them only. Lock cycles are
+    possible until the deadlock detector runs, so each walk stops at
+    backends already seen, and backends which only wait on each other are
+    shown from the lowest pid of their cycle.
+    """
+    waiters: dict[int, list[int]] = {}
+    for backend in backends.values():
+        for pid in backend.blocked_by:
+            if pid in backends:
+                waiters.setdefault(pid, []).append(backend.pid)
+
+    for pid, backend in backends.items():
+        seen = {pid}
+        frontier = list(waiters.get(pid, []))
+        while frontier:
+            waiter = frontier.pop()
+            if waiter in seen:
+                continue
+            seen.add(waiter)
+            frontier.extend(waiters.get(waiter, []))
+        backend.blocking = len(seen) - 1
+
+    ordered: dict[int, Backend] = {}
+
+    def add_tree(root: int) -> None:
+        stack = [(root, 0)]
+        while stack:
+            pid, depth = stack.pop()
+            if pid in ordered:
+                continue
+            backend = ordered[pid] = backends[pid]
+            backend.depth = depth
+            # Reversed, so that waiters are shown in pid order
+            stack.extend((waiter, depth + 1) for waiter in reversed(waiters.get(pid, [])))
+
+    for pid, backend in backends.items():
+        if not any(blocker in backends for blocker in backend.blocked_by):
+            add_tree(pid)
+    for pid in sorted(backends):
+        add_tree(pid)
+    return ordered
+
+class ActivityMonitor:
+    """Polls the server activity of a connection.
+
+    Polls run on a dedicated session in autocommit mode, outside the
+    connection's pool, so that each poll sees fresh statistics and the
+    monitor keeps working while every pooled session is busy. The session is
+    reopened on the next poll if it is lost.
+    """
+
+    def __init__(self, connection: "Connection") -> None:
+        self.connection = connection
+        self._conn = None
+        # Polls and backend actions are sent from worker threads
+        self._lock = threading.Lock()
+
+    def _session(self):
+        if self._conn is None or self._conn.closed:
+            log("Opening monitor session for '{}'".format(self.connection.name))
+            self._conn = self.connection.open()
+            self._conn.autocommit = True
+        return self._conn
+
+    def poll(self, show_idle: bool = False) -> ActivitySnapshot:
+        with self._lock:
+            with self._session().cursor() as cur:
+                cur.execute(
+                    ACTIVITY_QUERY,
+                    {"query_length": QUERY_TEXT_LENGTH, "show_idle": show_idle},
+                )
+                rows = cur.fetchall()
+
+        backends = {}
+        for row in rows:
+            (pid, user, database, application, client, backend_type, state,
+             wait_event_type, wait_event, xact_age, query_age, query, blocked_by,
+             locks_held, locks_waiting) = row
+            backends[pid] = Backend(
+                pid=pid,
+                user=user,
+                database=database,
+                application=application,
+                client=client,
+                backend_type=backend_type,
+                state=state,
+                wait_event_type=wait_event_type,
+                wait_event=wait_event,
+                xact_age=None if xact_age is None else float(xact_age),
+                query_age=None if query_age is None else float(query_age),
+                query=query,
+                locks_held=locks_held,
+                locks_waiting=locks_waiting,
+                blocked_by=list(blocked_by or []),
+            )
+        return ActivitySnapshot(compute_blocking(backends))
+
+    def cancel(self, pid: int) -> bool:
+        return self._signal(CANCEL_BACKEND_QUERY, pid)
+
+    def terminate(self, pid: int) -> bool:
+        return self._signal(TERMINATE_BACKEND_QUERY, pid)
+
+    def _signal(self, query: str, pid: int) -> bool:
+        # Returns whether the backend was signalled; false when it has
+        # already gone
+        with self._lock:
+            with self._session().cursor() as cur:
+                cur.execute(query, (pid,))
+                return bool(cur.fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.close()
+            self._conn = None
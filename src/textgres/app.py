@@ -1,21 +1,29 @@
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-from textual import log, on
+from textual import log, on, work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.containers import Horizontal, Vertical
 from textual.reactive import Reactive, reactive
 from textual.screen import Screen
+from textual.widget import Widget
 from textual.widgets import Footer, Label
 
-from textgres.connection import Connection
+from textgres.executor import execute_fanout, execute_query, execute_script
+from textgres.history import HistoryEntry, QueryHistory
+from textgres.result_cache import ResultCache
 from textgres.widgets.connections.navigator import (
     ConnectionTree,
     Navigator
 )
+from textgres.widgets.query.autocomplete import SqlAutoComplete
 from textgres.widgets.query.query_area import QueryArea, QueryTextArea
 from textgres.widgets.results.results_area import ResultsArea
 
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
 class AppHeader(Horizontal):
     """The header of the app."""
 
@@ -48,9 +56,17 @@ class Textgres(App[None]):
     CSS_PATH = Path(__file__).parent / "textgres.scss"
     BINDINGS = [
         Binding("ctrl+j", "toggle_navigator", "Show/Hide Navigator"),
+        Binding("ctrl+o", "show_history", "History"),
     ]
 
-    connections: Reactive[list[Connection]] = reactive(Connection.load())
+    # Loaded once the first frame is shown; see `on_mount`. Connections are
+    # edited in place, so watchers run even when the list compares equal.
+    connections: Reactive[list["Connection"]] = reactive(list, always_update=True)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.history = QueryHistory()
+        self.result_cache = ResultCache.from_environment()
 
     def compose(self) -> ComposeResult:
         yield AppHeader()
@@ -59,12 +75,55 @@ class Textgres(App[None]):
             yield QueryArea().data_bind(Textgres.connections)
             yield ResultsArea()
         yield Footer()
+        yield SqlAutoComplete(
+            target="QueryTextArea",
+            index=lambda: self.query_area.completion_index,
+        )
+
+    def on_mount(self) -> None:
+        self.call_after_refresh(self.load_connections)
+
+    @work(thread=True, exclusive=True, group="startup")
+    def load_connections(self) -> None:
+        # Importing the connection module pulls in psycopg2 and pydantic, so
+        # it is done here rather than before the first frame
+        from textgres.connection import Connection
+
+        try:
+            connections = Connection.load()
+        except Exception as e:
+            log.error(e)
+            self.call_from_thread(
+                self.notify,
+                title="Connections error",
+                message=f"Could not load saved connections: {e}",
+                severity="error",
+                timeout=5,
+            )
+            return
+
+        self.call_from_thread(setattr, self, "connections", connections)
 
     def action_toggle_navigator(self) -> None:
         self.navigator.toggle_class("hidden")
         if self.navigator.has_class("hidden") and self.navigator.connection_tree.has_focus:
             self.screen.focus_next()
 
+    async def action_show_history(self) -> None:
+        from textgres.widgets.history_modal import HistoryModal
+
+        def _handle_history_entry(entry: Optional[HistoryEntry]) -> None:
+            if entry is not None:
+                self.query_area.load_query(entry.query, entry.connection_id)
+
+        await self.push_screen(
+            HistoryModal(
+                self.history,
+                {connection.id: connection.name for connection in self.connections},
+            ),
+            callback=_handle_history_entry,
+        )
+
     @on(ConnectionTree.ConnectionAdded)
     def on_connection_added(self, event: ConnectionTree.ConnectionAdded) -> None:
         connection = event.connection
@@ -84,10 +143,13 @@ class Textgres(App[None]):
         connection = event.connection
 
         connection.save()
-        connections = [c if c != connection else connection for c in self.connections]
-        log(self.connections)
-        self.connections = connections
-        log(self.connections)
+        # The connection may now point at another database, so its sessions,
+        # catalog and completions go with its cached results
+        connection.reconfigure()
+        self.result_cache.invalidate(connection.id)
+        # Matched by id rather than by comparing every field of every
+        # connection
+        self.connections = [connection if c.id == connection.id else c for c in self.connections]
 
         self.notify(
             title="Connection updated",
@@ -100,8 +162,8 @@ class Textgres(App[None]):
         connection = event.connection
 
         connection.delete()
-        connections = [c for c in self.connections if c != connection]
-        self.connections = connections
+        self.result_cache.invalidate(connection.id)
+        self.connections = [c for c in self.connections if c.id != connection.id]
 
         self.notify(
             title="Connection deleted",
@@ -109,10 +171,61 @@ class Textgres(App[None]):
             timeout=5,
         )
 
+    @on(QueryArea.QuerySubmitted)
+    def on_query_submitted(self, event: QueryArea.QuerySubmitted) -> None:
+        # The targets are resolved here as the DOM must not be queried from
+        # the worker thread
+        targets = [self.query_area, self.results_area]
+        self.run_query(event.connection, event.query, targets, event.use_cache, event.previews)
+
+    @work(thread=True, exclusive=True, group="query")
+    def run_query(
+        self,
+        connection: "Connection",
+        query: str,
+        targets: list[Widget],
+        use_cache: bool = True,
+        previews: bool = False,
+    ) -> None:
+        execute_query(connection, query, targets, self.history, self.result_cache, use_cache, previews)
+
+    @on(QueryArea.ScriptSubmitted)
+    def on_script_submitted(self, event: QueryArea.ScriptSubmitted) -> None:
+        targets = [self.query_area, self.results_area]
+        self.run_script(event.connection, event.statements, targets, event.autocommit, event.batch)
+
+    @work(thread=True, exclusive=True, group="query")
+    def run_script(
+        self,
+        connection: "Connection",
+        statements: list[str],
+        targets: list[Widget],
+        autocommit: bool = False,
+        batch: bool = False,
+    ) -> None:
+        execute_script(connection, statements, targets, self.history, self.result_cache, autocommit, batch)
+
+    @on(QueryArea.FanoutSubmitted)
+    def on_fanout_submitted(self, event: QueryArea.FanoutSubmitted) -> None:
+        targets = [self.query_area, self.results_area]
+        self.run_fanout(event.connections, event.query, targets)
+
+    @work(thread=True, exclusive=True, group="query")
+    def run_fanout(self, connections: list["Connection"], query: str, targets: list[Widget]) -> None:
+        execute_fanout(connections, query, targets, self.history, self.result_cache)
+
     @property
     def navigator(self) -> Navigator:
         return self.query_one(Navigator)
 
+    @property
+    def query_area(self) -> QueryArea:
+        return self.query_one(QueryArea)
+
+    @property
+    def results_area(self) -> ResultsArea:
+        return self.query_one(ResultsArea)
+
 if __name__ == "__main__":
     app = Textgres()
     app.run()
\ No newline at end of file
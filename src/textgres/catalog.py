@@ -0,0 +1,402 @@
+import json
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass, field
+from textual import log
+from typing import TYPE_CHECKING, Optional
+
+from textgres.completion import CompletionIndex
+from textgres.health import SchemaHealth, load_schema_health
+from textgres.store import ConnectionStore
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+SCHEMAS_QUERY = """
+SELECT n.oid, n.nspname
+FROM pg_catalog.pg_namespace n
+WHERE n.nspname NOT LIKE 'pg\\_toast%'
+  AND n.nspname NOT LIKE 'pg\\_temp\\_%'
+ORDER BY n.nspname IN ('pg_catalog', 'information_schema'), n.nspname
+"""
+
+# Relations and functions of a schema are fetched together
+SCHEMA_OBJECTS_QUERY = """
+SELECT c.oid, c.relname, c.relkind::text, NULL
+FROM pg_catalog.pg_class c
+WHERE c.relnamespace = %(schema)s
+  AND c.relkind IN ('r', 'p', 'f', 'v', 'm')
+UNION ALL
+SELECT p.oid, p.proname, 'function', pg_catalog.pg_get_function_identity_arguments(p.oid)
+FROM pg_catalog.pg_proc p
+WHERE p.pronamespace = %(schema)s
+ORDER BY 2
+"""
+
+# Columns and indexes of a relation are fetched together
+RELATION_DETAILS_QUERY = """
+SELECT 'column', a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod), a.attnotnull, a.attnum
+FROM pg_catalog.pg_attribute a
+WHERE a.attrelid = %(relation)s
+  AND a.attnum > 0
+  AND NOT a.attisdropped
+UNION ALL
+SELECT 'index', c.relname, pg_catalog.pg_get_indexdef(i.indexrelid), i.indisprimary, 0
+FROM pg_catalog.pg_index i
+JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = %(relation)s
+ORDER BY 1, 5, 2
+"""
+
+# Every schema, relation and function of the database; columns are fetched
+# separately so that only changed relations need to be re-read. A relation's
+# pg_class xmin changes whenever it is altered, and the sum of its columns'
+# xmins whenever one is added, renamed, retyped or dropped, which together
+# make a cheap version number.
+SNAPSHOT_QUERY = """
+SELECT 'schema', n.oid, NULL, n.nspname, NULL, NULL
+FROM pg_catalog.pg_namespace n
+WHERE n.nspname NOT LIKE 'pg\\_toast%'
+  AND n.nspname NOT LIKE 'pg\\_temp\\_%'
+UNION ALL
+SELECT 'relation', c.oid, n.nspname, c.relname, c.relkind::text, c.xmin::text || ':' || coalesce((
+  SELECT sum(a.xmin::text::bigint)
+  FROM pg_catalog.pg_attribute a
+  WHERE a.attrelid = c.oid
+    AND a.attnum > 0
+), 0)
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p', 'f', 'v', 'm')
+  AND n.nspname NOT LIKE 'pg\\_toast%'
+  AND n.nspname NOT LIKE 'pg\\_temp\\_%'
+UNION ALL
+SELECT 'function', p.oid, n.nspname, p.proname, NULL, pg_catalog.pg_get_function_identity_arguments(p.oid)
+FROM pg_catalog.pg_proc p
+JOIN pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+"""
+
+# Columns of system catalogs are left out of the full snapshot
+SNAPSHOT_COLUMNS_QUERY = """
+SELECT a.attrelid, a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod)
+FROM pg_catalog.pg_attribute a
+JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE a.attnum > 0
+  AND NOT a.attisdropped
+  AND c.relkind IN ('r', 'p', 'f', 'v', 'm')
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg\\_toast%'
+  AND n.nspname NOT LIKE 'pg\\_temp\\_%'
+ORDER BY a.attrelid, a.attnum
+"""
+
+CHANGED_COLUMNS_QUERY = """
+SELECT a.attrelid, a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod)
+FROM pg_catalog.pg_attribute a
+WHERE a.attnum > 0
+  AND NOT a.attisdropped
+  AND a.attrelid = ANY(%(relations)s::oid[])
+ORDER BY a.attrelid, a.attnum
+"""
+
+# Changes whenever a schema, relation, column or function is created, altered
+# or dropped, or a table is rewritten; columns can be renamed or retyped
+# without touching their relation's row. Computed on the server, so
+# validating a cached snapshot costs a single row.
+FINGERPRINT_QUERY = """
+SELECT pg_catalog.md5(pg_catalog.string_agg(version, ',' ORDER BY version))
+FROM (
+  SELECT 'n' || n.oid || ':' || n.xmin AS version
+  FROM pg_catalog.pg_namespace n
+  UNION ALL
+  SELECT 'c' || c.oid || ':' || c.xmin || ':' || c.relfilenode
+  FROM pg_catalog.pg_class c
+  WHERE c.relkind IN ('r', 'p', 'f', 'v', 'm')
+    AND c.relpersistence <> 't'
+  UNION ALL
+  SELECT 'p' || p.oid || ':' || p.xmin
+  FROM pg_catalog.pg_proc p
+  UNION ALL
+  SELECT 'a' || count(*) || ':' || coalesce(sum(a.xmin::text::bigint), 0)
+  FROM pg_catalog.pg_attribute a
+  JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+  WHERE a.attnum > 0
+    AND c.relkind IN ('r', 'p', 'f', 'v', 'm')
+    AND c.relpersistence <> 't'
+) versions
+"""
+
+SYSTEM_SCHEMAS = ("pg_catalog", "information_schema")
+
+TABLE_KINDS = ("r", "p", "f")
+VIEW_KINDS = ("v", "m")
+
+@dataclass
+class Schema:
+    oid: int
+    name: str
+
+@dataclass
+class Relation:
+    oid: int
+    schema: str
+    name: str
+    kind: str
+
+    @property
+    def qualified_name(self) -> str:
+        return "{}.{}".format(self.schema, self.name)
+
+@dataclass
+class Function:
+    oid: int
+    schema: str
+    name: str
+    arguments: str
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    not_null: bool
+
+@dataclass
+class Index:
+    name: str
+    definition: str
+    primary: bool
+
+@dataclass
+class SchemaObjects:
+    tables: list[Relation] = field(default_factory=list)
+    views: list[Relation] = field(default_factory=list)
+    functions: list[Function] = field(default_factory=list)
+
+@dataclass
+class RelationDetails:
+    columns: list[Column] = field(default_factory=list)
+    indexes: list[Index] = field(default_factory=list)
+
+@dataclass
+class SnapshotRelation:
+    schema: str
+    name: str
+    kind: str
+    version: str
+
+@dataclass
+class CatalogSnapshot:
+    """Every name in a database, as used for completion in the editor and to
+    serve the schema tree from the on-disk cache."""
+
+    schemas: list[Schema] = field(default_factory=list)
+    relations: dict[int, SnapshotRelation] = field(default_factory=dict)
+    # Columns (name and type) of each relation, keyed by the relation's oid
+    columns: dict[int, list[tuple[str, str]]] = field(default_factory=dict)
+    functions: list[Function] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "schemas": [asdict(schema) for schema in self.schemas],
+                "relations": {oid: asdict(relation) for oid, relation in self.relations.items()},
+                "columns": self.columns,
+                "functions": [asdict(function) for function in self.functions],
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "CatalogSnapshot":
+        snapshot = json.loads(data)
+        return cls(
+            schemas=[Schema(**schema) for schema in snapshot["schemas"]],
+            relations={
+                int(oid): SnapshotRelation(**relation)
+                for oid, relation in snapshot["relations"].items()
+            },
+            columns={
+                int(oid): [tuple(column) for column in columns]
+                for oid, columns in snapshot["columns"].items()
+            },
+            functions=[Function(**function) for function in snapshot["functions"]],
+        )
+
+class Catalog:
+    """Cached catalog metadata of a connection's database.
+
+    Each level of the schema tree is loaded with a single query the first
+    time it is requested and served from memory afterwards, until the cache
+    is invalidated. Loading blocks on the database, so it must happen in a
+    worker thread.
+
+    The snapshot of every name in the database is also persisted in the
+    `ConnectionStore`. On the next session it is checked against a fingerprint
+    of the catalog, and, when still valid, serves the schema tree and the
+    editor's completions without re-reading the catalog.
+    """
+
+    def __init__(self, connection: "Connection") -> None:
+        self.connection = connection
+        self._schemas: Optional[list[Schema]] = None
+        self._objects: dict[int, SchemaObjects] = {}
+        self._details: dict[int, RelationDetails] = {}
+        self._health: dict[int, SchemaHealth] = {}
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.fingerprint: Optional[str] = None
+        self.completion_index: Optional[CompletionIndex] = None
+        # Serializes snapshot refreshes from the tree and the editor
+        self._lock = threading.Lock()
+
+    def fetch(self, query: str, params: Optional[dict] = None) -> list[tuple]:
+        with self.connection.borrow() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+
+    def schemas(self) -> list[Schema]:
+        if self._schemas is None and self.restore_snapshot():
+            self._schemas = self.refresh_snapshot().schemas
+        elif self._schemas is None:
+            log("Loading schemas of '{}'".format(self.connection.name))
+            rows = self.fetch(SCHEMAS_QUERY)
+            self._schemas = [Schema(oid=oid, name=name) for oid, name in rows]
+        return self._schemas
+
+    def objects(self, schema: Schema) -> SchemaObjects:
+        if schema.oid not in self._objects and self.snapshot is not None:
+            self._objects[schema.oid] = self.snapshot_objects(schema)
+        elif schema.oid not in self._objects:
+            log("Loading objects of '{}'".format(schema.name))
+            objects = SchemaObjects()
+            for oid, name, kind, arguments in self.fetch(SCHEMA_OBJECTS_QUERY, {"schema": schema.oid}):
+                if kind == "function":
+                    objects.functions.append(Function(oid, schema.name, name, arguments))
+                elif kind in TABLE_KINDS:
+                    objects.tables.append(Relation(oid, schema.name, name, kind))
+                elif kind in VIEW_KINDS:
+                    objects.views.append(Relation(oid, schema.name, name, kind))
+            self._objects[schema.oid] = objects
+        return self._objects[schema.oid]
+
+    def details(self, relation: Relation) -> RelationDetails:
+        if relation.oid not in self._details:
+            log("Loading details of '{}'".format(relation.qualified_name))
+            details = RelationDetails()
+            for kind, name, detail, flag, _ in self.fetch(RELATION_DETAILS_QUERY, {"relation": relation.oid}):
+                if kind == "column":
+                    details.columns.append(Column(name, detail, flag))
+                else:
+                    details.indexes.append(Index(name, detail, flag))
+            self._details[relation.oid] = details
+        return self._details[relation.oid]
+
+    def health(self, schema: Schema, refresh: bool = False) -> SchemaHealth:
+        # Sizes and statistics go stale much sooner than names, so they are
+        # also reloaded on request
+        if refresh or schema.oid not in self._health:
+            log("Loading health of '{}'".format(schema.name))
+            self._health[schema.oid] = load_schema_health(self.fetch, schema.oid, schema.name)
+        return self._health[schema.oid]
+
+    def snapshot_objects(self, schema: Schema) -> SchemaObjects:
+        objects = SchemaObjects()
+        for oid, relation in self.snapshot.relations.items():
+            if relation.schema != schema.name:
+                continue
+            if relation.kind in TABLE_KINDS:
+                objects.tables.append(Relation(oid, schema.name, relation.name, relation.kind))
+            elif relation.kind in VIEW_KINDS:
+                objects.views.append(Relation(oid, schema.name, relation.name, relation.kind))
+        objects.functions = [f for f in self.snapshot.functions if f.schema == schema.name]
+
+        for items in (objects.tables, objects.views, objects.functions):
+            items.sort(key=lambda item: item.name)
+        return objects
+
+    def refresh_snapshot(self) -> CatalogSnapshot:
+        with self._lock:
+            self.restore_snapshot()
+            fingerprint = self.fetch(FINGERPRINT_QUERY)[0][0]
+            if self.snapshot is None or fingerprint != self.fingerprint:
+                self.load_snapshot()
+                self.fingerprint = fingerprint
+                self.save_snapshot()
+            return self.snapshot
+
+    def load_snapshot(self) -> None:
+        # Re-reads the list of names, and the columns of only those relations
+        # which are new or were altered since the previous snapshot
+        previous = self.snapshot
+        snapshot = CatalogSnapshot()
+        for kind, oid, schema, name, relkind, detail in self.fetch(SNAPSHOT_QUERY):
+            if kind == "schema":
+                snapshot.schemas.append(Schema(oid, name))
+            elif kind == "relation":
+                snapshot.relations[oid] = SnapshotRelation(schema, name, relkind, detail)
+            else:
+                snapshot.functions.append(Function(oid, schema, name, detail))
+        snapshot.schemas.sort(key=lambda schema: (schema.name in SYSTEM_SCHEMAS, schema.name))
+
+        if previous is None:
+            log("Loading all columns of '{}'".format(self.connection.name))
+            rows = self.fetch(SNAPSHOT_COLUMNS_QUERY)
+        else:
+            changed = []
+            for oid, relation in snapshot.relations.items():
+                known = previous.relations.get(oid)
+                if known is not None and known.version == relation.version:
+                    if oid in previous.columns:
+                        snapshot.columns[oid] = previous.columns[oid]
+                elif relation.schema not in SYSTEM_SCHEMAS:
+                    changed.append(oid)
+
+            log("Loading columns of {} changed relations".format(len(changed)))
+            rows = self.fetch(CHANGED_COLUMNS_QUERY, {"relations": changed}) if changed else []
+
+        for oid, name, type in rows:
+            snapshot.columns.setdefault(oid, []).append((name, type))
+
+        self.snapshot = snapshot
+        self.completion_index = CompletionIndex.from_snapshot(snapshot)
+
+    def restore_snapshot(self) -> bool:
+        # Reads the snapshot saved by a previous session, if it isn't loaded
+        # yet; it still has to be validated against the database before use
+        if self.snapshot is not None:
+            return True
+        if not self.connection.id:
+            return False
+
+        try:
+            row = ConnectionStore.default().snapshot(self.connection.id)
+        except sqlite3.Error as e:
+            log.error(e)
+            return False
+        if row is None:
+            return False
+
+        log("Restoring cached catalog of '{}'".format(self.connection.name))
+        self.fingerprint, data = row
+        self.snapshot = CatalogSnapshot.from_json(data)
+        self.completion_index = CompletionIndex.from_snapshot(self.snapshot)
+        return True
+
+    def save_snapshot(self) -> None:
+        if not self.connection.id:
+            return
+
+        try:
+            ConnectionStore.default().save_snapshot(self.connection.id, self.fingerprint, self.snapshot.to_json())
+        except sqlite3.Error as e:
+            log.error(e)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._schemas = None
+            self._objects = {}
+            self._details = {}
+            self._health = {}
+            self.snapshot = None
+            self.fingerprint = None
+            self.completion_index = None
@@ -0,0 +1,75 @@
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from textgres.catalog import CatalogSnapshot
+
+# Identifiers which can be written without quotes
+PLAIN_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_$]*")
+
+def quote_identifier(name: str) -> str:
+    if PLAIN_IDENTIFIER.fullmatch(name):
+        return name
+    return '"{}"'.format(name.replace('"', '""'))
+
+@dataclass(frozen=True)
+class Completion:
+    text: str
+    kind: str
+    detail: str = ""
+
+class CompletionIndex:
+    """Catalog names indexed for prefix lookups.
+
+    Keys are lowercased and kept in one sorted list, so a lookup is a binary
+    search for the prefix followed by a scan of the matching run; its cost
+    depends on the number of results rather than the size of the catalog.
+    Qualified names (`schema.table`, `table.column`) are indexed alongside
+    the bare ones.
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, Completion]]) -> None:
+        entries = sorted(set(entries), key=lambda entry: (entry[0], entry[1].kind))
+        self._keys = [key for key, _ in entries]
+        self._completions = [completion for _, completion in entries]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: "CatalogSnapshot") -> "CompletionIndex":
+        def entries() -> Iterable[tuple[str, Completion]]:
+            for schema in snapshot.schemas:
+                yield schema.name.lower(), Completion(quote_identifier(schema.name), "schema")
+
+            for oid, relation in snapshot.relations.items():
+                kind = "view" if relation.kind in ("v", "m") else "table"
+                name = quote_identifier(relation.name)
+                qualified = "{}.{}".format(quote_identifier(relation.schema), name)
+                yield relation.name.lower(), Completion(name, kind, relation.schema)
+                yield qualified.lower(), Completion(qualified, kind, relation.schema)
+
+                for column, type in snapshot.columns.get(oid, []):
+                    column_name = quote_identifier(column)
+                    qualified_column = "{}.{}".format(name, column_name)
+                    # Bare column names are shared by many relations, so their
+                    # detail is left out to collapse them into one entry
+                    yield column.lower(), Completion(column_name, "column")
+                    yield qualified_column.lower(), Completion(qualified_column, "column", type)
+
+            for function in snapshot.functions:
+                yield function.name.lower(), Completion(quote_identifier(function.name), "function")
+
+        return cls(entries())
+
+    def lookup(self, prefix: str, limit: int = 50) -> list[Completion]:
+        keys = self._keys
+        prefix = prefix.lower()
+        results = []
+        index = bisect_left(keys, prefix)
+        while index < len(keys) and len(results) < limit and keys[index].startswith(prefix):
+            results.append(self._completions[index])
+            index += 1
+        return results
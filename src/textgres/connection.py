@@ -1,11 +1,160 @@
 import psycopg2
-import sqlite3
-from pydantic import BaseModel, Field
+import threading
+from contextlib import contextmanager
+from pydantic import BaseModel, Field, PrivateAttr
 from textual import log
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
 
-def dict_factory(cursor, row):
-    fields = [column[0] for column in cursor.description]
-    return {key: value for key, value in zip(fields, row)}
+from psycopg2.pool import PoolError
+from textgres.catalog import Catalog
+from textgres.large_values import Preview, apply_previews, load_value, preview_query
+from textgres.plan import Plan, explain_statement
+from textgres.pool import ConnectionPool, PoolHealth
+from textgres.result_buffer import ColumnarBuffer
+from textgres.script import StatementResult, run_script
+from textgres.statements import StatementSampler
+from textgres.store import CONNECTION_COLUMNS, ConnectionStore
+
+# The number of rows fetched per round-trip when streaming results from a
+# server-side cursor
+DEFAULT_ITERSIZE = 1000
+
+# Statements starting with these keywords return rows and can be declared as a
+# server-side cursor; anything else is executed with a regular cursor
+STREAMABLE_KEYWORDS = ("select", "with", "values", "table")
+
+# The number of bytes moved between the server and a file per round-trip of
+# a COPY
+COPY_CHUNK_SIZE = 1 << 20
+
+# Each saved connection keeps a small pool so that queries, result paging and
+# background catalog lookups don't serialize on a single session
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 4
+POOL_MAX_IDLE = 300.0
+
+# TCP keepalives of every session, so that a dead peer, or a firewall or
+# pooler dropping idle sockets, is noticed by the OS rather than by the next
+# query; in seconds
+KEEPALIVES_IDLE = 30
+KEEPALIVES_INTERVAL = 10
+KEEPALIVES_COUNT = 3
+CONNECT_TIMEOUT = 10
+
+def is_streamable(query: str) -> bool:
+    words = query.lstrip(" \t\n(").split(None, 1)
+    return len(words) > 0 and words[0].lower() in STREAMABLE_KEYWORDS
+
+class ResultStream:
+    """The rows of a query, fetched in batches as they are needed.
+
+    Row-returning statements are declared as a named (server-side) cursor so
+    that only `itersize` rows are held by the client per round-trip. The first
+    batch is fetched eagerly so that the columns are known up front. Closing
+    the stream commits its transaction and calls `release`, which hands the
+    connection back to its pool.
+
+    With `previews`, only the start of large text, JSON and bytea values is
+    fetched; see `preview_query`. The rest is loaded on demand. `truncated`
+    is set once a value fetched so far was actually cut short.
+    """
+
+    def __init__(
+        self,
+        conn,
+        query: str,
+        itersize: int = DEFAULT_ITERSIZE,
+        release: Optional[Callable[[], None]] = None,
+        previews: bool = False,
+    ) -> None:
+        self.itersize = itersize
+        self.exhausted = False
+        self.closed = False
+        self.rows_fetched = 0
+        # Called with the buffered rows by the reader which buffers them (see
+        # `RowSource`) once every row has been fetched
+        self.on_complete: Optional[Callable[[ColumnarBuffer], None]] = None
+        self._release = release
+        # The kind of each previewed column by position
+        self.previews: dict[int, str] = {}
+        self.truncated = False
+
+        if previews and is_streamable(query):
+            query = self._preview(conn, query)
+
+        if is_streamable(query):
+            self._cursor = conn.cursor(name="textgres_{}".format(uuid4().hex))
+            self._cursor.itersize = itersize
+        else:
+            self._cursor = conn.cursor()
+
+        self._cursor.execute(query)
+        self._buffer = self._fetch()
+        # The sizes of previewed values follow the columns
+        description = self._cursor.description or []
+        self.columns = [column.name for column in description[:len(description) - len(self.previews)]]
+        self.rowcount = self._cursor.rowcount
+
+    def _preview(self, conn, query: str) -> str:
+        try:
+            with conn.cursor() as cursor:
+                previewed = preview_query(cursor, query)
+        except psycopg2.Error as e:
+            # Some queries can't be a subquery, such as those with a data
+            # modifying WITH; they are run as they are
+            log.error(e)
+            conn.rollback()
+            return query
+
+        if previewed is None:
+            return query
+        query, self.previews = previewed
+        return query
+
+    def _fetch(self) -> list[tuple]:
+        # Statements like INSERT or CREATE have no result set to fetch from
+        if self._cursor.description is None and not self._cursor.name:
+            self.exhausted = True
+            return []
+
+        rows = self._cursor.fetchmany(self.itersize)
+        if len(rows) < self.itersize:
+            self.exhausted = True
+        return rows
+
+    def fetch(self) -> list[tuple]:
+        if self._buffer is not None:
+            rows, self._buffer = self._buffer, None
+        elif self.exhausted:
+            rows = []
+        else:
+            rows = self._fetch()
+
+        if self.previews:
+            rows = apply_previews(rows, self.previews, len(self.columns), self.rows_fetched, self.columns)
+            if not self.truncated:
+                self.truncated = any(isinstance(row[index], Preview) for row in rows for index in self.previews)
+        self.rows_fetched += len(rows)
+        if self.exhausted and self._buffer is None:
+            self.close()
+        return rows
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        conn = self._cursor.connection
+        if not conn.closed:
+            try:
+                self._cursor.close()
+                conn.commit()
+            except psycopg2.Error as e:
+                log.error(e)
+
+        if self._release is not None:
+            self._release()
 
 class Connection(BaseModel):
     id: int = Field(default=None)
@@ -15,92 +164,268 @@ class Connection(BaseModel):
     database: str = Field(default="postgres")
     username: str = Field(default="postgres")
     password: str = Field(default="")
+    # Session defaults in milliseconds, where 0 disables the timeout
+    statement_timeout: int = Field(default=0, ge=0)
+    lock_timeout: int = Field(default=0, ge=0)
+    # How long the results of read-only queries are reused, in seconds, where
+    # 0 disables caching; see `ResultCache`
+    result_cache_ttl: int = Field(default=0, ge=0)
 
-    _conn = None
-
-    def load():
-        conn = sqlite3.connect("connections.db")
-        conn.row_factory = dict_factory
-        c = conn.cursor()
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS connections (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                host TEXT,
-                port INTEGER,
-                database TEXT,
-                username TEXT,
-                password TEXT
-            )
-            """
-        )
-        c.execute("SELECT * FROM connections")
-        connections = c.fetchall()
-        conn.close()
-        return [Connection(**connection) for connection in connections]
+    _pool: Optional[ConnectionPool] = None
+    # Guards `_pool` as connections are opened from worker threads
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    # Pooled connections currently running a user's statement
+    _running: set = PrivateAttr(default_factory=set)
+    _catalog: Optional[Catalog] = None
+    # Kept while connected, so that its samples outlive any view of them
+    _statements: Optional[StatementSampler] = None
+    # The `parameters` the pool and catalog were opened with
+    _opened_with: Optional[tuple] = None
+
+    def load() -> list["Connection"]:
+        return [Connection(**values) for values in ConnectionStore.default().connections()]
 
     # These methods are used to save and delete the connection from the app
     # and do NOT interact with the database defined in the connection
 
+    @property
+    def values(self) -> dict:
+        # The saved fields, as stored by `ConnectionStore`
+        return self.model_dump(include={"id", *CONNECTION_COLUMNS})
+
     def save(self) -> None:
-        conn = sqlite3.connect("connections.db")
-        conn.row_factory = dict_factory
-        c = conn.cursor()
-        if not self.id:
-            new = c.execute(
-                "INSERT INTO connections VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING *",
-                (None, self.name, self.host, self.port, self.database, self.username, self.password),
-            ).fetchone()
-            self.id = new['id']
-        else:
-            c.execute(
-                "UPDATE connections SET name = ?, host = ?, port = ?, database = ?, username = ?, password = ? WHERE id = ?",
-                (self.name, self.host, self.port, self.database, self.username, self.password, self.id),
-            )
-        conn.commit()
-        conn.close()
+        self.id = ConnectionStore.default().save(self.values)
 
     def delete(self) -> None:
-        if self._conn is not None:
+        if self.connected:
             self.disconnect()
 
-        conn = sqlite3.connect("connections.db")
-        c = conn.cursor()
-        c.execute("DELETE FROM connections WHERE name = ?", (self.name,))
-        conn.commit()
-        conn.close()
+        ConnectionStore.default().delete(self.id)
 
     # These methods are used to interact with the database defined in the
     # connection
 
     def connect(self):
-        if not self._conn:
-            log("Connecting '{}'".format(self.name))
-            self._conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                dbname=self.database,
-                user=self.username,
-                password=self.password,
-            )
+        with self._lock:
+            if self._pool is None:
+                log("Connecting '{}'".format(self.name))
+                self._opened_with = self.parameters
+                self._pool = ConnectionPool(
+                    self.open,
+                    minconn=POOL_MIN_SIZE,
+                    maxconn=POOL_MAX_SIZE,
+                    max_idle=POOL_MAX_IDLE,
+                )
+
+    def open(self):
+        return psycopg2.connect(
+            host=self.host,
+            port=self.port,
+            dbname=self.database,
+            user=self.username,
+            password=self.password,
+            options=self.session_options,
+            connect_timeout=CONNECT_TIMEOUT,
+            keepalives=1,
+            keepalives_idle=KEEPALIVES_IDLE,
+            keepalives_interval=KEEPALIVES_INTERVAL,
+            keepalives_count=KEEPALIVES_COUNT,
+        )
 
     def disconnect(self) -> None:
         log("Disconnecting '{}'".format(self.name))
-        if self._conn:
-            self._conn.close()
-            self._conn = None
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            if self._statements is not None:
+                self._statements.close()
+                self._statements = None
 
-    def query(self, query: str):
-        if not self._conn:
+    @contextmanager
+    def borrow(self) -> Iterator:
+        # Lends a pooled connection for background work such as catalog
+        # lookups; it is returned to the pool when the block exits
+        if not self.connected:
             self.connect()
 
+        pool = self._pool
+        if pool is None:
+            raise PoolError("connection '{}' was disconnected".format(self.name))
+
+        with pool.connection() as conn:
+            yield conn
+
+    def cancel(self) -> None:
+        # Sends a cancel request for the statements currently running on this
+        # connection; safe to call from any thread
+        log("Cancelling '{}'".format(self.name))
+        for conn in list(self._running):
+            conn.cancel()
+
+    def query(self, query: str):
         log("Querying '{}'".format(self.name))
-        with self._conn.cursor() as cur:
-            cur.execute(query)
-            results = cur.fetchall()
-            return results
+        with self.borrow() as conn:
+            self._running.add(conn)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    results = cur.fetchall()
+                conn.commit()
+                return results
+            finally:
+                self._running.discard(conn)
+
+    def explain(self, query: str, analyze: bool = False) -> Plan:
+        # ANALYZE executes the statement, so its transaction is always rolled
+        # back to leave no trace of any writes
+        log("Explaining '{}'".format(self.name))
+        with self.borrow() as conn:
+            self._running.add(conn)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(explain_statement(query, analyze))
+                    value = cur.fetchone()[0]
+                return Plan.from_json(value)
+            finally:
+                self._running.discard(conn)
+                if not conn.closed:
+                    conn.rollback()
+
+    def run_script(
+        self,
+        statements: list[str],
+        autocommit: bool = False,
+        batch: bool = False,
+        on_statement: Optional[Callable[[int], None]] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> list[StatementResult]:
+        # Runs every statement on one pooled connection; see `run_script`
+        log("Running script on '{}'".format(self.name))
+        with self.borrow() as conn:
+            self._running.add(conn)
+            try:
+                return run_script(conn, statements, autocommit, batch, on_statement, cancelled)
+            finally:
+                self._running.discard(conn)
+
+    def copy(self, statement: str, file, size: int = COPY_CHUNK_SIZE) -> int:
+        # Runs a COPY ... TO STDOUT or FROM STDIN statement, moving data
+        # between the server and `file` in chunks of `size` bytes; returns
+        # the number of rows copied
+        log("Copying '{}'".format(self.name))
+        with self.borrow() as conn:
+            self._running.add(conn)
+            try:
+                with conn.cursor() as cur:
+                    cur.copy_expert(statement, file, size)
+                    rowcount = cur.rowcount
+                conn.commit()
+                return rowcount
+            finally:
+                self._running.discard(conn)
+
+    def load_value(self, query: str, preview: Preview) -> str | bytes:
+        # The whole of a value previewed by `stream`; see `load_value`
+        log("Loading value from '{}'".format(self.name))
+        with self.borrow() as conn:
+            self._running.add(conn)
+            try:
+                with conn.cursor() as cur:
+                    return load_value(cur, query, preview)
+            finally:
+                self._running.discard(conn)
+                if not conn.closed:
+                    conn.rollback()
+
+    def stream(self, query: str, itersize: int = DEFAULT_ITERSIZE, previews: bool = False) -> ResultStream:
+        if not self.connected:
+            self.connect()
+
+        log("Streaming '{}'".format(self.name))
+        pool = self._pool
+        if pool is None:
+            raise PoolError("connection '{}' was disconnected".format(self.name))
+
+        conn = pool.getconn()
+        self._running.add(conn)
+
+        # The connection stays borrowed until the stream is closed; returning
+        # it rolls back a failed transaction
+        def release() -> None:
+            self._running.discard(conn)
+            pool.putconn(conn)
+
+        # Any failure to open the stream must hand the connection back, or
+        # the pool runs dry
+        try:
+            return ResultStream(conn, query, itersize, release, previews=previews)
+        except BaseException:
+            release()
+            raise
+
+    @property
+    def catalog(self) -> Catalog:
+        if self._catalog is None:
+            self._catalog = Catalog(self)
+            if self._opened_with is None:
+                self._opened_with = self.parameters
+        return self._catalog
+
+    @property
+    def parameters(self) -> tuple:
+        # What the sessions, and so the catalog, of the connection depend on
+        return (
+            self.host,
+            self.port,
+            self.database,
+            self.username,
+            self.password,
+            self.statement_timeout,
+            self.lock_timeout,
+        )
+
+    def reconfigure(self) -> None:
+        # Called once the connection was edited in place: the sessions and
+        # catalog opened before are dropped when it now points elsewhere, so
+        # that the next use connects with the new parameters
+        if self._opened_with is None or self._opened_with == self.parameters:
+            return
+        if self.connected:
+            self.disconnect()
+        self._catalog = None
+        self._opened_with = None
+
+    @property
+    def statements(self) -> StatementSampler:
+        if self._statements is None:
+            self._statements = StatementSampler(self)
+        return self._statements
+
+    @property
+    def session_options(self) -> str:
+        # Passed as startup options so the timeouts apply without an extra
+        # round-trip after connecting
+        options = []
+        if self.statement_timeout:
+            options.append("-c statement_timeout={}".format(self.statement_timeout))
+        if self.lock_timeout:
+            options.append("-c lock_timeout={}".format(self.lock_timeout))
+        return " ".join(options)
 
     @property
     def connected(self) -> bool:
-        return self._conn is not None
+        return self._pool is not None
+
+    @property
+    def health(self) -> Optional[PoolHealth]:
+        # What the background probes last found, while connected
+        pool = self._pool
+        return None if pool is None else pool.health
+
+    def probe(self) -> None:
+        # Pings the pool's idle sessions and reconnects broken ones; see
+        # `ConnectionPool.probe`. Blocks on the database.
+        pool = self._pool
+        if pool is not None:
+            pool.probe()
@@ -0,0 +1,163 @@
+import configparser
+import yaml
+from pydantic import ValidationError
+from typing import Optional, TextIO
+
+from textgres.connection import Connection
+
+# The formats connections can be imported from and exported to
+FORMATS = ("yaml", "pgpass", "service")
+
+# Fields of a pg_service.conf service and the connection fields they fill
+SERVICE_FIELDS = {
+    "host": "host",
+    "port": "port",
+    "dbname": "database",
+    "user": "username",
+    "password": "password",
+}
+
+def guess_format(filename: str) -> Optional[str]:
+    name = filename.lower().rsplit("/", 1)[-1]
+    if name.endswith((".yaml", ".yml")):
+        return "yaml"
+    if "pgpass" in name:
+        return "pgpass"
+    if name.endswith(".conf") or "service" in name:
+        return "service"
+    return None
+
+def read_connections(file: TextIO, format: str) -> list[Connection]:
+    """Reads connection definitions, validated like those saved from the
+    app; raises ValueError on a malformed file.
+
+    Connections are named after their service, or, from a pgpass file,
+    after their user, host, port and database.
+    """
+    text = file.read()
+    try:
+        if format == "yaml":
+            return read_yaml(text)
+        if format == "pgpass":
+            return read_pgpass(text)
+        if format == "service":
+            return read_service(text)
+    except (configparser.Error, yaml.YAMLError) as e:
+        raise ValueError(str(e)) from e
+    raise ValueError("unknown format '{}'".format(format))
+
+def write_connections(connections: list[Connection], file: TextIO, format: str, passwords: bool = False) -> None:
+    # Passwords are written in plain text, so only when asked for
+    if format == "yaml":
+        write_yaml(connections, file, passwords)
+    elif format == "pgpass":
+        write_pgpass(connections, file, passwords)
+    elif format == "service":
+        write_service(connections, file, passwords)
+    else:
+        raise ValueError("unknown format '{}'".format(format))
+
+def read_yaml(text: str) -> list[Connection]:
+    # Either a list of connections or a mapping with a `connections` list
+    data = yaml.safe_load(text) or []
+    if isinstance(data, dict):
+        data = data.get("connections") or []
+    if not isinstance(data, list):
+        raise ValueError("expected a list of connections")
+
+    connections = []
+    for number, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise ValueError("connection {} is not a mapping of fields to values".format(number))
+        try:
+            connections.append(Connection(**{key: value for key, value in item.items() if key != "id"}))
+        except ValidationError as e:
+            raise ValueError("connection {}: {}".format(number, e)) from e
+    return connections
+
+def write_yaml(connections: list[Connection], file: TextIO, passwords: bool) -> None:
+    exclude = {"id"} if passwords else {"id", "password"}
+    yaml.safe_dump(
+        {"connections": [
+            {key: value for key, value in connection.values.items() if key not in exclude}
+            for connection in connections
+        ]},
+        file,
+        sort_keys=False,
+    )
+
+def split_pgpass_line(line: str) -> list[str]:
+    # Fields are separated by colons; backslashes escape colons and
+    # backslashes
+    fields = [""]
+    escaped = False
+    for char in line:
+        if escaped:
+            fields[-1] += char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ":":
+            fields.append("")
+        else:
+            fields[-1] += char
+    return fields
+
+def escape_pgpass_field(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(":", "\\:")
+
+def read_pgpass(text: str) -> list[Connection]:
+    # Entries with a wildcard host or user match many servers rather than
+    # describing one, and are skipped; wildcard ports and databases take
+    # the defaults
+    connections = []
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        fields = split_pgpass_line(line)
+        if len(fields) != 5:
+            raise ValueError("expected host:port:database:username:password, got '{}'".format(line))
+        host, port, database, username, password = fields
+        if host == "*" or username == "*":
+            continue
+        connection = Connection(host=host, username=username, password=password)
+        if port != "*":
+            connection.port = int(port)
+        if database != "*":
+            connection.database = database
+        connection.name = "{}@{}:{}/{}".format(connection.username, connection.host, connection.port, connection.database)
+        connections.append(connection)
+    return connections
+
+def write_pgpass(connections: list[Connection], file: TextIO, passwords: bool) -> None:
+    for connection in connections:
+        file.write(":".join(escape_pgpass_field(str(value)) for value in (
+            connection.host,
+            connection.port,
+            connection.database,
+            connection.username,
+            connection.password if passwords else "",
+        )) + "\n")
+
+def read_service(text: str) -> list[Connection]:
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read_string(text)
+    connections = []
+    for name in parser.sections():
+        section = parser[name]
+        connection = Connection(name=name)
+        for key, field in SERVICE_FIELDS.items():
+            if key in section:
+                setattr(connection, field, int(section[key]) if field == "port" else section[key])
+        connections.append(connection)
+    return connections
+
+def write_service(connections: list[Connection], file: TextIO, passwords: bool) -> None:
+    parser = configparser.ConfigParser(interpolation=None)
+    for connection in connections:
+        parser[connection.name] = {
+            key: str(getattr(connection, field))
+            for key, field in SERVICE_FIELDS.items()
+            if passwords or field != "password"
+        }
+    parser.write(file)
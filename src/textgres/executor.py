@@ -0,0 +1,320 @@
+from dataclasses import dataclass
+from textual import log
+from textual.message import Message
+from textual.message_pump import MessagePump
+from textual.worker import get_current_worker
+from time import monotonic, time
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from textgres.history import HistoryEntry, QueryHistory
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_cache import CachedStream, ResultCache
+from textgres.sql import is_read_only
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection, ResultStream
+    from textgres.fanout import FanoutResult
+    from textgres.script import StatementResult
+
+# Query messages are posted directly to every interested widget, so they must
+# not bubble or the app would receive one copy per widget
+class QueryMessage(Message, bubble=False):
+    pass
+
+@dataclass
+class QueryStarted(QueryMessage):
+    connection: "Connection"
+    query: str
+
+@dataclass
+class QueryProgress(QueryMessage):
+    connection: "Connection"
+    status: str
+
+@dataclass
+class QueryCompleted(QueryMessage):
+    connection: "Connection"
+    stream: "ResultStream | CachedStream"
+    elapsed: float
+    cached: bool = False
+
+@dataclass
+class QueryFailed(QueryMessage):
+    connection: "Connection"
+    error: Exception
+    elapsed: float
+
+@dataclass
+class ScriptCompleted(QueryMessage):
+    connection: "Connection"
+    results: list["StatementResult"]
+    elapsed: float
+    autocommit: bool = False
+
+    @property
+    def failed(self) -> Optional["StatementResult"]:
+        return next((result for result in self.results if result.error is not None), None)
+
+    def describe_failure(self) -> str:
+        # The statement which failed, or the batch it was sent in, as which
+        # statement of a batch failed isn't known
+        failed = self.failed
+        if failed.batch is not None:
+            members = [index for index, result in enumerate(self.results) if result.batch == failed.batch]
+            return "batch {} (statements {}-{})".format(failed.batch + 1, members[0] + 1, members[-1] + 1)
+        return "statement {}".format(self.results.index(failed) + 1)
+
+@dataclass
+class FanoutCompleted(QueryMessage):
+    connections: list["Connection"]
+    query: str
+    result: "FanoutResult"
+    elapsed: float
+
+def execute_query(
+    connection: "Connection",
+    query: str,
+    targets: Iterable[MessagePump],
+    history: Optional[QueryHistory] = None,
+    cache: Optional[ResultCache] = None,
+    use_cache: bool = True,
+    previews: bool = False,
+) -> None:
+    """Runs a query to completion, reporting back to `targets` and recording
+    it in `history`.
+
+    Read-only queries on connections with a result cache TTL are served from
+    `cache` when a fresh result is there, unless `use_cache` is false, and
+    their results are cached once every row has been fetched. Any other
+    statement invalidates the cached results of its connection. With
+    `previews`, large values are only fetched in part; see `ResultStream`.
+
+    This blocks on the database and must be run in a thread worker.
+    """
+
+    targets = list(targets)
+    worker = get_current_worker()
+
+    def post(message: QueryMessage) -> None:
+        for target in targets:
+            target.post_message(message)
+
+    post(QueryStarted(connection=connection, query=query))
+    started = monotonic()
+    executed_at = time()
+
+    def record(rows: Optional[int] = None, error: Optional[Exception] = None) -> None:
+        if history is not None:
+            history.record(
+                HistoryEntry(
+                    query=query,
+                    connection_id=connection.id,
+                    executed_at=executed_at,
+                    duration=monotonic() - started,
+                    rows=rows,
+                    error=None if error is None else str(error).strip(),
+                )
+            )
+
+    cacheable = cache is not None and connection.result_cache_ttl > 0 and is_read_only(query)
+    if cacheable and use_cache:
+        cached = cache.get(connection.id, query, connection.result_cache_ttl)
+        if cached is not None:
+            record(rows=len(cached.buffer))
+            post(
+                QueryCompleted(
+                    connection=connection,
+                    stream=CachedStream(cached),
+                    elapsed=monotonic() - started,
+                    cached=True,
+                )
+            )
+            return
+
+    try:
+        if not connection.connected:
+            post(QueryProgress(connection=connection, status="Connecting"))
+            connection.connect()
+
+        post(QueryProgress(connection=connection, status="Executing"))
+        stream = connection.stream(query, previews=previews)
+    except Exception as e:
+        log.error(e)
+        record(error=e)
+        post(QueryFailed(connection=connection, error=e, elapsed=monotonic() - started))
+        return
+
+    # Previewed values are loaded by running the query again, so they must
+    # not outlive the rows they were fetched from; rows with no value cut
+    # short are the same as the query's own, and are cached as usual
+    if cacheable and stream.columns:
+        def on_complete(buffer: ColumnarBuffer) -> None:
+            if not stream.truncated:
+                cache.put(connection.id, query, stream.columns, buffer)
+
+        stream.on_complete = on_complete
+    elif cache is not None and not is_read_only(query):
+        # The statement may have changed what cached queries would return
+        cache.invalidate(connection.id)
+
+    # The total is only known once every row has been fetched
+    known = (stream.exhausted or not stream.columns) and stream.rowcount >= 0
+    record(rows=stream.rowcount if known else None)
+
+    # A newer query replaced this one while it was running
+    if worker.is_cancelled:
+        stream.close()
+        return
+
+    post(QueryCompleted(connection=connection, stream=stream, elapsed=monotonic() - started))
+
+def execute_script(
+    connection: "Connection",
+    statements: list[str],
+    targets: Iterable[MessagePump],
+    history: Optional[QueryHistory] = None,
+    cache: Optional[ResultCache] = None,
+    autocommit: bool = False,
+    batch: bool = False,
+) -> None:
+    """Runs several statements in order, reporting each as it starts and
+    every result at the end; see `run_script`.
+
+    Each statement is recorded in `history` on its own. Results are never
+    served from `cache`, and any statement which could write invalidates
+    the cached results of the connection.
+
+    This blocks on the database and must be run in a thread worker.
+    """
+
+    targets = list(targets)
+    worker = get_current_worker()
+
+    def post(message: QueryMessage) -> None:
+        for target in targets:
+            target.post_message(message)
+
+    post(QueryStarted(connection=connection, query=";\n".join(statements)))
+    started = monotonic()
+    executed_at = time()
+
+    def on_statement(index: int) -> None:
+        post(QueryProgress(connection=connection, status="Statement {}/{}".format(index + 1, len(statements))))
+
+    try:
+        if not connection.connected:
+            post(QueryProgress(connection=connection, status="Connecting"))
+            connection.connect()
+
+        results = connection.run_script(
+            statements,
+            autocommit=autocommit,
+            batch=batch,
+            on_statement=on_statement,
+            cancelled=lambda: worker.is_cancelled,
+        )
+    except Exception as e:
+        log.error(e)
+        post(QueryFailed(connection=connection, error=e, elapsed=monotonic() - started))
+        return
+
+    if cache is not None and not all(is_read_only(statement) for statement in statements):
+        cache.invalidate(connection.id)
+
+    if history is not None:
+        # Statements of a batch share one round-trip, and its start time
+        offset = 0.0
+        batch_started = 0.0
+        previous_batch = None
+        for result in results:
+            if not result.executed:
+                continue
+            if result.batch is None or result.batch != previous_batch:
+                batch_started = offset
+                offset += result.elapsed
+            previous_batch = result.batch
+            history.record(
+                HistoryEntry(
+                    query=result.statement,
+                    connection_id=connection.id,
+                    executed_at=executed_at + batch_started,
+                    duration=result.elapsed,
+                    rows=result.rowcount,
+                    error=None if result.error is None else str(result.error).strip(),
+                )
+            )
+
+    if worker.is_cancelled:
+        return
+
+    post(
+        ScriptCompleted(
+            connection=connection,
+            results=results,
+            elapsed=monotonic() - started,
+            autocommit=autocommit,
+        )
+    )
+
+def execute_fanout(
+    connections: list["Connection"],
+    query: str,
+    targets: Iterable[MessagePump],
+    history: Optional[QueryHistory] = None,
+    cache: Optional[ResultCache] = None,
+) -> None:
+    """Runs a query on several connections at once and reports the merged
+    rows, and how each connection fared, to `targets`; see `run_fanout`.
+
+    The query is recorded in `history` once per connection. Writes
+    invalidate the cached results of every connection they ran on.
+
+    This blocks on the database and must be run in a thread worker.
+    """
+    from textgres.fanout import run_fanout
+
+    targets = list(targets)
+    worker = get_current_worker()
+
+    def post(message: QueryMessage) -> None:
+        for target in targets:
+            target.post_message(message)
+
+    post(QueryStarted(connection=connections[0], query=query))
+    started = monotonic()
+    executed_at = time()
+
+    def on_shard(shard, done: int) -> None:
+        post(QueryProgress(connection=shard.connection, status="{}/{} connections".format(done, len(connections))))
+
+    result = run_fanout(connections, query, on_shard=on_shard, cancelled=lambda: worker.is_cancelled)
+
+    read_only = is_read_only(query)
+    for shard in result.shards:
+        if not shard.executed:
+            continue
+        if cache is not None and not read_only:
+            cache.invalidate(shard.connection.id)
+        if history is not None:
+            history.record(
+                HistoryEntry(
+                    query=query,
+                    connection_id=shard.connection.id,
+                    executed_at=executed_at,
+                    duration=shard.elapsed,
+                    rows=shard.rowcount,
+                    error=None if shard.error is None else str(shard.error).strip(),
+                )
+            )
+
+    if worker.is_cancelled:
+        return
+
+    post(
+        FanoutCompleted(
+            connections=connections,
+            query=query,
+            result=result,
+            elapsed=monotonic() - started,
+        )
+    )
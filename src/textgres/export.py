@@ -0,0 +1,337 @@
+import csv
+import json
+import struct
+import sys
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterator, Optional, Sequence
+from uuid import UUID
+
+from textgres.result_buffer import (
+    ArrayColumn,
+    BoolColumn,
+    Column,
+    ColumnarBuffer,
+    DateColumn,
+    DatetimeColumn,
+    FloatColumn,
+    IntColumn,
+    ObjectColumn,
+    TextColumn,
+)
+
+if TYPE_CHECKING:
+    from textgres.connection import ResultStream
+
+COLUMNAR_MAGIC = b"TGCOL\x01"
+
+# Type codes of the columns in a columnar batch; 0 is a column of nulls only
+COLUMN_CODES: dict[type[Column], int] = {
+    IntColumn: 1,
+    FloatColumn: 2,
+    BoolColumn: 3,
+    DateColumn: 4,
+    DatetimeColumn: 5,
+    TextColumn: 6,
+    ObjectColumn: 7,
+}
+COLUMN_CLASSES = {code: column_type for column_type, code in COLUMN_CODES.items()}
+
+# Object columns whose values are tagged with their types, see `tag_value`;
+# code 7 is read as plain JSON
+TAGGED_OBJECT_CODE = 8
+
+# How values of object columns are tagged in a columnar file, by type: each
+# is written as a JSON object of a single tag and the value's text
+VALUE_TAGS: dict[type, str] = {
+    Decimal: "n",
+    UUID: "u",
+    datetime: "dt",
+    date: "d",
+    time: "t",
+}
+VALUE_PARSERS: dict[str, Callable[[Any], Any]] = {
+    "n": Decimal,
+    "u": UUID,
+    "dt": datetime.fromisoformat,
+    "d": date.fromisoformat,
+    "t": time.fromisoformat,
+    "td": lambda parts: timedelta(*parts),
+    "b": bytes.fromhex,
+    # bytea, as psycopg2 returns it
+    "m": lambda encoded: memoryview(bytes.fromhex(encoded)),
+    "l": lambda values: [untag_value(value) for value in values],
+    "o": lambda values: {key: untag_value(value) for key, value in values.items()},
+}
+
+def to_text(value: Any) -> str:
+    # Renders values the way psql does in its CSV output
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+def to_json(value: Any) -> Any:
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()
+    # Decimals, dates, UUIDs, ranges etc. are written as their text so that
+    # nothing loses precision
+    return str(value)
+
+def tag_value(value: Any, exact: bool = False) -> Any:
+    """Encodes a value as JSON which `untag_value` turns back into it.
+
+    JSON's own scalars are kept as they are, while lists, objects and the
+    types of `VALUE_TAGS` are wrapped in an object naming their type. Other
+    values are written as their text, or raise TypeError when `exact`.
+    """
+    if value is None or type(value) in (bool, int, float, str):
+        return value
+    if isinstance(value, list):
+        return {"l": [tag_value(item, exact) for item in value]}
+    if isinstance(value, dict) and all(type(key) is str for key in value):
+        return {"o": {key: tag_value(item, exact) for key, item in value.items()}}
+    if isinstance(value, bytes):
+        return {"b": value.hex()}
+    if isinstance(value, memoryview):
+        return {"m": value.hex()}
+    if type(value) is timedelta:
+        return {"td": [value.days, value.seconds, value.microseconds]}
+    tag = VALUE_TAGS.get(type(value))
+    if tag is not None:
+        return {tag: value.isoformat() if isinstance(value, (date, time)) else str(value)}
+    if exact:
+        raise TypeError("can't store {} values exactly".format(type(value).__name__))
+    return str(value)
+
+def untag_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        (tag, encoded), = value.items()
+        return VALUE_PARSERS[tag](encoded)
+    return value
+
+class RowWriter:
+    """Writes result rows to a file, one batch at a time."""
+
+    binary = False
+
+    def __init__(self, file: IO) -> None:
+        self.file = file
+
+    def write_header(self, columns: list[str]) -> None:
+        self.columns = columns
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.file.flush()
+
+class CsvWriter(RowWriter):
+    def write_header(self, columns: list[str]) -> None:
+        super().write_header(columns)
+        self.writer = csv.writer(self.file, lineterminator="\n")
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        self.writer.writerows([to_text(value) for value in row] for row in rows)
+
+def unique_names(columns: list[str]) -> list[str]:
+    # Columns sharing a name, as in `SELECT a.id, b.id`, are numbered from
+    # their second, skipping names of other columns
+    taken = set(columns)
+    names: list[str] = []
+    for column in columns:
+        name, number = column, 1
+        while name in names or (name != column and name in taken):
+            number += 1
+            name = "{}_{}".format(column, number)
+        names.append(name)
+    return names
+
+class JsonLinesWriter(RowWriter):
+    def write_header(self, columns: list[str]) -> None:
+        super().write_header(columns)
+        # Objects would otherwise keep only the last of columns sharing a
+        # name
+        self.keys = unique_names(columns)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        columns = self.keys
+        self.file.write(
+            "".join(
+                json.dumps(dict(zip(columns, row)), default=to_json) + "\n"
+                for row in rows
+            )
+        )
+
+class ColumnarWriter(RowWriter):
+    """Writes rows in textgres' compact binary columnar format.
+
+    The file starts with `COLUMNAR_MAGIC` and a length-prefixed JSON header
+    holding the column names and the byte order. Each batch of rows follows
+    as its row count and then each column in turn: a type code, a null mask
+    of one byte per row, and the values. Integers, floats, booleans, dates
+    and timestamps are stored as the raw arrays of a `ColumnarBuffer`, text
+    as UTF-8 with end offsets, and anything else as a JSON list of values
+    tagged with their types (see `tag_value`). A row count of zero ends the
+    file. Use `ColumnarReader` to read it back.
+
+    When `exact`, values which can't be read back as they were written
+    raise TypeError rather than being written as their text.
+    """
+
+    binary = True
+
+    def __init__(self, file: IO, exact: bool = False) -> None:
+        super().__init__(file)
+        self.exact = exact
+
+    def write_header(self, columns: list[str]) -> None:
+        super().write_header(columns)
+        header = json.dumps({"columns": columns, "byteorder": sys.byteorder}).encode()
+        self.file.write(COLUMNAR_MAGIC)
+        self.file.write(struct.pack("<I", len(header)))
+        self.file.write(header)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+
+        buffer = ColumnarBuffer(self.columns)
+        buffer.extend(rows)
+        self.file.write(struct.pack("<I", len(rows)))
+        for column in buffer.columns:
+            self.write_column(column)
+
+    def write_buffer(self, buffer: ColumnarBuffer) -> None:
+        # Writes rows already buffered as a single batch, straight from their
+        # columns
+        if len(buffer):
+            self.file.write(struct.pack("<I", len(buffer)))
+            for column in buffer.columns:
+                self.write_column(column)
+
+    def write_column(self, column: Column | None) -> None:
+        write = self.file.write
+        if column is None:
+            write(struct.pack("<B", 0))
+            return
+
+        code = TAGGED_OBJECT_CODE if isinstance(column, ObjectColumn) else COLUMN_CODES[type(column)]
+        write(struct.pack("<B", code))
+        write(column.nulls)
+        if isinstance(column, DatetimeColumn):
+            offset = column.tzinfo.utcoffset(None) if column.aware else None
+            seconds = int(offset.total_seconds()) if offset is not None else 0
+            write(struct.pack("<?i", offset is not None, seconds))
+        if isinstance(column, ArrayColumn):
+            write(column.data.tobytes())
+        elif isinstance(column, TextColumn):
+            write(column.offsets.tobytes())
+            write(column.data)
+        else:
+            data = json.dumps([tag_value(value, self.exact) for value in column.data]).encode()
+            write(struct.pack("<I", len(data)))
+            write(data)
+
+    def close(self) -> None:
+        self.file.write(struct.pack("<I", 0))
+        super().close()
+
+WRITERS: dict[str, type[RowWriter]] = {
+    "csv": CsvWriter,
+    "jsonl": JsonLinesWriter,
+    "columnar": ColumnarWriter,
+}
+
+def write_stream(
+    stream: "ResultStream",
+    writer: RowWriter,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    # Writes each batch as soon as it is fetched, so memory use is bounded by
+    # the stream's itersize however many rows there are
+    rows_written = 0
+    try:
+        if stream.columns:
+            writer.write_header(stream.columns)
+        while rows := stream.fetch():
+            writer.write_rows(rows)
+            rows_written += len(rows)
+            if progress is not None:
+                progress(rows_written)
+        if stream.columns:
+            writer.close()
+    finally:
+        stream.close()
+    return rows_written
+
+class ColumnarReader:
+    """Reads back the rows of a file written by `ColumnarWriter`."""
+
+    def __init__(self, file: IO[bytes]) -> None:
+        self.file = file
+        if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError("not a textgres columnar file")
+
+        header = json.loads(self.read(self.unpack("<I")))
+        self.columns: list[str] = header["columns"]
+        self.swap = header["byteorder"] != sys.byteorder
+
+    def read(self, size: int) -> bytes:
+        data = self.file.read(size)
+        if len(data) < size:
+            raise ValueError("truncated textgres columnar file")
+        return data
+
+    def unpack(self, format: str) -> Any:
+        values = struct.unpack(format, self.read(struct.calcsize(format)))
+        return values[0] if len(values) == 1 else values
+
+    def __iter__(self) -> Iterator[tuple]:
+        while count := self.unpack("<I"):
+            columns = [self.read_column(count) for _ in self.columns]
+            yield from zip(*columns)
+
+    def read_buffer(self) -> ColumnarBuffer:
+        buffer = ColumnarBuffer(self.columns)
+        buffer.extend(list(self))
+        return buffer
+
+    def read_column(self, count: int) -> list[Any]:
+        code = self.unpack("<B")
+        if code == 0:
+            return [None] * count
+
+        if code == TAGGED_OBJECT_CODE:
+            self.read(count)
+            return [untag_value(value) for value in json.loads(self.read(self.unpack("<I")))]
+
+        column = COLUMN_CLASSES[code]()
+        column.nulls = bytearray(self.read(count))
+        if isinstance(column, DatetimeColumn):
+            aware, offset = self.unpack("<?i")
+            column.aware = aware
+            column.tzinfo = timezone(timedelta(seconds=offset)) if aware else None
+        if isinstance(column, ArrayColumn):
+            column.data = self.read_array(column.typecode, count)
+        elif isinstance(column, TextColumn):
+            column.offsets = self.read_array("q", count)
+            column.data = bytearray(self.read(column.offsets[-1]))
+        else:
+            column.data = json.loads(self.read(self.unpack("<I")))
+        return [column.get(i) for i in range(count)]
+
+    def read_array(self, typecode: str, count: int) -> array:
+        values = array(typecode)
+        values.frombytes(self.read(values.itemsize * count))
+        if self.swap:
+            values.byteswap()
+        return values
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from time import monotonic
+from typing import TYPE_CHECKING, Callable, Optional
+
+from textgres.result_buffer import ColumnarBuffer
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# The most connections queried at once
+FANOUT_MAX_WORKERS = 8
+
+# The most rows kept from each connection; the rest are left on the server
+FANOUT_ROW_LIMIT = 10000
+
+# The column of the merged results naming the connection of each row
+SOURCE_COLUMN = "connection"
+
+@dataclass
+class ShardResult:
+    connection: "Connection"
+    elapsed: float = 0.0
+    columns: Optional[list[str]] = None
+    rows: Optional[list[tuple]] = None
+    # Affected or returned rows, when known
+    rowcount: Optional[int] = None
+    truncated: bool = False
+    error: Optional[Exception] = None
+    executed: bool = False
+
+@dataclass
+class FanoutResult:
+    shards: list[ShardResult]
+    # Every shard's rows, led by the name of its connection
+    columns: list[str]
+    buffer: ColumnarBuffer
+
+    @property
+    def failed(self) -> list[ShardResult]:
+        return [shard for shard in self.shards if shard.error is not None]
+
+class ColumnsMismatch(Exception):
+    pass
+
+def query_shard(connection: "Connection", query: str, limit: int = FANOUT_ROW_LIMIT) -> ShardResult:
+    # Streams at most `limit` rows of `query` from one connection; blocks on
+    # the database
+    result = ShardResult(connection)
+    started = monotonic()
+    try:
+        if not connection.connected:
+            connection.connect()
+        stream = connection.stream(query, min(limit, 1000))
+        try:
+            rows: list[tuple] = []
+            while len(rows) <= limit:
+                batch = stream.fetch()
+                if not batch:
+                    break
+                rows.extend(batch)
+        finally:
+            stream.close()
+
+        if stream.columns:
+            result.columns = stream.columns
+            result.truncated = len(rows) > limit
+            result.rows = rows[:limit]
+            result.rowcount = len(result.rows)
+        elif stream.rowcount >= 0:
+            result.rowcount = stream.rowcount
+    except Exception as e:
+        result.error = e
+    result.elapsed = monotonic() - started
+    result.executed = True
+    return result
+
+def run_fanout(
+    connections: list["Connection"],
+    query: str,
+    max_workers: int = FANOUT_MAX_WORKERS,
+    limit: int = FANOUT_ROW_LIMIT,
+    on_shard: Optional[Callable[[ShardResult, int], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> FanoutResult:
+    """Runs `query` on every connection, at most `max_workers` at a time,
+    and merges their rows into one buffer.
+
+    Each shard runs on a pooled connection of its own, like any query, so
+    `Connection.cancel` stops it. `on_shard` is called with each shard's
+    result and the number done so far as they finish; once `cancelled`
+    returns true, shards which haven't started are skipped. The merged
+    rows take the columns of the first shard, in the order of
+    `connections`; shards returning other columns are marked as failed.
+    """
+    shards = {id(connection): ShardResult(connection) for connection in connections}
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(min(max_workers, len(connections)), 1)) as executor:
+        def run(connection: "Connection") -> ShardResult:
+            if cancelled is not None and cancelled():
+                return ShardResult(connection)
+            return query_shard(connection, query, limit)
+
+        futures = [executor.submit(run, connection) for connection in connections]
+        for future in as_completed(futures):
+            shard = future.result()
+            shards[id(shard.connection)] = shard
+            done += 1
+            if on_shard is not None:
+                on_shard(shard, done)
+
+    ordered = [shards[id(connection)] for connection in connections]
+    columns: Optional[list[str]] = next((shard.columns for shard in ordered if shard.columns is not None), None)
+    buffer = ColumnarBuffer([SOURCE_COLUMN, *(columns or [])])
+    for shard in ordered:
+        if shard.columns is None:
+            continue
+        if shard.columns != columns:
+            shard.error = ColumnsMismatch(
+                "returned columns ({}) unlike the other connections".format(", ".join(shard.columns))
+            )
+            continue
+        name = shard.connection.name
+        buffer.extend([(name, *row) for row in shard.rows or []])
+        # The rows now live in the merged buffer
+        shard.rows = None
+
+    return FanoutResult(shards=ordered, columns=[SOURCE_COLUMN, *(columns or [])], buffer=buffer)
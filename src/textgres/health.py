@@ -0,0 +1,259 @@
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import time
+from typing import Callable, Optional
+
+# Sizes, statistics and the inputs of the bloat estimates of every table of
+# a schema, in one query. The estimates need the average width of each row,
+# which pg_stats only knows for analyzed tables.
+SCHEMA_TABLES_HEALTH_QUERY = """
+WITH widths AS (
+  SELECT s.tablename, sum((1 - s.null_frac) * s.avg_width) AS width
+  FROM pg_catalog.pg_stats s
+  WHERE s.schemaname = %(schema_name)s
+  GROUP BY s.tablename
+)
+SELECT
+  c.oid,
+  c.relname,
+  pg_catalog.pg_total_relation_size(c.oid),
+  pg_catalog.pg_relation_size(c.oid),
+  pg_catalog.pg_indexes_size(c.oid),
+  CASE WHEN c.reltoastrelid <> 0 THEN pg_catalog.pg_total_relation_size(c.reltoastrelid) ELSE 0 END,
+  c.reltuples,
+  c.relpages,
+  w.width,
+  coalesce(
+    (SELECT split_part(o, '=', 2)::int FROM unnest(c.reloptions) o WHERE o LIKE 'fillfactor=%%'),
+    100
+  ),
+  s.n_live_tup,
+  s.n_dead_tup,
+  greatest(s.last_vacuum, s.last_autovacuum),
+  greatest(s.last_analyze, s.last_autoanalyze)
+FROM pg_catalog.pg_class c
+LEFT JOIN pg_catalog.pg_stat_all_tables s ON s.relid = c.oid
+LEFT JOIN widths w ON w.tablename = c.relname
+WHERE c.relnamespace = %(schema)s
+  AND c.relkind IN ('r', 'm')
+"""
+
+# The same for the indexes of every table of a schema. Key widths are only
+# known for indexes on plain columns.
+SCHEMA_INDEXES_HEALTH_QUERY = """
+SELECT
+  ic.oid,
+  i.indrelid,
+  ic.relname,
+  am.amname,
+  i.indisunique,
+  i.indisprimary,
+  pg_catalog.pg_relation_size(ic.oid),
+  ic.reltuples,
+  ic.relpages,
+  (
+    SELECT CASE WHEN count(st.attname) = i.indnkeyatts THEN sum((1 - st.null_frac) * st.avg_width) END
+    FROM pg_catalog.pg_attribute a
+    LEFT JOIN pg_catalog.pg_stats st
+      ON st.schemaname = %(schema_name)s AND st.tablename = tc.relname AND st.attname = a.attname
+    WHERE a.attrelid = i.indrelid
+      AND a.attnum = ANY(i.indkey[0:i.indnkeyatts - 1])
+  ),
+  coalesce(
+    (SELECT split_part(o, '=', 2)::int FROM unnest(ic.reloptions) o WHERE o LIKE 'fillfactor=%%'),
+    90
+  ),
+  s.idx_scan,
+  s.idx_tup_read,
+  s.idx_tup_fetch
+FROM pg_catalog.pg_index i
+JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_catalog.pg_class tc ON tc.oid = i.indrelid
+JOIN pg_catalog.pg_am am ON am.oid = ic.relam
+LEFT JOIN pg_catalog.pg_stat_all_indexes s ON s.indexrelid = i.indexrelid
+WHERE tc.relnamespace = %(schema)s
+  AND tc.relkind IN ('r', 'm')
+"""
+
+BLOCK_SIZE_QUERY = "SELECT current_setting('block_size')::int"
+
+# Fixed sizes used by the bloat estimates: a heap tuple header, an index
+# tuple header, the line pointer of either, and a page header
+HEAP_TUPLE_HEADER = 24
+INDEX_TUPLE_HEADER = 8
+LINE_POINTER = 4
+PAGE_HEADER = 24
+
+# Tables with more of their tuples dead, or more of their pages bloated,
+# are candidates for VACUUM; indexes as bloated, for REINDEX
+DEAD_TUPLES_THRESHOLD = 0.2
+BLOAT_THRESHOLD = 0.3
+
+def align(size: float, alignment: int = 8) -> int:
+    return int(math.ceil(size / alignment) * alignment)
+
+def estimate_bloat(
+    pages: int,
+    tuples: float,
+    width: Optional[float],
+    fillfactor: int,
+    block_size: int,
+    tuple_header: int,
+) -> Optional[int]:
+    # The bytes of the pages beyond those needed to store `tuples` tuples
+    # of `width` bytes at the given fillfactor; unknown until the relation
+    # has been analyzed
+    if width is None or tuples < 0 or pages == 0:
+        return None
+    tuple_size = align(tuple_header + width) + LINE_POINTER
+    per_page = max(int((block_size - PAGE_HEADER) * fillfactor / 100 // tuple_size), 1)
+    expected = math.ceil(tuples / per_page)
+    return max(pages - expected, 0) * block_size
+
+@dataclass
+class IndexHealth:
+    oid: int
+    table_oid: int
+    name: str
+    method: str
+    unique: bool
+    primary: bool
+    size: int
+    bloat: Optional[int]
+    scans: Optional[int]
+    tuples_read: Optional[int]
+    tuples_fetched: Optional[int]
+
+    @property
+    def bloat_ratio(self) -> Optional[float]:
+        if self.bloat is None or not self.size:
+            return None
+        return self.bloat / self.size
+
+    @property
+    def unused(self) -> bool:
+        # Unique indexes enforce constraints even when never scanned
+        return self.scans == 0 and not self.unique
+
+    @property
+    def reindex_candidate(self) -> bool:
+        ratio = self.bloat_ratio
+        return ratio is not None and ratio >= BLOAT_THRESHOLD
+
+@dataclass
+class TableHealth:
+    oid: int
+    name: str
+    total_size: int
+    table_size: int
+    indexes_size: int
+    toast_size: int
+    bloat: Optional[int]
+    live_tuples: Optional[int]
+    dead_tuples: Optional[int]
+    last_vacuum: Optional[datetime]
+    last_analyze: Optional[datetime]
+    indexes: list[IndexHealth] = field(default_factory=list)
+
+    @property
+    def bloat_ratio(self) -> Optional[float]:
+        if self.bloat is None or not self.table_size:
+            return None
+        return self.bloat / self.table_size
+
+    @property
+    def dead_ratio(self) -> Optional[float]:
+        if self.dead_tuples is None or self.live_tuples is None:
+            return None
+        total = self.dead_tuples + self.live_tuples
+        return self.dead_tuples / total if total else 0.0
+
+    @property
+    def wasted(self) -> int:
+        # Estimated bloat of the table and of its indexes
+        return (self.bloat or 0) + sum(index.bloat or 0 for index in self.indexes)
+
+    @property
+    def vacuum_candidate(self) -> bool:
+        dead = self.dead_ratio
+        bloat = self.bloat_ratio
+        return (dead is not None and dead >= DEAD_TUPLES_THRESHOLD) or (
+            bloat is not None and bloat >= BLOAT_THRESHOLD
+        )
+
+@dataclass
+class SchemaHealth:
+    schema: str
+    # Keyed by the table's oid
+    tables: dict[int, TableHealth]
+    # Seconds since the epoch
+    loaded_at: float
+
+def load_schema_health(
+    fetch: Callable[[str, Optional[dict]], list[tuple]],
+    schema_oid: int,
+    schema_name: str,
+) -> SchemaHealth:
+    # Blocks on the database; `fetch` is `Catalog.fetch`
+    params = {"schema": schema_oid, "schema_name": schema_name}
+    block_size = fetch(BLOCK_SIZE_QUERY, None)[0][0]
+
+    tables = {}
+    for row in fetch(SCHEMA_TABLES_HEALTH_QUERY, params):
+        (oid, name, total_size, table_size, indexes_size, toast_size, tuples, pages,
+         width, fillfactor, live, dead, last_vacuum, last_analyze) = row
+        tables[oid] = TableHealth(
+            oid=oid,
+            name=name,
+            total_size=total_size,
+            table_size=table_size,
+            indexes_size=indexes_size,
+            toast_size=toast_size,
+            bloat=estimate_bloat(
+                pages,
+                tuples,
+                None if width is None else float(width),
+                fillfactor,
+                block_size,
+                HEAP_TUPLE_HEADER,
+            ),
+            live_tuples=live,
+            dead_tuples=dead,
+            last_vacuum=last_vacuum,
+            last_analyze=last_analyze,
+        )
+
+    for row in fetch(SCHEMA_INDEXES_HEALTH_QUERY, params):
+        (oid, table_oid, name, method, unique, primary, size, tuples, pages,
+         width, fillfactor, scans, tuples_read, tuples_fetched) = row
+        table = tables.get(table_oid)
+        if table is None:
+            continue
+        # The estimate only holds for B-trees; their metapage is left out
+        if method == "btree":
+            bloat = estimate_bloat(
+                max(pages - 1, 0),
+                tuples,
+                None if width is None else float(width),
+                fillfactor,
+                block_size,
+                INDEX_TUPLE_HEADER,
+            )
+        else:
+            bloat = None
+        table.indexes.append(IndexHealth(
+            oid=oid,
+            table_oid=table_oid,
+            name=name,
+            method=method,
+            unique=unique,
+            primary=primary,
+            size=size,
+            bloat=bloat,
+            scans=scans,
+            tuples_read=tuples_read,
+            tuples_fetched=tuples_fetched,
+        ))
+
+    return SchemaHealth(schema=schema_name, tables=tables, loaded_at=time())
@@ -0,0 +1,154 @@
+import queue
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from textual import log
+from time import monotonic
+from typing import Optional
+
+from textgres.store import ConnectionStore
+
+# Entries recorded within this many seconds of each other are written in one
+# transaction
+HISTORY_FLUSH_INTERVAL = 0.5
+
+# The most entries returned by a search
+HISTORY_SEARCH_LIMIT = 200
+
+# Newest first, which is also the order of the ids
+RECENT_QUERY = """
+SELECT id, connection_id, query, executed_at, duration, rows, error
+FROM history
+ORDER BY id DESC
+LIMIT ?
+"""
+
+SEARCH_QUERY = """
+SELECT h.id, h.connection_id, h.query, h.executed_at, h.duration, h.rows, h.error
+FROM history_fts f
+JOIN history h ON h.id = f.rowid
+WHERE history_fts MATCH ?
+ORDER BY f.rowid DESC
+LIMIT ?
+"""
+
+@dataclass
+class HistoryEntry:
+    query: str
+    connection_id: Optional[int]
+    # Seconds since the epoch
+    executed_at: float
+    duration: float
+    # Unknown for results which were still being streamed
+    rows: Optional[int] = None
+    error: Optional[str] = None
+    id: Optional[int] = None
+
+def match_expression(text: str) -> str:
+    # Every word typed must start a word of the query, in any order
+    return " ".join('"{}"*'.format(word) for word in re.findall(r"\w+", text))
+
+class QueryHistory:
+    """Every statement run in the app, stored alongside the connections.
+
+    `record` only queues an entry; a background thread writes queued entries
+    in batches over its own SQLite connection, so running a query never
+    waits on the history. Searches use the FTS5 index and may be run from
+    any thread, one at a time over a connection kept for reading. The
+    schema is part of the store's.
+    """
+
+    def __init__(self, store: Optional[ConnectionStore] = None) -> None:
+        self.store = store or ConnectionStore.default()
+        self._queue: queue.SimpleQueue[Optional[HistoryEntry]] = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_lock = threading.Lock()
+
+    def record(self, entry: HistoryEntry) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, name="history", daemon=True)
+                self._writer.start()
+        self._queue.put(entry)
+
+    def close(self) -> None:
+        # Writes whatever is still queued
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _write(self) -> None:
+        try:
+            conn = self.store.connect()
+        except sqlite3.Error as e:
+            log.error(e)
+            return
+        try:
+            closing = False
+            while not closing:
+                batch = [self._queue.get()]
+                deadline = monotonic() + HISTORY_FLUSH_INTERVAL
+                while batch[-1] is not None and (timeout := deadline - monotonic()) > 0:
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+
+                closing = batch[-1] is None
+                entries = [entry for entry in batch if entry is not None]
+                if entries:
+                    self._insert(conn, entries)
+        except sqlite3.Error as e:
+            log.error(e)
+        finally:
+            conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, entries: list[HistoryEntry]) -> None:
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO history (connection_id, query, executed_at, duration, rows, error) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (e.connection_id, e.query, e.executed_at, e.duration, e.rows, e.error)
+                        for e in entries
+                    ],
+                )
+        except sqlite3.Error as e:
+            log.error(e)
+
+    def search(self, text: str, limit: int = HISTORY_SEARCH_LIMIT) -> list[HistoryEntry]:
+        expression = match_expression(text)
+        try:
+            with self._reader_lock:
+                if self._reader is None:
+                    self._reader = self.store.connect()
+                if expression:
+                    rows = self._reader.execute(SEARCH_QUERY, (expression, limit)).fetchall()
+                else:
+                    rows = self._reader.execute(RECENT_QUERY, (limit,)).fetchall()
+        except sqlite3.Error as e:
+            log.error(e)
+            return []
+
+        return [
+            HistoryEntry(
+                id=id,
+                connection_id=connection_id,
+                query=query,
+                executed_at=executed_at,
+                duration=duration,
+                rows=rows,
+                error=error,
+            )
+            for id, connection_id, query, executed_at, duration, rows, error in rows
+        ]
@@ -0,0 +1,171 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from textgres.completion import quote_identifier
+
+# Types whose values may be large enough that only their start is fetched
+# with the rows of a result, by OID
+PREVIEW_TYPES = {
+    17: "bytea",
+    25: "text",
+    114: "json",
+    142: "xml",
+    1043: "varchar",
+    3802: "jsonb",
+}
+
+# The characters of a value fetched with its row, or bytes of a bytea; cells
+# are far narrower, and the whole value is loaded by the cell inspector
+PREVIEW_LENGTH = 256
+
+# The bytes of a bytea shown by the inspector's hex dump
+HEX_DUMP_LIMIT = 1 << 16
+
+# Names a query is wrapped under when previewing or loading its values
+SUBQUERY_ALIAS = "textgres_values"
+
+@dataclass(frozen=True)
+class Preview:
+    """The start of a value too large to be fetched with its row.
+
+    Previews order by their start, so that a column of them sorts among its
+    values which were fetched whole.
+    """
+
+    value: str | bytes
+    # Of the whole value, in bytes
+    size: int
+    # One of `PREVIEW_TYPES`
+    kind: str
+    # The position of the row in the query's result
+    row: int
+    column: str
+
+    def __str__(self) -> str:
+        return "{}…".format(format_bytes(self.value) if isinstance(self.value, bytes) else self.value)
+
+    def __lt__(self, other: Any) -> bool:
+        return self.value < (other.value if isinstance(other, Preview) else other)
+
+    def __gt__(self, other: Any) -> bool:
+        return self.value > (other.value if isinstance(other, Preview) else other)
+
+def format_bytes(value: bytes | memoryview) -> str:
+    # As Postgres shows bytea
+    return "\\x" + bytes(value).hex()
+
+def wrap_query(query: str) -> str:
+    # The query as a subquery; on lines of its own, so that a trailing
+    # comment doesn't swallow the rest
+    return "(\n{}\n) AS {}".format(query.rstrip().rstrip(";"), SUBQUERY_ALIAS)
+
+def value_expressions(name: str, kind: str, length: Optional[int] = None) -> tuple[str, str]:
+    # The value, or its first `length` characters or bytes, and its size
+    column = "{}.{}".format(SUBQUERY_ALIAS, quote_identifier(name))
+    if kind == "bytea":
+        value = column if length is None else "substring({} from 1 for {:d})".format(column, length)
+        return value, "octet_length({})".format(column)
+    if kind in ("json", "jsonb", "xml"):
+        # As text, so that psycopg2 doesn't parse the whole document
+        column = "{}::text".format(column)
+    value = column if length is None else "left({}, {:d})".format(column, length)
+    return value, "octet_length({})".format(column)
+
+def preview_query(cursor, query: str, length: int = PREVIEW_LENGTH) -> Optional[tuple[str, dict[int, str]]]:
+    """Rewrites a query returning rows to fetch only the first `length`
+    characters of its large values, followed by the size of each.
+
+    The query is described with `LIMIT 0` first, which plans but doesn't
+    run it. Returns the query and the kind of each previewed column by
+    position, or None when no column needs previewing or the columns can't
+    be told apart by name.
+    """
+    cursor.execute("SELECT * FROM {} LIMIT 0".format(wrap_query(query)))
+    names = [column.name for column in cursor.description]
+    kinds = {
+        index: PREVIEW_TYPES[column.type_code]
+        for index, column in enumerate(cursor.description)
+        if column.type_code in PREVIEW_TYPES
+    }
+    if not kinds or len(set(names)) < len(names):
+        return None
+
+    values = []
+    sizes = []
+    for index, name in enumerate(names):
+        if index not in kinds:
+            values.append("{}.{}".format(SUBQUERY_ALIAS, quote_identifier(name)))
+            continue
+        value, size = value_expressions(name, kinds[index], length)
+        values.append("{} AS {}".format(value, quote_identifier(name)))
+        sizes.append(size)
+
+    # Without an ORDER BY of its own the subquery's order is kept, which
+    # the positions of previewed rows rely on
+    return "SELECT {} FROM {}".format(", ".join(values + sizes), wrap_query(query)), kinds
+
+def apply_previews(rows: list[tuple], kinds: dict[int, str], width: int, start: int, names: list[str]) -> list[tuple]:
+    # Replaces the truncated values of rows fetched by a `preview_query`
+    # with a `Preview`, dropping the sizes that follow the columns; `start`
+    # is the position of the first row in the result
+    previewed = []
+    for position, row in enumerate(rows, start):
+        values = list(row[:width])
+        for size, (index, kind) in zip(row[width:], kinds.items()):
+            value = values[index]
+            if value is None:
+                continue
+            if kind == "bytea":
+                value = values[index] = bytes(value)
+                fetched = len(value)
+            else:
+                fetched = len(value.encode())
+            if size > fetched:
+                values[index] = Preview(value, size, kind, position, names[index])
+        previewed.append(tuple(values))
+    return previewed
+
+def load_value(cursor, query: str, preview: Preview) -> str | bytes:
+    """Fetches the whole of a previewed value by running its query again up
+    to its row.
+
+    Raises ValueError when the row found there isn't the one previewed, as
+    the query doesn't return its rows in a stable order or they changed.
+    """
+    value, size = value_expressions(preview.column, preview.kind)
+    cursor.execute("SELECT {}, {} FROM {} OFFSET {:d} LIMIT 1".format(value, size, wrap_query(query), preview.row))
+    row = cursor.fetchone()
+    if row is not None and row[0] is not None and preview.kind == "bytea":
+        row = (bytes(row[0]), row[1])
+    if row is None or row[0] is None or row[1] != preview.size or not row[0].startswith(preview.value):
+        raise ValueError(
+            "Row {} of the query has changed since it was run; run it again to inspect its values.".format(preview.row + 1)
+        )
+    return row[0]
+
+def pretty_json(value: Any) -> Optional[str]:
+    # JSON values, whether parsed or as text, indented; None when the value
+    # isn't JSON
+    if isinstance(value, str):
+        if not value.lstrip().startswith(("{", "[")):
+            return None
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    elif not isinstance(value, (dict, list)):
+        return None
+    return json.dumps(value, indent=2, ensure_ascii=False, default=str)
+
+def hex_dump(value: bytes, limit: int = HEX_DUMP_LIMIT) -> str:
+    # Offsets, 16 bytes in hex and as ASCII per line, up to `limit` bytes
+    lines = []
+    for offset in range(0, min(len(value), limit), 16):
+        chunk = value[offset:offset + 16]
+        hex_bytes = " ".join("{:02x}".format(byte) for byte in chunk)
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+        lines.append("{:08x}  {:<47}  {}".format(offset, hex_bytes, text))
+    if len(value) > limit:
+        lines.append("… {:,} more bytes".format(len(value) - limit))
+    return "\n".join(lines)
@@ -0,0 +1,206 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# A node whose actual rows differ from the planner's estimate by at least
+# this factor, either way, is flagged
+MISESTIMATE_FACTOR = 10.0
+
+# Shares of the whole plan's time (or cost, without ANALYZE) spent in a
+# single node above which it is highlighted
+HOT_SHARE = 0.3
+WARM_SHARE = 0.1
+
+# Nodes whose children run in parallel workers, and usually the leader too;
+# each process running a child counts as one of its loops
+GATHER_TYPES = ("Gather", "Gather Merge")
+
+# Details of a node shown alongside it; the rest of its keys are children or
+# figures which are summarized elsewhere
+DETAIL_KEYS = (
+    "Relation Name",
+    "Schema",
+    "Alias",
+    "Index Name",
+    "Join Type",
+    "Strategy",
+    "Parent Relationship",
+    "Subplan Name",
+    "CTE Name",
+    "Function Name",
+    "Index Cond",
+    "Recheck Cond",
+    "Hash Cond",
+    "Merge Cond",
+    "Join Filter",
+    "Filter",
+    "Rows Removed by Filter",
+    "Rows Removed by Join Filter",
+    "Rows Removed by Index Recheck",
+    "Sort Key",
+    "Sort Method",
+    "Sort Space Used",
+    "Sort Space Type",
+    "Group Key",
+    "Heap Fetches",
+    "Workers Planned",
+    "Workers Launched",
+    "Hash Buckets",
+    "Hash Batches",
+    "Peak Memory Usage",
+    "Output",
+)
+
+@dataclass
+class PlanNode:
+    node_type: str
+    # The raw node of the JSON plan, without its children
+    details: dict[str, Any]
+    startup_cost: float
+    total_cost: float
+    plan_rows: float
+    # The actual figures are only known with ANALYZE; times are inclusive of
+    # the children and summed over every loop, except that loops run at the
+    # same time by parallel processes count once
+    actual_rows: Optional[float] = None
+    actual_loops: Optional[float] = None
+    inclusive_time: Optional[float] = None
+    exclusive_time: Optional[float] = None
+    exclusive_cost: float = 0.0
+    shared_hit: int = 0
+    shared_read: int = 0
+    children: list["PlanNode"] = field(default_factory=list)
+    # Set once the whole plan is known, see `Plan`
+    share: float = 0.0
+
+    @property
+    def relation(self) -> Optional[str]:
+        return self.details.get("Relation Name") or self.details.get("Index Name")
+
+    @property
+    def executed(self) -> bool:
+        return self.actual_loops is not None and self.actual_loops > 0
+
+    @property
+    def misestimate(self) -> Optional[float]:
+        # How many times more (above 1) or fewer (below 1) rows there were
+        # than estimated, when flagged
+        if not self.executed or self.actual_rows is None:
+            return None
+        # Estimates and actual rows are both per loop; zero is counted as one
+        # so that empty results compare sensibly
+        ratio = max(self.actual_rows, 1.0) / max(self.plan_rows, 1.0)
+        if ratio >= MISESTIMATE_FACTOR or ratio <= 1 / MISESTIMATE_FACTOR:
+            return ratio
+        return None
+
+    @property
+    def seq_scan(self) -> bool:
+        return self.node_type in ("Seq Scan", "Parallel Seq Scan")
+
+    @property
+    def flags(self) -> list[str]:
+        flags = []
+        if self.seq_scan:
+            removed = self.details.get("Rows Removed by Filter")
+            if removed:
+                flags.append("seq scan, filter removed {:,.0f} rows".format(removed))
+            else:
+                flags.append("seq scan")
+        ratio = self.misestimate
+        if ratio is not None:
+            if ratio > 1:
+                flags.append("rows underestimated {:,.0f}×".format(ratio))
+            else:
+                flags.append("rows overestimated {:,.0f}×".format(1 / ratio))
+        return flags
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+@dataclass
+class Plan:
+    """A parsed `EXPLAIN (FORMAT JSON)` plan.
+
+    Each node's share of the plan is its exclusive time out of the total
+    when the plan was analyzed, or its exclusive cost otherwise.
+    """
+
+    root: PlanNode
+    analyzed: bool
+    planning_time: Optional[float] = None
+    execution_time: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        nodes = list(self.root.walk())
+        if self.analyzed:
+            total = sum(node.exclusive_time or 0.0 for node in nodes)
+            for node in nodes:
+                node.share = (node.exclusive_time or 0.0) / total if total else 0.0
+        else:
+            total = sum(node.exclusive_cost for node in nodes)
+            for node in nodes:
+                node.share = node.exclusive_cost / total if total else 0.0
+
+    @classmethod
+    def from_json(cls, value: Any) -> "Plan":
+        # psycopg2 parses json results, but a server may return them as text
+        if isinstance(value, str):
+            value = json.loads(value)
+        document = value[0]
+        root = parse_node(document["Plan"])
+        return cls(
+            root=root,
+            analyzed=root.actual_loops is not None,
+            planning_time=document.get("Planning Time"),
+            execution_time=document.get("Execution Time"),
+        )
+
+def parse_node(raw: dict[str, Any], processes: float = 1.0) -> PlanNode:
+    # `processes` is how many processes ran the node side by side
+    loops = raw.get("Actual Loops")
+    children_processes = processes
+    if raw["Node Type"] in GATHER_TYPES and loops:
+        # Found from the loops of the child, which every process runs once
+        # per loop of the Gather: the leader may or may not take part
+        children_loops = [child.get("Actual Loops") or 0 for child in raw.get("Plans", [])]
+        children_processes = max(max(children_loops, default=0) / loops, 1.0)
+    children = [parse_node(child, children_processes) for child in raw.get("Plans", [])]
+    details = {key: value for key, value in raw.items() if key != "Plans"}
+
+    node = PlanNode(
+        node_type=raw["Node Type"],
+        details=details,
+        startup_cost=raw.get("Startup Cost", 0.0),
+        total_cost=raw.get("Total Cost", 0.0),
+        plan_rows=raw.get("Plan Rows", 0.0),
+        actual_rows=raw.get("Actual Rows"),
+        actual_loops=raw.get("Actual Loops"),
+        shared_hit=raw.get("Shared Hit Blocks", 0),
+        shared_read=raw.get("Shared Read Blocks", 0),
+        children=children,
+    )
+
+    # Costs and times include the children, which are subtracted to find
+    # the time spent in the node itself; InitPlans may make this negative
+    node.exclusive_cost = max(
+        node.total_cost - sum(child.total_cost for child in children),
+        0.0,
+    )
+    if node.actual_loops is not None:
+        # Times are averaged over the loops, and the parallel processes
+        # spend theirs at the same time
+        node.inclusive_time = raw.get("Actual Total Time", 0.0) * node.actual_loops / processes
+        node.exclusive_time = max(
+            node.inclusive_time - sum(child.inclusive_time or 0.0 for child in children),
+            0.0,
+        )
+    return node
+
+def explain_statement(query: str, analyze: bool) -> str:
+    options = ["FORMAT JSON"]
+    if analyze:
+        options.extend(["ANALYZE", "BUFFERS"])
+    return "EXPLAIN ({}) {}".format(", ".join(options), query.strip().rstrip(";").rstrip())
@@ -0,0 +1,288 @@
+import psycopg2
+import threading
+from contextlib import contextmanager
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_UNKNOWN,
+    connection as PGConnection,
+)
+from dataclasses import dataclass
+from psycopg2.pool import PoolError
+from textual import log
+from time import monotonic
+from typing import Callable, Iterator, Optional
+
+# Connections idle for longer than this are probed with `SELECT 1` before they
+# are handed out again
+HEALTH_CHECK_INTERVAL = 30.0
+
+# How long to wait before reconnecting to a server which couldn't be
+# reached, doubled after each failure up to the maximum, in seconds
+RECONNECT_BACKOFF = 1.0
+RECONNECT_BACKOFF_MAX = 60.0
+
+@dataclass
+class PoolHealth:
+    """What the background probes of a pool last found."""
+
+    # Round trip of the fastest `SELECT 1`, in seconds
+    latency: Optional[float] = None
+    # Probes failed in a row, and when to try reconnecting again
+    failures: int = 0
+    retry_at: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def down(self) -> bool:
+        return self.failures > 0
+
+    def succeeded(self, latency: Optional[float]) -> None:
+        # No latency is measured when every connection is busy
+        if latency is not None:
+            self.latency = latency
+        self.failures = 0
+        self.error = None
+
+    def failed(self, error: Exception) -> None:
+        self.failures += 1
+        self.retry_at = monotonic() + min(RECONNECT_BACKOFF * 2 ** (self.failures - 1), RECONNECT_BACKOFF_MAX)
+        self.latency = None
+        self.error = str(error).strip()
+
+class ConnectionPool:
+    """A small, bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are opened on demand up to `maxconn`; borrowers block until
+    one is returned once the pool is exhausted. Idle connections beyond
+    `minconn` are closed after `max_idle` seconds, and connections which have
+    been idle for a while are health checked before being handed out.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], PGConnection],
+        minconn: int = 1,
+        maxconn: int = 4,
+        max_idle: float = 300.0,
+    ) -> None:
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_idle = max_idle
+
+        # Idle connections and when they were returned, most recent last
+        self._idle: list[tuple[PGConnection, float]] = []
+        self._in_use: set[PGConnection] = set()
+        # Slots reserved by borrowers opening a new connection
+        self._connecting = 0
+        # When idle connections were last found healthy by `probe`
+        self._checked_at: dict[PGConnection, float] = {}
+        self._condition = threading.Condition()
+        self.closed = False
+        self.health = PoolHealth()
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), monotonic()))
+
+    def getconn(self, timeout: Optional[float] = None) -> PGConnection:
+        with self._condition:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+
+                if len(self._in_use) + self._connecting < self.maxconn:
+                    conn, returned_at = None, None
+                    # Reserves the slot while connecting outside of the lock
+                    self._connecting += 1
+                    break
+
+                if not self._condition.wait(timeout):
+                    raise PoolError("connection pool exhausted")
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._condition:
+                    self._connecting -= 1
+                    self._condition.notify()
+                raise
+
+            with self._condition:
+                self._connecting -= 1
+                self._in_use.add(conn)
+            return conn
+
+        stale = monotonic() - max(returned_at, self._checked_at.get(conn, 0.0)) > HEALTH_CHECK_INTERVAL
+        if conn.closed or (stale and not self.is_healthy(conn)):
+            log("Replacing broken pooled connection")
+            self._close(conn)
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._condition:
+                    self._condition.notify()
+                raise
+
+        with self._condition:
+            self._in_use.add(conn)
+        return conn
+
+    def putconn(self, conn: PGConnection, close: bool = False) -> None:
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with a transaction left open
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._condition:
+            self._in_use.discard(conn)
+            if close or conn.closed or self.closed:
+                self._close(conn)
+            else:
+                self._idle.append((conn, monotonic()))
+            self._condition.notify()
+
+        self.evict_idle()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[PGConnection]:
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def evict_idle(self) -> None:
+        now = monotonic()
+        with self._condition:
+            # The oldest connections are at the front of the idle list
+            while len(self._idle) > self.minconn and now - self._idle[0][1] > self.max_idle:
+                conn, _ = self._idle.pop(0)
+                self._close(conn)
+
+    def is_healthy(self, conn: PGConnection) -> bool:
+        return self.ping(conn) is not None
+
+    def ping(self, conn: PGConnection) -> Optional[float]:
+        # The round trip of `SELECT 1` in seconds, or None when broken
+        if conn.closed:
+            return None
+
+        started = monotonic()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return None
+        return monotonic() - started
+
+    def probe(self) -> None:
+        """Pings the idle connections, replacing any which are broken, and
+        records the outcome in `health`. Blocks on the database.
+
+        Probed connections don't need to be checked again when they are
+        borrowed, so the first query after a long idle doesn't wait on a
+        health check or a reconnect. Once the server can't be reached, it is
+        only tried again after a growing backoff.
+        """
+        if self.health.down and monotonic() < self.health.retry_at:
+            return
+
+        with self._condition:
+            if self.closed:
+                return
+            # Lent to the probe, so that borrowers don't take them meanwhile
+            idle, self._idle = self._idle, []
+            self._in_use.update(conn for conn, _ in idle)
+
+        latencies = []
+        healthy = []
+        for conn, returned_at in idle:
+            latency = self.ping(conn)
+            if latency is None:
+                log("Replacing broken pooled connection")
+                self._close(conn)
+            else:
+                latencies.append(latency)
+                healthy.append((conn, returned_at))
+
+        with self._condition:
+            self._in_use.difference_update(conn for conn, _ in idle)
+            now = monotonic()
+            for conn, _ in healthy:
+                self._checked_at[conn] = now
+            # Keeps the idle list ordered by when connections were returned
+            self._idle = sorted([*self._idle, *healthy], key=lambda item: item[1])
+            missing = self.minconn - len(self._idle) - len(self._in_use) - self._connecting
+            self._connecting += max(missing, 0)
+            self._condition.notify_all()
+
+        # Reopens what's needed to keep `minconn` ready, which is also how a
+        # lost server is reconnected to
+        try:
+            for _ in range(max(missing, 0)):
+                conn = self._connect()
+                latency = self.ping(conn)
+                if latency is not None:
+                    latencies.append(latency)
+                with self._condition:
+                    self._connecting -= 1
+                    missing -= 1
+                    if self.closed:
+                        self._close(conn)
+                        continue
+                    self._idle.append((conn, monotonic()))
+                    self._checked_at[conn] = monotonic()
+                    self._condition.notify()
+        except psycopg2.Error as e:
+            with self._condition:
+                self._connecting -= max(missing, 0)
+                self._condition.notify_all()
+            log.error(e)
+            self.health.failed(e)
+            return
+
+        if idle and not healthy and not latencies:
+            self.health.failed(PoolError("every pooled connection was broken"))
+            return
+        self.health.succeeded(min(latencies) if latencies else None)
+
+    def closeall(self) -> None:
+        with self._condition:
+            self.closed = True
+            for conn, _ in self._idle:
+                self._close(conn)
+            self._idle.clear()
+            # Closing borrowed connections interrupts whatever they are running;
+            # they are discarded when returned
+            for conn in self._in_use:
+                self._close(conn)
+            self._condition.notify_all()
+
+    def _close(self, conn: PGConnection) -> None:
+        self._checked_at.pop(conn, None)
+        try:
+            conn.close()
+        except psycopg2.Error as e:
+            log.error(e)
+
+    @property
+    def size(self) -> int:
+        with self._condition:
+            return len(self._idle) + len(self._in_use) + self._connecting
+
+    @property
+    def in_use(self) -> list[PGConnection]:
+        with self._condition:
+            return list(self._in_use)
@@ -0,0 +1,393 @@
+import sys
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class Column:
+    """The values of one result column, stored compactly.
+
+    Typed columns keep their values in an `array` alongside a null mask.
+    `extend` raises `TypeError` when a value doesn't fit, in which case the
+    buffer falls back to an `ObjectColumn`.
+    """
+
+    kind = "object"
+
+    def __init__(self) -> None:
+        self.nulls = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def extend(self, values: Sequence[Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, index: int) -> Any:
+        raise NotImplementedError
+
+    def key(self, index: int) -> Any:
+        # The value used to order rows; cheaper than `get` where possible
+        return self.get(index)
+
+    def values(self) -> Iterable[Any]:
+        return (self.get(i) for i in range(len(self)))
+
+    def sort_keys(self, length: int) -> Sequence[Any]:
+        # The keys of the first `length` rows, indexable by row, for sorting
+        # and comparing many rows at once; null rows hold placeholders
+        return [self.key(i) for i in range(length)]
+
+    def non_null_indices(self) -> list[int]:
+        nulls = self.nulls
+        return [i for i in range(len(nulls)) if not nulls[i]]
+
+    def sort_indices(self, reverse: bool = False) -> list[int]:
+        # Nulls sort last regardless of direction, as in PostgreSQL's default
+        # for ascending order
+        indices = sorted(self.non_null_indices(), key=self.key, reverse=reverse)
+        nulls = self.nulls
+        indices.extend(i for i in range(len(nulls)) if nulls[i])
+        return indices
+
+    def min(self) -> Any:
+        indices = self.non_null_indices()
+        return self.get(min(indices, key=self.key)) if indices else None
+
+    def max(self) -> Any:
+        indices = self.non_null_indices()
+        return self.get(max(indices, key=self.key)) if indices else None
+
+    def distinct_count(self) -> int:
+        return len({self.key(i) for i in self.non_null_indices()})
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.nulls)
+
+class ArrayColumn(Column):
+    typecode = "q"
+    types: tuple[type, ...] = ()
+    # Stored in place of nulls so the arrays stay dense
+    fill: Any = 0
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.data = array(self.typecode)
+
+    def encode(self, value: Any) -> Any:
+        return value
+
+    def decode(self, value: Any) -> Any:
+        return value
+
+    def extend(self, values: Sequence[Any]) -> None:
+        encoded = []
+        nulls = bytearray(len(values))
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+                encoded.append(self.fill)
+            elif type(value) in self.types:
+                encoded.append(self.encode(value))
+            else:
+                raise TypeError(value)
+
+        # Extending the array first means a failed extend (e.g. an integer
+        # out of range) leaves the column unchanged
+        try:
+            self.data.extend(encoded)
+        except OverflowError as e:
+            raise TypeError(e)
+        self.nulls.extend(nulls)
+
+    def get(self, index: int) -> Any:
+        if self.nulls[index]:
+            return None
+        return self.decode(self.data[index])
+
+    def key(self, index: int) -> Any:
+        return self.data[index]
+
+    def sort_keys(self, length: int) -> Sequence[Any]:
+        # The encoded values already order like the values
+        return self.data[:length]
+
+    def min(self) -> Any:
+        values = [self.data[i] for i in self.non_null_indices()]
+        return self.decode(min(values)) if values else None
+
+    def max(self) -> Any:
+        values = [self.data[i] for i in self.non_null_indices()]
+        return self.decode(max(values)) if values else None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.nulls) + len(self.data) * self.data.itemsize
+
+class IntColumn(ArrayColumn):
+    kind = "int"
+    typecode = "q"
+    types = (int,)
+
+class FloatColumn(ArrayColumn):
+    kind = "float"
+    typecode = "d"
+    types = (float,)
+    fill = 0.0
+
+class BoolColumn(ArrayColumn):
+    kind = "bool"
+    typecode = "b"
+    types = (bool,)
+
+    def decode(self, value: int) -> bool:
+        return bool(value)
+
+class DateColumn(ArrayColumn):
+    kind = "date"
+    typecode = "i"
+    types = (date,)
+
+    def encode(self, value: date) -> int:
+        return value.toordinal()
+
+    def decode(self, value: int) -> date:
+        return date.fromordinal(value)
+
+class DatetimeColumn(ArrayColumn):
+    """Timestamps stored as microseconds since the epoch.
+
+    A column holds either naive or aware timestamps; aware values are kept
+    in UTC along with the first value's time zone, which is restored on
+    access. Values in any other offset demote the column.
+    """
+
+    kind = "datetime"
+    typecode = "q"
+    types = (datetime,)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tzinfo = None
+        self.aware: Optional[bool] = None
+
+    def encode(self, value: datetime) -> int:
+        aware = value.tzinfo is not None
+        if self.aware is None:
+            self.aware = aware
+            self.tzinfo = value.tzinfo
+        if aware != self.aware or (aware and value.utcoffset() != self.tzinfo.utcoffset(value)):
+            raise TypeError(value)
+
+        delta = value - (EPOCH_UTC if aware else EPOCH)
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+    def decode(self, value: int) -> datetime:
+        if self.aware:
+            return (EPOCH_UTC + timedelta(microseconds=value)).astimezone(self.tzinfo)
+        return EPOCH + timedelta(microseconds=value)
+
+class TextColumn(Column):
+    """Strings stored as one UTF-8 buffer indexed by end offsets."""
+
+    kind = "text"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.data = bytearray()
+        self.offsets = array("q")
+
+    def extend(self, values: Sequence[Any]) -> None:
+        if any(value is not None and type(value) is not str for value in values):
+            raise TypeError(values)
+
+        nulls = bytearray(len(values))
+        offsets = array("q")
+        end = len(self.data)
+        chunks = []
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+            else:
+                encoded = value.encode()
+                chunks.append(encoded)
+                end += len(encoded)
+            offsets.append(end)
+
+        self.data.extend(b"".join(chunks))
+        self.offsets.extend(offsets)
+        self.nulls.extend(nulls)
+
+    def raw(self, index: int) -> bytearray:
+        start = self.offsets[index - 1] if index > 0 else 0
+        return self.data[start:self.offsets[index]]
+
+    def get(self, index: int) -> Optional[str]:
+        if self.nulls[index]:
+            return None
+        return self.raw(index).decode()
+
+    def sort_keys(self, length: int) -> Sequence[Any]:
+        # UTF-8 bytes order like their code points, without decoding
+        if length == 0:
+            return []
+        data = bytes(self.data[:self.offsets[length - 1]])
+        ends = self.offsets[:length]
+        return [data[start:end] for start, end in zip([0, *ends[:-1]], ends)]
+
+    def distinct_count(self) -> int:
+        return len({bytes(self.raw(i)) for i in self.non_null_indices()})
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.nulls) + len(self.data) + len(self.offsets) * self.offsets.itemsize
+
+class ObjectColumn(Column):
+    """Any other values (numerics, JSON, arrays, ...) kept as Python objects."""
+
+    kind = "object"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.data: list[Any] = []
+
+    @classmethod
+    def from_column(cls, column: Column) -> "ObjectColumn":
+        demoted = cls()
+        demoted.extend(list(column.values()))
+        return demoted
+
+    def extend(self, values: Sequence[Any]) -> None:
+        self.data.extend(values)
+        self.nulls.extend(value is None for value in values)
+
+    def get(self, index: int) -> Any:
+        return self.data[index]
+
+    def key(self, index: int) -> Any:
+        return object_key(self.data[index])
+
+    def distinct_count(self) -> int:
+        try:
+            return len({self.data[i] for i in self.non_null_indices()})
+        except TypeError:
+            return len({repr(self.data[i]) for i in self.non_null_indices()})
+
+    @property
+    def nbytes(self) -> int:
+        # Estimated from evenly spaced values, as sizing every object of a
+        # large column would take longer than fetching it
+        data = self.data
+        step = max(len(data) // 1000, 1)
+        sample = data[::step]
+        average = sum(sys.getsizeof(value) for value in sample) / len(sample) if sample else 0
+        return len(self.nulls) + len(data) * (8 + int(average))
+
+def object_key(value: Any) -> tuple:
+    # Orders values of any types against each other: numbers first, then
+    # text, then other values which order among their own type (grouped by
+    # type), and the rest, such as JSON documents and arrays, by their text
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) and value == value:
+        return (0, "", value)
+    if isinstance(value, str):
+        return (1, "", value)
+    if not isinstance(value, (dict, list, tuple)):
+        try:
+            value < value
+            return (2, type(value).__name__, value)
+        except TypeError:
+            pass
+    return (3, "", str(value))
+
+# Tried in order against the first non-null value of a column; bool precedes
+# int as it is a subclass of it
+COLUMN_TYPES: list[tuple[type, Callable[[], Column]]] = [
+    (bool, BoolColumn),
+    (int, IntColumn),
+    (float, FloatColumn),
+    (datetime, DatetimeColumn),
+    (date, DateColumn),
+    (str, TextColumn),
+]
+
+def column_for(value: Any) -> Column:
+    for value_type, column_type in COLUMN_TYPES:
+        if type(value) is value_type:
+            return column_type()
+    return ObjectColumn()
+
+class ColumnarBuffer:
+    """A result set stored column by column.
+
+    Numeric, boolean and temporal columns are kept in typed arrays and text in
+    offset-indexed UTF-8 buffers, so millions of rows take a fraction of the
+    memory of a list of tuples. Rows remain randomly accessible for the
+    results grid.
+    """
+
+    def __init__(self, columns: list[str]) -> None:
+        self.names = columns
+        self.columns: list[Optional[Column]] = [None] * len(columns)
+        # Leading nulls of columns whose type isn't known yet
+        self._pending_nulls = [0] * len(columns)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def extend(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows or not self.names:
+            return
+
+        for index, values in enumerate(zip(*rows)):
+            self._extend_column(index, values)
+
+        # Updated last so readers on other threads never see a partial row
+        self._length += len(rows)
+
+    def _extend_column(self, index: int, values: Sequence[Any]) -> None:
+        column = self.columns[index]
+        if column is None:
+            first = next((value for value in values if value is not None), None)
+            if first is None:
+                self._pending_nulls[index] += len(values)
+                return
+
+            column = column_for(first)
+            column.extend([None] * self._pending_nulls[index])
+            self.columns[index] = column
+
+        try:
+            column.extend(values)
+        except TypeError:
+            column = ObjectColumn.from_column(column)
+            column.extend(values)
+            self.columns[index] = column
+
+    def get(self, row: int, column: int) -> Any:
+        values = self.columns[column]
+        return None if values is None else values.get(row)
+
+    def row(self, index: int) -> tuple:
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return tuple(
+            None if column is None else column.get(index)
+            for column in self.columns
+        )
+
+    def column(self, index: int) -> Column:
+        column = self.columns[index]
+        if column is None:
+            # Every value so far is null
+            column = ObjectColumn()
+            column.extend([None] * self._length)
+        return column
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns if column is not None)
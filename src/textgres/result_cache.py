@@ -0,0 +1,257 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from textual import log
+from time import time
+from typing import Optional
+
+from textgres.export import ColumnarReader, ColumnarWriter
+from textgres.result_buffer import ColumnarBuffer
+from textgres.sql import normalize_query
+
+# The most memory taken by cached results across every connection
+RESULT_CACHE_MEMORY_BUDGET = 256 << 20
+
+# Results evicted from memory are written to this directory, when it is set,
+# and kept until they take up more than the disk budget
+RESULT_CACHE_DIR_VARIABLE = "TEXTGRES_RESULT_CACHE_DIR"
+RESULT_CACHE_DISK_BUDGET = 1 << 30
+
+CacheKey = tuple[int, str]
+
+@dataclass
+class CachedResult:
+    columns: list[str]
+    buffer: ColumnarBuffer
+    # Seconds since the epoch
+    cached_at: float
+    nbytes: int
+
+    def expired(self, ttl: float) -> bool:
+        return time() - self.cached_at > ttl
+
+class CachedStream:
+    """Stands in for a `ResultStream` when a result is served from the cache.
+
+    Every row is already in `buffer`, which `RowSource` reads from directly
+    rather than copying.
+    """
+
+    def __init__(self, result: CachedResult) -> None:
+        self.columns = result.columns
+        self.buffer = result.buffer
+        self.cached_at = result.cached_at
+        self.rowcount = len(result.buffer)
+        self.rows_fetched = len(result.buffer)
+        self.exhausted = True
+        self.closed = True
+        self.on_complete = None
+
+    def fetch(self) -> list[tuple]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+class ResultCache:
+    """Complete result sets of read-only queries, keyed by connection and
+    normalized query text.
+
+    Results are evicted least recently used first once they take more than
+    `memory_budget` bytes. With a `spill_dir`, evicted results are written
+    there in textgres' columnar format (see `ColumnarWriter`) in a
+    background thread instead of being dropped, and read back on their next
+    use exactly as they were; results holding values of types the format
+    can't restore are dropped instead. A spill which finishes after its connection's results were
+    invalidated is dropped. Freshness is decided by the caller, which passes
+    the TTL of the connection to `get`. Every method may be called from any
+    thread.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = RESULT_CACHE_MEMORY_BUDGET,
+        spill_dir: Optional[str] = None,
+        disk_budget: int = RESULT_CACHE_DISK_BUDGET,
+    ) -> None:
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.disk_budget = disk_budget
+        self._entries: OrderedDict[CacheKey, CachedResult] = OrderedDict()
+        # Spilled results by key, with their size on disk and when they were
+        # cached
+        self._spilled: OrderedDict[CacheKey, tuple[int, float]] = OrderedDict()
+        self._memory = 0
+        self._disk = 0
+        # Bumped as a connection's results are invalidated, and as the cache
+        # is cleared, so that spills started before can be told apart
+        self._generations: dict[int, int] = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> "ResultCache":
+        return cls(spill_dir=os.environ.get(RESULT_CACHE_DIR_VARIABLE) or None)
+
+    @staticmethod
+    def key(connection_id: int, query: str) -> CacheKey:
+        return (connection_id, normalize_query(query))
+
+    def get(self, connection_id: int, query: str, ttl: float) -> Optional[CachedResult]:
+        key = self.key(connection_id, query)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                if result.expired(ttl):
+                    self._discard(key)
+                    return None
+                self._entries.move_to_end(key)
+                return result
+
+            if key not in self._spilled:
+                return None
+            size, cached_at = self._spilled.pop(key)
+            self._disk -= size
+
+        result = self._read_spilled(key, cached_at)
+        if result is None or result.expired(ttl):
+            return None
+        self._store(key, result)
+        return result
+
+    def put(self, connection_id: int, query: str, columns: list[str], buffer: ColumnarBuffer) -> None:
+        nbytes = buffer.nbytes
+        # A result larger than the whole budget would evict everything else
+        if nbytes > self.memory_budget:
+            return
+
+        result = CachedResult(columns=columns, buffer=buffer, cached_at=time(), nbytes=nbytes)
+        self._store(self.key(connection_id, query), result)
+
+    def invalidate(self, connection_id: int) -> None:
+        # Drops every result of a connection, e.g. after it ran a write
+        with self._lock:
+            self._generations[connection_id] = self._generations.get(connection_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == connection_id]:
+                self._discard(key)
+            spilled = [key for key in self._spilled if key[0] == connection_id]
+            for key in spilled:
+                self._disk -= self._spilled.pop(key)[0]
+        for key in spilled:
+            self._remove_spilled(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+            spilled = list(self._spilled)
+            self._spilled.clear()
+            self._memory = 0
+            self._disk = 0
+        for key in spilled:
+            self._remove_spilled(key)
+
+    def _store(self, key: CacheKey, result: CachedResult) -> None:
+        evicted = []
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = result
+            self._memory += result.nbytes
+            while self._memory > self.memory_budget:
+                evicted_key, evicted_result = self._entries.popitem(last=False)
+                self._memory -= evicted_result.nbytes
+                evicted.append((evicted_key, evicted_result, self._generation(evicted_key[0])))
+
+        if evicted and self.spill_dir is not None:
+            # Writing a large result takes a while, and results are usually
+            # cached from the event loop
+            threading.Thread(
+                target=self._spill,
+                args=(evicted,),
+                name="result-cache",
+                daemon=True,
+            ).start()
+
+    def _discard(self, key: CacheKey) -> None:
+        # Called with the lock held
+        result = self._entries.pop(key, None)
+        if result is not None:
+            self._memory -= result.nbytes
+
+    def _generation(self, connection_id: int) -> tuple[int, int]:
+        # Called with the lock held
+        return (self._clears, self._generations.get(connection_id, 0))
+
+    def _spill(self, evicted: list[tuple[CacheKey, CachedResult, tuple[int, int]]]) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for key, result, generation in evicted:
+            partial = None
+            try:
+                # Written aside and renamed into place, so that a reader never
+                # sees a partial file
+                descriptor, partial = tempfile.mkstemp(dir=self.spill_dir, suffix=".partial")
+                with open(descriptor, "wb") as file:
+                    # A result with values the file can't hold exactly
+                    # isn't spilled, so that it never reads back changed
+                    writer = ColumnarWriter(file, exact=True)
+                    writer.write_header(result.columns)
+                    writer.write_buffer(result.buffer)
+                    writer.close()
+                size = os.path.getsize(partial)
+            except (OSError, TypeError, ValueError) as e:
+                log.error(e)
+                if partial is not None:
+                    self._remove_file(partial)
+                continue
+
+            removed = []
+            with self._lock:
+                if self._generation(key[0]) != generation:
+                    # Invalidated while it was being written
+                    self._remove_file(partial)
+                    continue
+                try:
+                    os.replace(partial, self._spill_path(key))
+                except OSError as e:
+                    log.error(e)
+                    self._remove_file(partial)
+                    continue
+                if key in self._spilled:
+                    self._disk -= self._spilled.pop(key)[0]
+                self._spilled[key] = (size, result.cached_at)
+                self._disk += size
+                while self._disk > self.disk_budget and self._spilled:
+                    removed_key, (removed_size, _) = self._spilled.popitem(last=False)
+                    self._disk -= removed_size
+                    removed.append(removed_key)
+            for removed_key in removed:
+                self._remove_spilled(removed_key)
+
+    def _read_spilled(self, key: CacheKey, cached_at: float) -> Optional[CachedResult]:
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as file:
+                reader = ColumnarReader(file)
+                buffer = reader.read_buffer()
+        except (OSError, ValueError) as e:
+            log.error(e)
+            return None
+        finally:
+            self._remove_spilled(key)
+        return CachedResult(columns=reader.columns, buffer=buffer, cached_at=cached_at, nbytes=buffer.nbytes)
+
+    def _remove_spilled(self, key: CacheKey) -> None:
+        self._remove_file(self._spill_path(key))
+
+    def _remove_file(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _spill_path(self, key: CacheKey) -> str:
+        digest = hashlib.sha256("{}:{}".format(*key).encode()).hexdigest()
+        return os.path.join(self.spill_dir, "{}.tgcol".format(digest))
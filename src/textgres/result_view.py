@@ -0,0 +1,322 @@
+import operator
+import re
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import accumulate, compress
+from typing import Any, Callable, Optional
+
+from textgres.result_buffer import (
+    ArrayColumn,
+    BoolColumn,
+    Column,
+    ColumnarBuffer,
+    DateColumn,
+    DatetimeColumn,
+    FloatColumn,
+    IntColumn,
+    TextColumn,
+)
+
+# A clause of a filter: a column, optionally double-quoted, then an operator
+# and a value, optionally single-quoted, or IS [NOT] NULL
+CLAUSE_PATTERN = re.compile(
+    r"""\s*(?:"(?P<quoted>(?:[^"]|"")+)"|(?P<name>[^\s=!<>~]+))\s*"""
+    r"""(?:(?P<null>is\s+(?:not\s+)?null)|(?P<op>!=|<>|<=|>=|!~|=|<|>|~)\s*(?:'(?P<string>(?:[^']|'')*)'|(?P<value>.*?)))\s*$""",
+    re.IGNORECASE,
+)
+
+# Comparisons of a column's keys with a constant, as the constant's methods,
+# so that a whole column is compared by a single `map`
+COMPARISONS: dict[str, Callable[[Any], Callable[[Any], Any]]] = {
+    "=": lambda constant: constant.__eq__,
+    "!=": lambda constant: constant.__ne__,
+    "<": lambda constant: constant.__gt__,
+    "<=": lambda constant: constant.__ge__,
+    ">": lambda constant: constant.__lt__,
+    ">=": lambda constant: constant.__le__,
+}
+
+@dataclass
+class Predicate:
+    column: int
+    # One of `COMPARISONS`, "~" and "!~" for contains and doesn't contain,
+    # or "is null" and "is not null"
+    op: str
+    value: Any = None
+
+    def describe(self, names: list[str]) -> str:
+        if self.op in ("is null", "is not null"):
+            return "{} {}".format(names[self.column], self.op)
+        return "{} {} {}".format(names[self.column], self.op, self.value)
+
+def parse_filter(text: str, names: list[str]) -> list[Predicate]:
+    """Parses clauses like `age >= 30 and name ~ smith`, joined by AND.
+
+    `~` and `!~` test whether a value contains the text, ignoring the case
+    of ASCII letters. Values are compared as the column's type; rows with a
+    null in the column never match a comparison. Raises ValueError.
+    """
+    predicates = []
+    for clause in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE):
+        if not clause:
+            continue
+        match = CLAUSE_PATTERN.match(clause)
+        if match is None:
+            raise ValueError("can't read \"{}\"; expected a column, an operator and a value".format(clause))
+
+        name = match["quoted"].replace('""', '"') if match["quoted"] else match["name"]
+        column = next((i for i, n in enumerate(names) if n == name), None)
+        if column is None:
+            column = next((i for i, n in enumerate(names) if n.lower() == name.lower()), None)
+        if column is None:
+            raise ValueError("there is no column \"{}\"".format(name))
+
+        if match["null"]:
+            predicates.append(Predicate(column, " ".join(match["null"].lower().split())))
+            continue
+
+        op = "!=" if match["op"] == "<>" else match["op"]
+        value = match["string"].replace("''", "'") if match["string"] is not None else match["value"]
+        predicates.append(Predicate(column, op, value))
+    return predicates
+
+def convert_value(column: Column, value: str) -> Any:
+    # The constant a column's sort keys are compared with
+    try:
+        if isinstance(column, BoolColumn):
+            if value.lower() not in ("true", "false", "t", "f"):
+                raise ValueError
+            return int(value.lower() in ("true", "t"))
+        if isinstance(column, IntColumn):
+            number = Decimal(value)
+            # Compared as floats when not a whole number
+            return int(number) if number == number.to_integral_value() else float(number)
+        if isinstance(column, FloatColumn):
+            return float(value)
+        if isinstance(column, DateColumn):
+            return column.encode(date.fromisoformat(value))
+        if isinstance(column, DatetimeColumn):
+            parsed = datetime.fromisoformat(value)
+            # Naive values are taken to be in the column's time zone
+            if column.aware and parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=column.tzinfo)
+            elif not column.aware:
+                parsed = parsed.replace(tzinfo=None)
+            probe = DatetimeColumn()
+            probe.aware, probe.tzinfo = column.aware, parsed.tzinfo
+            return probe.encode(parsed)
+        if isinstance(column, TextColumn):
+            return value.encode()
+    except (ValueError, InvalidOperation):
+        raise ValueError("\"{}\" isn't a {} value".format(value, column.kind))
+
+    # Other columns, like numerics, are compared as numbers when they can be
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return value
+
+def and_masks(a: bytes, b: bytes) -> bytes:
+    # Masks hold a byte of 0 or 1 per row, so they can be combined as a
+    # whole with integer arithmetic
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+def without_nulls(mask: bytes, nulls: bytes) -> bytes:
+    if nulls.find(1) == -1:
+        return mask
+    return (int.from_bytes(mask, "little") & ~int.from_bytes(nulls, "little")).to_bytes(len(mask), "little")
+
+def text_contains(column: TextColumn, haystack: bytes, needle: str, length: int) -> bytes:
+    # Searches the column's whole UTF-8 buffer at once, mapping each match
+    # back to its row; `haystack` is the buffer with ASCII letters lowered
+    target = needle.encode().lower()
+    if not target:
+        return without_nulls(b"\x01" * length, column.nulls[:length])
+
+    mask = bytearray(length)
+    offsets = column.offsets
+    pos = haystack.find(target)
+    while pos != -1:
+        row = bisect_right(offsets, pos, 0, length)
+        if pos + len(target) <= offsets[row]:
+            mask[row] = 1
+            pos = haystack.find(target, offsets[row])
+        else:
+            # The match straddles two rows
+            pos = haystack.find(target, pos + 1)
+    return bytes(mask)
+
+def format_column(column: Column, length: int) -> TextColumn:
+    # The first `length` values of a column as text, to be searched
+    formatted = TextColumn()
+    if not isinstance(column, ArrayColumn):
+        formatted.extend([None if value is None else str(value) for value in map(column.get, range(length))])
+        return formatted
+
+    # Numbers, booleans and dates format as ASCII, so their text can be
+    # joined and indexed as a whole rather than value by value
+    values = list(map(str, map(column.decode, column.data[:length])))
+    nulls = column.nulls[:length]
+    for row in compress(range(length), nulls):
+        values[row] = ""
+    formatted.data = bytearray("".join(values).encode())
+    formatted.offsets = array("q", accumulate(map(len, values)))
+    formatted.nulls = bytearray(nulls)
+    return formatted
+
+class ResultView:
+    """The loaded rows of a result, sorted and filtered on the client.
+
+    Sorting a column builds an index of its rows in ascending order once,
+    from the column's compact keys; both directions and any filter reuse
+    it. Filters are evaluated a column at a time into masks of the rows
+    they keep, rather than row by row. Rows loaded after the view was
+    computed aren't part of it.
+    """
+
+    def __init__(self, buffer: ColumnarBuffer) -> None:
+        self.buffer = buffer
+        # Column and whether descending
+        self.sort: Optional[tuple[int, bool]] = None
+        self.filters: list[Predicate] = []
+        # The buffer row of each row of the view; None shows the rows as
+        # loaded
+        self.rows: Optional[array] = None
+        # Caches by column, along with the number of rows they cover
+        self._indexes: dict[int, tuple[int, array, int]] = {}
+        self._keys: dict[int, tuple[int, Any]] = {}
+        self._haystacks: dict[int, tuple[int, TextColumn, bytes]] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.rows is not None
+
+    def __len__(self) -> int:
+        return len(self.buffer) if self.rows is None else len(self.rows)
+
+    def buffer_row(self, index: int) -> int:
+        return index if self.rows is None else self.rows[index]
+
+    def apply(self, sort: Optional[tuple[int, bool]], filters: list[Predicate], rows: Optional[array]) -> None:
+        self.sort = sort
+        self.filters = filters
+        self.rows = rows
+
+    def compute(self, sort: Optional[tuple[int, bool]], filters: list[Predicate]) -> Optional[array]:
+        # The rows of the view with `sort` and `filters`; may run in a worker
+        if sort is None and not filters:
+            return None
+
+        length = len(self.buffer)
+        mask = None
+        for predicate in filters:
+            predicate_mask = self.evaluate(predicate, length)
+            mask = predicate_mask if mask is None else and_masks(mask, predicate_mask)
+
+        if sort is None:
+            return array("q", compress(range(length), mask))
+
+        column, descending = sort
+        order = self.sort_index(column, length, descending)
+        if mask is None:
+            return order
+        return array("q", compress(order, map(mask.__getitem__, order)))
+
+    def sort_index(self, index: int, length: int, descending: bool) -> array:
+        cached = self._indexes.get(index)
+        if cached is None or cached[0] != length:
+            column = self.buffer.column(index)
+            keys = self.sort_keys(index, length)
+            nulls = column.nulls[:length]
+            if nulls.find(1) == -1:
+                ascending = array("q", sorted(range(length), key=keys.__getitem__))
+                present = length
+            else:
+                # Nulls sort last in either direction
+                rows = [i for i in range(length) if not nulls[i]]
+                present = len(rows)
+                rows.sort(key=keys.__getitem__)
+                rows.extend(i for i in range(length) if nulls[i])
+                ascending = array("q", rows)
+            cached = self._indexes[index] = (length, ascending, present)
+
+        _, ascending, present = cached
+        if not descending:
+            return ascending
+        return ascending[present - 1::-1] + ascending[present:] if present else array("q", ascending)
+
+    def sort_keys(self, index: int, length: int) -> Any:
+        cached = self._keys.get(index)
+        if cached is None or cached[0] != length:
+            cached = self._keys[index] = (length, self.buffer.column(index).sort_keys(length))
+        return cached[1]
+
+    def evaluate(self, predicate: Predicate, length: int) -> bytes:
+        column = self.buffer.column(predicate.column)
+        nulls = column.nulls[:length]
+        if predicate.op == "is null":
+            return bytes(nulls)
+        if predicate.op == "is not null":
+            return without_nulls(b"\x01" * length, nulls)
+
+        if predicate.op in ("~", "!~"):
+            contains = self.contains(predicate.column, str(predicate.value), length)
+            if predicate.op == "~":
+                return contains
+            return without_nulls(bytes(map(operator.not_, contains)), nulls)
+
+        constant = convert_value(column, predicate.value)
+        if isinstance(column, (ArrayColumn, TextColumn)):
+            keys = self.sort_keys(predicate.column, length)
+            mask = bytes(map(COMPARISONS[predicate.op](constant), keys))
+        else:
+            # The keys of other columns rank mixed values, so the values
+            # themselves are compared; they may not be comparable directly
+            mask = bytes(safe_compare(predicate.op, column.get(i), constant) for i in range(length))
+        return without_nulls(mask, nulls)
+
+    def contains(self, index: int, needle: str, length: int) -> bytes:
+        # Which rows of a column contain `needle` once formatted as text
+        cached = self._haystacks.get(index)
+        if cached is None or cached[0] != length:
+            column = self.buffer.column(index)
+            if not isinstance(column, TextColumn):
+                column = format_column(column, length)
+            end = column.offsets[length - 1] if length else 0
+            cached = self._haystacks[index] = (length, column, bytes(column.data[:end]).lower())
+        _, column, haystack = cached
+        return text_contains(column, haystack, needle, length)
+
+    def search(self, text: str) -> bytes:
+        # The buffer rows with a value containing `text`
+        length = len(self.buffer)
+        mask = None
+        for index in range(len(self.buffer.names)):
+            contains = self.contains(index, text, length)
+            mask = contains if mask is None else (
+                int.from_bytes(mask, "little") | int.from_bytes(contains, "little")
+            ).to_bytes(length, "little")
+        return mask or b""
+
+    def find(self, mask: bytes, start: int, backward: bool = False) -> Optional[int]:
+        # The first row of the view from `start` whose buffer row is set in
+        # `mask`, searching towards the end, or the start when `backward`
+        if self.rows is not None:
+            # The mask covers every row loaded when it was made, so every
+            # row of the view
+            mask = bytes(map(mask.__getitem__, self.rows))
+        if backward:
+            index = mask.rfind(1, 0, start + 1)
+        else:
+            index = mask.find(1, start)
+        return None if index == -1 else index
+
+def safe_compare(op: str, key: Any, constant: Any) -> bool:
+    result = COMPARISONS[op](constant)(key)
+    if result is NotImplemented:
+        # Compared as text when the types don't compare
+        return bool(COMPARISONS[op](str(constant))(str(key)))
+    return bool(result)
@@ -0,0 +1,73 @@
+from typing import TYPE_CHECKING, Any, Sequence
+
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_cache import CachedStream
+from textgres.result_view import ResultView
+
+if TYPE_CHECKING:
+    from textgres.connection import ResultStream
+
+# The most rows of a result kept in memory; once reached the stream is
+# closed and the rest left on the server. Exporting the query streams every
+# row instead.
+RESULT_ROW_LIMIT = 1000000
+
+class RowSource:
+    """The rows of a result set, addressable by index.
+
+    Rows are fetched from `stream` a page at a time and kept in a columnar
+    buffer so that the results grid can render any loaded row without
+    touching the server, up to `limit` rows. Results served from the cache
+    share its buffer.
+    """
+
+    def __init__(self, stream: "ResultStream | CachedStream", limit: int = RESULT_ROW_LIMIT) -> None:
+        self.stream = stream
+        self.limit = limit
+        # Whether rows were left unfetched at the limit
+        self.truncated = False
+        self.columns: list[str] = stream.columns
+        self.rowcount = stream.rowcount
+        if isinstance(stream, CachedStream):
+            self.buffer = stream.buffer
+        else:
+            self.buffer = ColumnarBuffer(stream.columns)
+        # The order and filters the rows are shown with; rows are addressed
+        # by their index in the view
+        self.view = ResultView(self.buffer)
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def row(self, index: int) -> Sequence[Any]:
+        return self.buffer.row(self.view.buffer_row(index))
+
+    def sample(self, size: int, start: int = 0) -> list[Sequence[Any]]:
+        # By index in the buffer, as pages are measured when they arrive
+        end = min(start + size, len(self.buffer))
+        return [self.buffer.row(i) for i in range(start, end)]
+
+    def fetch_page(self) -> int:
+        # Blocks on the server; called from a worker thread
+        rows = self.stream.fetch()
+        room = self.limit - len(self.buffer)
+        if len(rows) > room:
+            rows = rows[:room]
+            self.truncated = True
+            # A partial result is never cached
+            self.stream.on_complete = None
+            self.stream.close()
+        self.buffer.extend(rows)
+
+        on_complete = self.stream.on_complete
+        if on_complete is not None and self.stream.exhausted:
+            self.stream.on_complete = None
+            on_complete(self.buffer)
+        return len(rows)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.stream.exhausted or self.truncated
+
+    def close(self) -> None:
+        self.stream.close()
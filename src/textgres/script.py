@@ -0,0 +1,183 @@
+import psycopg2
+from dataclasses import dataclass
+from time import monotonic, time
+from typing import Callable, Optional
+from uuid import uuid4
+
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_cache import CachedResult, CachedStream
+from textgres.sql import is_read_only, keywords, returns_rows
+
+# The most rows kept of each result set of a script; the rest are left on
+# the server
+SCRIPT_ROW_LIMIT = 10000
+
+# Rows fetched from a result set per round-trip
+SCRIPT_ITERSIZE = 1000
+
+@dataclass
+class StatementResult:
+    statement: str
+    # Seconds the statement took; statements sent in one batch share the
+    # batch's time
+    elapsed: float = 0.0
+    # Affected or returned rows, when known
+    rowcount: Optional[int] = None
+    columns: Optional[list[str]] = None
+    buffer: Optional[ColumnarBuffer] = None
+    # Whether more rows were returned than were kept
+    truncated: bool = False
+    error: Optional[Exception] = None
+    # The statements of a batch share its index; None when sent alone
+    batch: Optional[int] = None
+    executed: bool = False
+
+    @property
+    def has_rows(self) -> bool:
+        return self.columns is not None
+
+    def stream(self) -> CachedStream:
+        # The kept rows are shown the same way as a cached result, straight
+        # from their buffer
+        return CachedStream(
+            CachedResult(
+                columns=self.columns or [],
+                buffer=self.buffer or ColumnarBuffer(self.columns or []),
+                cached_at=time(),
+                nbytes=0,
+            )
+        )
+
+def plan_batches(statements: list[str], batch: bool) -> list[list[int]]:
+    # Groups the indexes of consecutive statements which return no rows, so
+    # that each group is sent in a single round-trip; anything returning
+    # rows is sent on its own so that its result set can be read
+    groups: list[list[int]] = []
+    for index, statement in enumerate(statements):
+        if batch and groups and not returns_rows(statement) and not returns_rows(statements[groups[-1][-1]]):
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+    return groups
+
+def run_script(
+    conn,
+    statements: list[str],
+    autocommit: bool = False,
+    batch: bool = False,
+    on_statement: Optional[Callable[[int], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> list[StatementResult]:
+    """Runs `statements` in order on `conn`, stopping at the first error.
+
+    In a transaction, every statement is committed together at the end, or
+    rolled back on an error. With `autocommit`, the session is switched to
+    autocommit for the run, so each statement commits as soon as it
+    succeeds and commands which refuse to run in a transaction block, such
+    as VACUUM or CREATE INDEX CONCURRENTLY, can be scripted. With `batch`,
+    consecutive statements which return no rows are sent in one round-trip;
+    a batch is always committed, or rolled back, as a whole, as the server
+    runs it as a single implicit transaction under autocommit.
+
+    Result sets are kept up to `SCRIPT_ROW_LIMIT` rows each. `on_statement`
+    is called with the index of each statement as it starts; `cancelled`
+    is checked between statements. Blocks on the database.
+    """
+    results = [StatementResult(statement) for statement in statements]
+    groups = plan_batches(statements, batch)
+    failed = False
+    previous_autocommit = conn.autocommit
+    conn.autocommit = autocommit
+
+    try:
+        for number, group in enumerate(groups):
+            if failed or (cancelled is not None and cancelled()):
+                break
+            if on_statement is not None:
+                on_statement(group[0])
+
+            members = [results[index] for index in group]
+            started = monotonic()
+            try:
+                if len(group) == 1:
+                    run_statement(conn, members[0])
+                else:
+                    run_batch(conn, members, number)
+            except psycopg2.Error as e:
+                failed = True
+                for result in members:
+                    result.error = e
+                if not conn.closed:
+                    conn.rollback()
+            elapsed = monotonic() - started
+            for result in members:
+                result.elapsed = elapsed
+                result.executed = True
+
+        if not failed and not autocommit:
+            conn.commit()
+    finally:
+        if not conn.closed:
+            conn.rollback()
+            # The session goes back to its pool as it was lent
+            conn.autocommit = previous_autocommit
+
+    return results
+
+def can_declare(statement: str) -> bool:
+    # Whether a statement can be declared as a cursor: a query which only
+    # reads, other than SHOW or EXPLAIN
+    return is_read_only(statement) and keywords(statement)[0] not in ("show", "explain")
+
+def run_statement(conn, result: StatementResult) -> None:
+    declare = can_declare(result.statement)
+    if declare and conn.autocommit:
+        # A named cursor only lives within a transaction, so under
+        # autocommit a query gets a short one of its own
+        conn.autocommit = False
+        try:
+            run_statement(conn, result)
+            conn.commit()
+        finally:
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = True
+        return
+
+    if declare:
+        # A named cursor holds the result set on the server, so that only
+        # the kept rows are sent; statements which could write can't be
+        # declared as one
+        cursor = conn.cursor(name="textgres_script_{}".format(uuid4().hex))
+        cursor.itersize = SCRIPT_ITERSIZE
+    else:
+        cursor = conn.cursor()
+
+    with cursor:
+        cursor.execute(result.statement)
+        if cursor.description is None and not cursor.name:
+            result.rowcount = cursor.rowcount if cursor.rowcount >= 0 else None
+        else:
+            read_rows(cursor, result)
+
+def read_rows(cursor, result: StatementResult) -> None:
+    rows = cursor.fetchmany(SCRIPT_ITERSIZE)
+    result.columns = [column.name for column in cursor.description or []]
+    result.buffer = ColumnarBuffer(result.columns)
+    while rows:
+        room = SCRIPT_ROW_LIMIT - len(result.buffer)
+        result.buffer.extend(rows[:room])
+        if len(rows) > room:
+            result.truncated = True
+            break
+        rows = cursor.fetchmany(SCRIPT_ITERSIZE)
+    result.rowcount = len(result.buffer)
+
+def run_batch(conn, results: list[StatementResult], number: int) -> None:
+    # Only the last statement's row count is reported for a batch
+    for result in results:
+        result.batch = number
+    with conn.cursor() as cursor:
+        cursor.execute(";\n".join(result.statement for result in results))
+        if cursor.rowcount >= 0:
+            results[-1].rowcount = cursor.rowcount
@@ -0,0 +1,124 @@
+import re
+from typing import Iterator
+
+# Comments, literals and quoted identifiers, whose contents mustn't be
+# mistaken for keywords; anything else is scanned a word or symbol at a time
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    | (?P<escape_string>[eE]'(?:[^'\\]|\\.|'')*(?:'|$))
+    | (?P<string>'(?:[^']|'')*(?:'|$))
+    | (?P<identifier>"(?:[^"]|"")*(?:"|$))
+    | (?P<dollar>(?P<tag>\$[A-Za-z_]*\$).*?(?:(?P=tag)|$))
+    | (?P<space>\s+)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Words which, anywhere in a statement, mean it may write or lock something
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "merge", "into", "lock", "copy", "call",
+    "nextval", "setval", "analyze",
+}
+
+# Words which after FOR make a row-locking clause (FOR UPDATE is caught by
+# the keyword above)
+LOCKING_KEYWORDS = {"share", "no", "key"}
+
+READ_KEYWORDS = ("select", "with", "values", "table", "show", "explain")
+
+def tokens(query: str) -> Iterator[tuple[str, str]]:
+    # Yields (kind, text) pairs covering the whole of `query`
+    for match in TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind == "tag":
+            kind = "dollar"
+        elif kind == "escape_string":
+            # E'...' strings, where backslashes escape quotes too
+            kind = "string"
+        yield kind, match.group(0)
+
+def normalize_query(query: str) -> str:
+    """Drops comments, collapses whitespace and trailing semicolons, so that
+    a statement reformatted without changing its meaning compares equal."""
+    parts = []
+    for kind, text in tokens(query):
+        if kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            parts.append(text)
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+def keywords(query: str) -> list[str]:
+    # The lowercased words of `query`, outside comments, literals and quoted
+    # identifiers
+    return [text.lower() for kind, text in tokens(query) if kind == "word"]
+
+def is_read_only(query: str) -> bool:
+    """Whether `query` is a single statement which only reads.
+
+    This is conservative: anything which could write, lock rows or advance a
+    sequence is treated as a write, including `SELECT ... INTO` and `FOR
+    UPDATE`. Functions with side effects can't be detected.
+    """
+    words = keywords(query)
+    if not words or words[0] not in READ_KEYWORDS:
+        return False
+    if any(word in WRITE_KEYWORDS for word in words):
+        return False
+    if any(word == "for" and following in LOCKING_KEYWORDS for word, following in zip(words, words[1:])):
+        return False
+
+    # A semicolon before the end means more than one statement
+    symbols = [text for kind, text in tokens(normalize_query(query)) if kind == "other"]
+    return ";" not in symbols
+
+def split_statements(text: str) -> list[str]:
+    """Splits a script into its statements at semicolons outside comments,
+    literals, quoted identifiers and dollar-quoted bodies.
+
+    Statements are returned with their own text, without the semicolon;
+    those which are only comments or whitespace are dropped. The bodies of
+    `BEGIN ATOMIC ... END` functions, which contain semicolons of their own,
+    are kept whole.
+    """
+    statements = []
+    current: list[str] = []
+    # The words of the current statement, and the CASE/BEGIN nesting within
+    # an atomic body
+    words: list[str] = []
+    depth = 0
+
+    def flush() -> None:
+        statement = "".join(current).strip()
+        if any(kind not in ("comment", "space") for kind, _ in tokens(statement)):
+            statements.append(statement)
+        current.clear()
+        words.clear()
+
+    for kind, text in tokens(text):
+        if kind == "word":
+            word = text.lower()
+            if word == "atomic" and words and words[-1] == "begin":
+                depth += 1
+            elif depth and word == "case":
+                depth += 1
+            elif depth and word == "end":
+                depth -= 1
+            words.append(word)
+        elif kind == "other" and text == ";" and depth == 0:
+            flush()
+            continue
+        current.append(text)
+    flush()
+    return statements
+
+def returns_rows(statement: str) -> bool:
+    # Whether a statement may return a result set, rather than only a count
+    words = keywords(statement)
+    return bool(words) and (
+        words[0] in READ_KEYWORDS or words[0] == "fetch" or "returning" in words
+    )
@@ -0,0 +1,234 @@
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from textual import log
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# Seconds between the samples taken in the background, and the samples kept
+# per sampler; together they cover the longest window shown, 15 minutes
+SAMPLE_INTERVAL = 10.0
+SAMPLE_CAPACITY = 90
+
+EXTENSION_QUERY = "SELECT 1 FROM pg_catalog.pg_extension WHERE extname = 'pg_stat_statements'"
+
+# Counters are read without their text, which pg_stat_statements keeps in a
+# file; texts are only read for statements not seen before. Statements run
+# both at the top level and nested (PostgreSQL 14+) are summed.
+COUNTERS_QUERY = """
+SELECT s.userid, s.dbid, s.queryid,
+  sum(s.calls), sum(s.{total_time}), sum(s.rows),
+  sum(s.shared_blks_hit), sum(s.shared_blks_read),
+  sum(s.temp_blks_read + s.temp_blks_written)
+FROM pg_stat_statements(false) s
+WHERE s.queryid IS NOT NULL
+GROUP BY s.userid, s.dbid, s.queryid
+"""
+
+TEXTS_QUERY = """
+SELECT DISTINCT ON (s.userid, s.dbid, s.queryid) s.userid, s.dbid, s.queryid, s.query
+FROM pg_stat_statements(true) s
+WHERE s.queryid = ANY(%(queryids)s)
+"""
+
+# Identifies a statement across samples
+StatementKey = tuple[int, int, int]
+
+class StatementsUnavailable(Exception):
+    pass
+
+@dataclass
+class StatementCounters:
+    calls: int = 0
+    # Milliseconds
+    total_time: float = 0.0
+    rows: int = 0
+    shared_hit: int = 0
+    shared_read: int = 0
+    temp_blocks: int = 0
+
+    def __sub__(self, other: "StatementCounters") -> "StatementCounters":
+        return StatementCounters(
+            calls=self.calls - other.calls,
+            total_time=self.total_time - other.total_time,
+            rows=self.rows - other.rows,
+            shared_hit=self.shared_hit - other.shared_hit,
+            shared_read=self.shared_read - other.shared_read,
+            temp_blocks=self.temp_blocks - other.temp_blocks,
+        )
+
+    def __add__(self, other: "StatementCounters") -> "StatementCounters":
+        return StatementCounters(
+            calls=self.calls + other.calls,
+            total_time=self.total_time + other.total_time,
+            rows=self.rows + other.rows,
+            shared_hit=self.shared_hit + other.shared_hit,
+            shared_read=self.shared_read + other.shared_read,
+            temp_blocks=self.temp_blocks + other.temp_blocks,
+        )
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+@dataclass
+class StatementSample:
+    # Monotonic time the sample was taken, and seconds since the previous one
+    taken_at: float
+    elapsed: float
+    # Only statements which were called during the interval
+    deltas: dict[StatementKey, StatementCounters]
+
+@dataclass
+class StatementActivity:
+    """The activity of a statement over a window of samples."""
+
+    key: StatementKey
+    query: str
+    totals: StatementCounters
+    # Total time per sample of the window, oldest first
+    series: list[float] = field(default_factory=list)
+
+def counters_delta(current: StatementCounters, previous: Optional[StatementCounters]) -> StatementCounters:
+    # Counters which went backwards were reset, or the statement was evicted
+    # and came back, so everything counted since is new
+    if previous is None or current.calls < previous.calls:
+        return current
+    return current - previous
+
+class StatementSampler:
+    """Samples pg_stat_statements and keeps the deltas between samples.
+
+    Each connection owns one sampler for as long as it is connected, so the
+    window outlives any view of it. Once started, it is sampled every
+    `SAMPLE_INTERVAL` seconds in the background (see `ConnectionTree`).
+    Samples are taken on a dedicated autocommit session, like
+    `ActivityMonitor`, and held in a ring buffer of `capacity` samples. The
+    first sample only sets the baseline.
+    """
+
+    def __init__(self, connection: "Connection", capacity: int = SAMPLE_CAPACITY) -> None:
+        self.connection = connection
+        self.samples: deque[StatementSample] = deque(maxlen=capacity)
+        self.texts: dict[StatementKey, str] = {}
+        self._counters: dict[StatementKey, StatementCounters] = {}
+        self._taken_at: Optional[float] = None
+        self._total_time_column: Optional[str] = None
+        self._conn = None
+        self._lock = threading.Lock()
+        # Whether background sampling was started, and why the last sample
+        # failed
+        self.active = False
+        self.error: Optional[Exception] = None
+
+    def start(self) -> None:
+        self.active = True
+        self.error = None
+
+    @property
+    def has_baseline(self) -> bool:
+        return self._taken_at is not None
+
+    def _session(self):
+        if self._conn is None or self._conn.closed:
+            log("Opening statements session for '{}'".format(self.connection.name))
+            self._conn = self.connection.open()
+            self._conn.autocommit = True
+            with self._conn.cursor() as cur:
+                cur.execute(EXTENSION_QUERY)
+                installed = cur.fetchone() is not None
+            if not installed:
+                self._conn.close()
+                raise StatementsUnavailable("pg_stat_statements is not installed in this database")
+            # Renamed in PostgreSQL 13
+            if self._conn.server_version >= 130000:
+                self._total_time_column = "total_exec_time"
+            else:
+                self._total_time_column = "total_time"
+        return self._conn
+
+    def sample(self) -> Optional[StatementSample]:
+        # Raises StatementsUnavailable, which also stops background sampling
+        with self._lock:
+            try:
+                sample = self._sample()
+            except Exception as e:
+                self.error = e
+                # Without the extension there is nothing to sample
+                if isinstance(e, StatementsUnavailable):
+                    self.active = False
+                raise
+            self.error = None
+            return sample
+
+    def _sample(self) -> Optional[StatementSample]:
+        conn = self._session()
+        with conn.cursor() as cur:
+            cur.execute(COUNTERS_QUERY.format(total_time=self._total_time_column))
+            results = cur.fetchall()
+            taken_at = monotonic()
+
+            counters = {}
+            for userid, dbid, queryid, calls, total_time, rows, hit, read, temp in results:
+                counters[(userid, dbid, queryid)] = StatementCounters(
+                    calls=int(calls),
+                    total_time=float(total_time),
+                    rows=int(rows),
+                    shared_hit=int(hit),
+                    shared_read=int(read),
+                    temp_blocks=int(temp),
+                )
+
+            unknown = [key for key in counters if key not in self.texts]
+            if unknown:
+                cur.execute(TEXTS_QUERY, {"queryids": list({key[2] for key in unknown})})
+                for userid, dbid, queryid, query in cur.fetchall():
+                    self.texts[(userid, dbid, queryid)] = query
+
+        previous, self._counters = self._counters, counters
+        previous_taken_at, self._taken_at = self._taken_at, taken_at
+        if previous_taken_at is None:
+            return None
+
+        deltas = {}
+        for key, current in counters.items():
+            delta = counters_delta(current, previous.get(key))
+            if delta.calls > 0:
+                deltas[key] = delta
+
+        sample = StatementSample(taken_at, taken_at - previous_taken_at, deltas)
+        self.samples.append(sample)
+        return sample
+
+    def window(self, seconds: float) -> list[StatementActivity]:
+        # Sums the samples taken within the last `seconds`; the ring buffer
+        # is copied first as samples may be appended by another thread
+        samples = list(self.samples)
+        if not samples:
+            return []
+        since = samples[-1].taken_at - seconds
+        samples = [sample for sample in samples if sample.taken_at > since]
+
+        activity: dict[StatementKey, StatementActivity] = {}
+        for index, sample in enumerate(samples):
+            for key, delta in sample.deltas.items():
+                entry = activity.get(key)
+                if entry is None:
+                    entry = activity[key] = StatementActivity(
+                        key=key,
+                        query=self.texts.get(key, ""),
+                        totals=StatementCounters(),
+                        series=[0.0] * len(samples),
+                    )
+                entry.totals = entry.totals + delta
+                entry.series[index] = delta.total_time
+        return list(activity.values())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,293 @@
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from textual import log
+from typing import Optional
+from xdg_base_dirs import xdg_data_home
+
+# The fields of a connection which are saved, in the order of the table's
+# columns
+CONNECTION_COLUMNS = (
+    "name",
+    "host",
+    "port",
+    "database",
+    "username",
+    "password",
+    "statement_timeout",
+    "lock_timeout",
+    "result_cache_ttl",
+)
+
+# Where connections were saved before the store, relative to the working
+# directory; imported the first time the store is created
+LEGACY_PATH = "connections.db"
+
+# Each migration brings the schema from the version before it, which is
+# kept in `PRAGMA user_version`; released migrations must never change
+MIGRATIONS: list[list[str]] = [
+    [
+        """
+        CREATE TABLE connections (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            host TEXT,
+            port INTEGER,
+            database TEXT,
+            username TEXT,
+            password TEXT,
+            statement_timeout INTEGER NOT NULL DEFAULT 0,
+            lock_timeout INTEGER NOT NULL DEFAULT 0,
+            result_cache_ttl INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        # Catalog snapshots cached between sessions, see `Catalog`
+        """
+        CREATE TABLE catalog_snapshots (
+            connection_id INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            snapshot TEXT NOT NULL
+        )
+        """,
+    ],
+    [
+        # Imports match connections by name
+        "CREATE INDEX connections_name ON connections (name)",
+    ],
+    # The query history, see `QueryHistory`. Its FTS index is
+    # external-content, so queries are stored once, and keeps extra indexes
+    # of 1 to 3 character prefixes so that searching for what has been typed
+    # so far stays fast on large histories.
+    [
+        """
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY,
+            connection_id INTEGER,
+            query TEXT NOT NULL,
+            executed_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            rows INTEGER,
+            error TEXT
+        )
+        """,
+        """
+        CREATE VIRTUAL TABLE history_fts USING fts5(
+            query,
+            content='history',
+            content_rowid='id',
+            prefix='1 2 3',
+            tokenize="unicode61 tokenchars '_'"
+        )
+        """,
+        """
+        CREATE TRIGGER history_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts (rowid, query) VALUES (new.id, new.query);
+        END
+        """,
+        """
+        CREATE TRIGGER history_delete AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts (history_fts, rowid, query) VALUES ('delete', old.id, old.query);
+        END
+        """,
+    ],
+]
+
+SELECT_CONNECTIONS = "SELECT id, {} FROM connections ORDER BY id".format(", ".join(CONNECTION_COLUMNS))
+
+INSERT_CONNECTION = "INSERT INTO connections ({}) VALUES ({})".format(
+    ", ".join(CONNECTION_COLUMNS),
+    ", ".join(":" + column for column in CONNECTION_COLUMNS),
+)
+
+UPDATE_CONNECTION = "UPDATE connections SET {} WHERE id = :id".format(
+    ", ".join("{0} = :{0}".format(column) for column in CONNECTION_COLUMNS),
+)
+
+DELETE_CONNECTION = "DELETE FROM connections WHERE id = ?"
+
+SELECT_SNAPSHOT = "SELECT fingerprint, snapshot FROM catalog_snapshots WHERE connection_id = ?"
+
+SAVE_SNAPSHOT = "INSERT OR REPLACE INTO catalog_snapshots (connection_id, fingerprint, snapshot) VALUES (?, ?, ?)"
+
+DELETE_SNAPSHOT = "DELETE FROM catalog_snapshots WHERE connection_id = ?"
+
+def store_path() -> Path:
+    # Under $XDG_DATA_HOME, so that the same connections are found from any
+    # working directory
+    return xdg_data_home() / "textgres" / "connections.db"
+
+class ConnectionStore:
+    """The saved connections and the catalog snapshots cached with them.
+
+    The store owns a single SQLite handle for the life of the app, in WAL
+    mode so that the query history, which writes to the same file from its
+    own thread, never blocks a read. Its statements are constants, so the
+    handle's statement cache prepares each of them only once. The handle is
+    shared between threads and serialized by a lock.
+
+    The schema is brought up to date with `MIGRATIONS` when the store is
+    opened; a new store first imports the connections saved in the working
+    directory by earlier versions.
+    """
+
+    _default: Optional["ConnectionStore"] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def default(cls) -> "ConnectionStore":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(store_path())
+            return cls._default
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use; callers hold `_lock`
+        if self._conn is None:
+            self._conn = self.open()
+        return self._conn
+
+    def open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self.connect_file()
+        # Commits in WAL mode only need to sync the log, and readers never
+        # wait on a writer
+        conn.execute("PRAGMA journal_mode = WAL")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < len(MIGRATIONS):
+            self.migrate(conn, version)
+            if version == 0:
+                self.import_legacy(conn)
+        return conn
+
+    def connect_file(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        # Another handle on the store, for work on threads of its own such as
+        # the query history's; the schema is brought up to date first
+        with self._lock:
+            self.conn
+        return self.connect_file()
+
+    def migrate(self, conn: sqlite3.Connection, version: int) -> None:
+        # Every migration is applied, or none is
+        with conn:
+            conn.execute("BEGIN")
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                log("Migrating connection store to version {}".format(number))
+                for statement in statements:
+                    conn.execute(statement)
+                # PRAGMA doesn't take parameters
+                conn.execute("PRAGMA user_version = {:d}".format(number))
+
+    def import_legacy(self, conn: sqlite3.Connection) -> None:
+        # Copies the connections and query history of the connections.db in
+        # the working directory, keeping their ids so that the history still
+        # points at its connections
+        legacy = Path(LEGACY_PATH).resolve()
+        if not legacy.is_file() or legacy == self.path.resolve():
+            return
+
+        log("Importing connections from {}".format(legacy))
+        try:
+            conn.execute("ATTACH DATABASE ? AS legacy", (str(legacy),))
+        except sqlite3.Error as e:
+            log.error(e)
+            return
+        try:
+            tables = {
+                name for name, in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")
+            }
+            with conn:
+                if "connections" in tables:
+                    present = {row[1] for row in conn.execute("PRAGMA legacy.table_info(connections)")}
+                    # Columns added after the legacy table was created may
+                    # be missing from it
+                    columns = [column for column in CONNECTION_COLUMNS if column in present]
+                    conn.execute(
+                        "INSERT INTO connections (id, {0}) SELECT id, {0} FROM legacy.connections".format(
+                            ", ".join(columns)
+                        )
+                    )
+                if "history" in tables:
+                    conn.execute(
+                        "INSERT INTO history (id, connection_id, query, executed_at, duration, rows, error) "
+                        "SELECT id, connection_id, query, executed_at, duration, rows, error FROM legacy.history"
+                    )
+        except sqlite3.Error as e:
+            log.error(e)
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def connections(self) -> list[dict]:
+        with self._lock:
+            cursor = self.conn.execute(SELECT_CONNECTIONS)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def save(self, values: dict) -> int:
+        # Inserts the connection when it has no id yet; returns its id
+        with self._lock, self.conn:
+            return self._save(values)
+
+    def _save(self, values: dict) -> int:
+        if not values.get("id"):
+            return self.conn.execute(INSERT_CONNECTION, values).lastrowid
+        self.conn.execute(UPDATE_CONNECTION, values)
+        # The connection may now point at another database
+        self.conn.execute(DELETE_SNAPSHOT, (values["id"],))
+        return values["id"]
+
+    def save_many(self, connections: list[dict]) -> tuple[int, int]:
+        """Saves every connection in a single transaction, updating those
+        with the name of a saved connection and adding the rest.
+
+        Returns the number of connections added and updated. Raises
+        ValueError, saving nothing, when several connections share a name.
+        """
+        names = Counter(values["name"] for values in connections)
+        duplicates = sorted(name for name, count in names.items() if count > 1)
+        if duplicates:
+            raise ValueError("more than one connection is named {}".format(
+                ", ".join("'{}'".format(name) for name in duplicates)
+            ))
+
+        with self._lock, self.conn:
+            ids = {name: id for id, name in self.conn.execute("SELECT id, name FROM connections")}
+            added = [values for values in connections if values["name"] not in ids]
+            updated = [{**values, "id": ids[values["name"]]} for values in connections if values["name"] in ids]
+            self.conn.executemany(INSERT_CONNECTION, added)
+            self.conn.executemany(UPDATE_CONNECTION, updated)
+            self.conn.executemany(DELETE_SNAPSHOT, [(values["id"],) for values in updated])
+        return len(added), len(updated)
+
+    def delete(self, id: int) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(DELETE_CONNECTION, (id,))
+            self.conn.execute(DELETE_SNAPSHOT, (id,))
+
+    def snapshot(self, connection_id: int) -> Optional[tuple[str, str]]:
+        # The fingerprint and JSON of a connection's cached catalog snapshot
+        with self._lock:
+            return self.conn.execute(SELECT_SNAPSHOT, (connection_id,)).fetchone()
+
+    def save_snapshot(self, connection_id: int, fingerprint: str, snapshot: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(SAVE_SNAPSHOT, (connection_id, fingerprint, snapshot))
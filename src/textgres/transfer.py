@@ -0,0 +1,127 @@
+import gzip
+import os
+from dataclasses import dataclass
+from time import monotonic
+from typing import IO, TYPE_CHECKING, Callable, Optional
+
+from textgres.completion import quote_identifier
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# Formats understood by COPY
+COPY_FORMATS = ("csv", "text", "binary")
+
+# How often a transfer reports its progress, in seconds
+PROGRESS_INTERVAL = 0.1
+
+class TransferCancelled(Exception):
+    pass
+
+@dataclass
+class CopyOptions:
+    format: str = "csv"
+    header: bool = True
+    compress: bool = False
+
+    @property
+    def sql(self) -> str:
+        options = ["FORMAT {}".format(self.format)]
+        # Only CSV files can have a header line
+        if self.format == "csv" and self.header:
+            options.append("HEADER")
+        return ", ".join(options)
+
+def relation_source(schema: str, name: str) -> str:
+    return "{}.{}".format(quote_identifier(schema), quote_identifier(name))
+
+def query_source(query: str) -> str:
+    return "({})".format(query.strip().rstrip(";").rstrip())
+
+class ProgressFile:
+    """Counts the bytes read from or written to `file`.
+
+    `progress` is called with the running total at most every
+    `PROGRESS_INTERVAL` seconds. Once `cancelled` returns true, the next
+    read or write raises `TransferCancelled`, which aborts the COPY.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        progress: Optional[Callable[[int], None]] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.file = file
+        self.progress = progress
+        self.cancelled = cancelled
+        self.bytes = 0
+        self._reported_at = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        self.check_cancelled()
+        data = self.file.read(size)
+        self.advance(len(data))
+        return data
+
+    def write(self, data: bytes) -> int:
+        self.check_cancelled()
+        written = self.file.write(data)
+        self.advance(len(data))
+        return written
+
+    def check_cancelled(self) -> None:
+        if self.cancelled is not None and self.cancelled():
+            raise TransferCancelled()
+
+    def advance(self, size: int) -> None:
+        self.bytes += size
+        now = monotonic()
+        if self.progress is not None and now - self._reported_at >= PROGRESS_INTERVAL:
+            self._reported_at = now
+            self.progress(self.bytes)
+
+def export_to_file(
+    connection: "Connection",
+    source: str,
+    path: str,
+    options: CopyOptions,
+    progress: Optional[Callable[[int], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> int:
+    """Copies a table or the rows of a query (see `relation_source` and
+    `query_source`) into a local file, returning the number of rows.
+
+    The data goes straight from the server to the file, compressed on the
+    way when `options.compress` is set. Progress is reported in bytes
+    received. An incomplete file is removed.
+    """
+    statement = "COPY {} TO STDOUT WITH ({})".format(source, options.sql)
+    try:
+        with gzip.open(path, "wb") if options.compress else open(path, "wb") as file:
+            return connection.copy(statement, ProgressFile(file, progress, cancelled))
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def import_from_file(
+    connection: "Connection",
+    table: str,
+    path: str,
+    options: CopyOptions,
+    progress: Optional[Callable[[int], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> int:
+    """Copies a local file into a table, returning the number of rows.
+
+    Progress is reported in bytes read from disk, before decompression, so
+    it can be compared with the size of the file.
+    """
+    statement = "COPY {} FROM STDIN WITH ({})".format(table, options.sql)
+    with open(path, "rb") as raw:
+        file = ProgressFile(raw, progress, cancelled)
+        if options.compress:
+            with gzip.GzipFile(fileobj=file, mode="rb") as decompressed:
+                return connection.copy(statement, decompressed)
+        return connection.copy(statement, file)
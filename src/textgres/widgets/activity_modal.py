@@ -0,0 +1,323 @@
+from rich.text import Text
+from textual import log, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.timer import Timer
+from textual.widgets import DataTable, Footer, Label
+from textual.widgets.data_table import CellDoesNotExist, RowDoesNotExist
+from typing import TYPE_CHECKING, Optional
+
+from textgres.activity import ActivityMonitor, ActivitySnapshot, Backend
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# The polling intervals stepped through with + and -, in seconds
+MONITOR_INTERVALS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+DEFAULT_MONITOR_INTERVAL = 2.0
+
+# Keys and labels of the table's columns
+MONITOR_COLUMNS = (
+    ("pid", "PID"),
+    ("user", "User"),
+    ("database", "Database"),
+    ("application", "Application"),
+    ("state", "State"),
+    ("wait", "Wait event"),
+    ("xact_age", "Xact"),
+    ("query_age", "Query"),
+    ("locks", "Locks"),
+    ("blocked_by", "Blocked by"),
+    ("blocking", "Blocking"),
+    ("query", "Statement"),
+)
+
+def format_age(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    seconds = max(seconds, 0.0)
+    if seconds < 60:
+        return "{:.1f}s".format(seconds)
+    if seconds < 3600:
+        return "{:.0f}m{:02.0f}s".format(*divmod(seconds, 60))
+    return "{:.0f}h{:02.0f}m".format(seconds // 3600, seconds % 3600 // 60)
+
+class ActivityModal(ModalScreen[None]):
+    """A live view of the backends of a connection's server.
+
+    Polls run in a worker on the monitor's own session. Backends are shown
+    as a tree, each waiter indented under the backend blocking it. Rows are
+    keyed by pid and only the cells which changed since the last poll are
+    updated, so that the cursor stays put and large servers don't redraw the
+    whole table, unless the tree changed shape.
+    """
+
+    CSS = """
+    ActivityModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 95%;
+            height: 90%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+            border-subtitle-color: $text-muted;
+            border-subtitle-background: $background;
+        }
+
+        & #activity-summary {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & DataTable {
+            height: 1fr;
+            background: transparent;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Close"),
+        Binding("c", "cancel_backend", "Cancel Backend"),
+        Binding("k", "terminate_backend", "Terminate Backend"),
+        Binding("a", "toggle_idle", "Show/Hide Idle"),
+        Binding("+", "change_interval(1)", "Slower"),
+        Binding("-", "change_interval(-1)", "Faster"),
+    ]
+
+    def __init__(self, connection: "Connection") -> None:
+        super().__init__()
+        self.connection = connection
+        self.monitor = ActivityMonitor(connection)
+        self.interval = DEFAULT_MONITOR_INTERVAL
+        self.show_idle = False
+        # The style and cells shown for each pid, compared against each poll
+        self.rows: dict[int, tuple[str, tuple[str, ...]]] = {}
+        self._timer: Optional[Timer] = None
+        self._polling = False
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "Activity of {}".format(self.connection.name)
+            yield Label("Loading…", id="activity-summary")
+            table = DataTable(cursor_type="row", zebra_stripes=True)
+            for key, label in MONITOR_COLUMNS:
+                table.add_column(label, key=key)
+            yield table
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.restart_timer()
+        self.poll()
+
+    def on_unmount(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        # The screen's own workers are cancelled as it is removed
+        self.app.run_worker(self.monitor.close, thread=True, group="monitor-close")
+
+    def restart_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        self._timer = self.set_interval(self.interval, self.poll)
+        self.query_one(Vertical).border_subtitle = "every {:g}s".format(self.interval)
+
+    def poll(self) -> None:
+        # A slow server must not pile polls up behind each other
+        if self._polling:
+            return
+        self._polling = True
+        self.poll_activity(self.show_idle)
+
+    @work(thread=True, group="monitor")
+    def poll_activity(self, show_idle: bool) -> None:
+        try:
+            snapshot = self.monitor.poll(show_idle)
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(self.poll_failed, e)
+            return
+
+        self.app.call_from_thread(self.show_snapshot, snapshot)
+
+    def poll_failed(self, error: Exception) -> None:
+        self._polling = False
+        self.query_one("#activity-summary", Label).update(
+            Text("Polling failed: {}".format(str(error).strip()), style="red")
+        )
+
+    def show_snapshot(self, snapshot: ActivitySnapshot) -> None:
+        self._polling = False
+        if not self.is_attached:
+            return
+
+        self.query_one("#activity-summary", Label).update(self.get_summary(snapshot))
+
+        table = self.query_one(DataTable)
+        for pid in list(self.rows):
+            if pid not in snapshot.backends:
+                del self.rows[pid]
+                table.remove_row(str(pid))
+
+        # Rows are added at the end, so when a backend has to be shown
+        # elsewhere, such as under one it now waits on, the rows are laid
+        # out again
+        order = list(snapshot.backends)
+        if order[:len(self.rows)] != list(self.rows):
+            selected = self.selected_pid
+            table.clear()
+            self.rows.clear()
+        else:
+            selected = None
+
+        for pid, backend in snapshot.backends.items():
+            row = self.get_row(backend)
+            previous = self.rows.get(pid)
+            self.rows[pid] = row
+            style, cells = row
+            if previous is None:
+                table.add_row(*(self.get_cell(cell, style) for cell in cells), key=str(pid))
+                continue
+            # A change of style, such as the backend becoming blocked,
+            # restyles the whole row
+            previous_style, previous_cells = previous
+            for (key, _), old, new in zip(MONITOR_COLUMNS, previous_cells, cells):
+                if old != new or style != previous_style:
+                    table.update_cell(str(pid), key, self.get_cell(new, style))
+
+        if selected in self.rows:
+            table.move_cursor(row=table.get_row_index(str(selected)))
+
+    def get_summary(self, snapshot: ActivitySnapshot) -> Text:
+        summary = Text("{} backends · {} active · {} waiting on locks".format(
+            len(snapshot.backends),
+            snapshot.active,
+            snapshot.waiting_on_locks,
+        ))
+
+        wait_events = snapshot.wait_events()
+        if wait_events:
+            summary.append("\nWaits: ")
+            summary.append(", ".join("{} ×{}".format(wait, count) for wait, count in wait_events))
+
+        roots = snapshot.root_blockers
+        if roots:
+            summary.append("\nBlocking: ", style="bold red")
+            summary.append(", ".join(
+                "pid {} blocks {}".format(backend.pid, backend.blocking) for backend in roots
+            ), style="red")
+        return summary
+
+    def get_row(self, backend: Backend) -> tuple[str, tuple[str, ...]]:
+        if backend.root_blocker:
+            style = "bold red"
+        elif backend.blocked_by:
+            style = "yellow"
+        elif backend.state == "active":
+            style = ""
+        else:
+            style = "dim"
+
+        # Waiters are indented under the backends they wait on
+        pid = "  " * backend.depth + str(backend.pid)
+        locks = "{}".format(backend.locks_held)
+        if backend.locks_waiting:
+            locks += " ({} waiting)".format(backend.locks_waiting)
+
+        cells = (
+            pid,
+            backend.user or "",
+            backend.database or "",
+            backend.application or backend.backend_type or "",
+            backend.state or "",
+            backend.wait or "",
+            format_age(backend.xact_age),
+            format_age(backend.query_age),
+            locks,
+            ", ".join(str(blocker) for blocker in backend.blocked_by),
+            str(backend.blocking) if backend.blocking else "",
+            # Statements are shown on a single line
+            " ".join((backend.query or "").split()),
+        )
+        return style, cells
+
+    def get_cell(self, value: str, style: str) -> Text:
+        return Text(value, style=style, no_wrap=True, overflow="ellipsis")
+
+    @property
+    def selected_pid(self) -> Optional[int]:
+        table = self.query_one(DataTable)
+        if table.row_count == 0:
+            return None
+        try:
+            row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        except (CellDoesNotExist, RowDoesNotExist):
+            return None
+        return int(row_key.value)
+
+    def action_cancel_backend(self) -> None:
+        pid = self.selected_pid
+        if pid is not None:
+            self.signal_backend(pid, terminate=False)
+
+    async def action_terminate_backend(self) -> None:
+        pid = self.selected_pid
+        if pid is None:
+            return
+
+        from textgres.widgets.confirm_modal import ConfirmModal
+
+        def _handle_terminate(terminate: bool) -> None:
+            if terminate:
+                self.signal_backend(pid, terminate=True)
+
+        await self.app.push_screen(
+            ConfirmModal(message=f"Terminate backend {pid}? Its session will be closed."),
+            callback=_handle_terminate,
+        )
+
+    @work(thread=True, group="monitor-signal")
+    def signal_backend(self, pid: int, terminate: bool) -> None:
+        action = "Terminate" if terminate else "Cancel"
+        try:
+            if terminate:
+                signalled = self.monitor.terminate(pid)
+            else:
+                signalled = self.monitor.cancel(pid)
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(
+                self.notify,
+                title="{} error".format(action),
+                message=str(e).strip(),
+                severity="error",
+                timeout=5,
+            )
+            return
+
+        if signalled:
+            message = "{} sent to backend {}.".format(action, pid)
+        else:
+            message = "Backend {} has already exited.".format(pid)
+        self.app.call_from_thread(self.notify, title=action, message=message, timeout=5)
+        self.app.call_from_thread(self.poll)
+
+    def action_toggle_idle(self) -> None:
+        self.show_idle = not self.show_idle
+        self.poll()
+
+    def action_change_interval(self, step: int) -> None:
+        index = MONITOR_INTERVALS.index(self.interval) + step
+        if 0 <= index < len(MONITOR_INTERVALS):
+            self.interval = MONITOR_INTERVALS[index]
+            self.restart_timer()
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
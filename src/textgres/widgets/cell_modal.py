@@ -0,0 +1,120 @@
+from rich.text import Text
+from textual import log, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Label, TextArea
+from typing import TYPE_CHECKING, Any, Optional
+
+from textgres.large_values import Preview, hex_dump, pretty_json
+from textgres.widgets.health_modal import format_size
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# Values longer than this many characters are shown without highlighting,
+# which would otherwise take longer than loading them
+HIGHLIGHT_LIMIT = 1 << 20
+
+class CellModal(ModalScreen[None]):
+    """Shows the whole of a value from the results, pretty-printing JSON and
+    dumping bytea as hex.
+
+    A value which was only previewed is loaded first by running its query
+    again, on a pooled connection of its own.
+    """
+
+    CSS = """
+    CellModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 90%;
+            height: 90%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+        }
+
+        & #cell-summary {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & TextArea {
+            height: 1fr;
+            background: transparent;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Close"),
+    ]
+
+    def __init__(self, value: Any, column: str, source: Optional[tuple["Connection", str]] = None) -> None:
+        super().__init__()
+        self.value = value
+        self.column = column
+        # The connection and query the value was fetched with
+        self.source = source
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = self.column
+            yield Label("Loading…", id="cell-summary")
+            yield TextArea(read_only=True, soft_wrap=True)
+        yield Footer()
+
+    def on_mount(self) -> None:
+        if not isinstance(self.value, Preview):
+            self.show_value(self.value)
+        elif self.source is None:
+            self.show_error("Only the start of this value was fetched, and its query can't be run again.")
+        else:
+            self.load_value(self.value)
+
+    @work(thread=True, exclusive=True, group="cell")
+    def load_value(self, preview: Preview) -> None:
+        connection, query = self.source
+        try:
+            value = connection.load_value(query, preview)
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(self.show_error, str(e).strip())
+            return
+
+        self.app.call_from_thread(self.show_value, value)
+
+    def show_value(self, value: Any) -> None:
+        area = self.query_one(TextArea)
+        language = None
+        if value is None:
+            summary, text = "NULL", ""
+        elif isinstance(value, (bytes, memoryview)):
+            value = bytes(value)
+            summary, text = "bytea · {}".format(format_size(len(value))), hex_dump(value)
+        else:
+            text = pretty_json(value)
+            if text is not None:
+                summary, language = "JSON", "json"
+            else:
+                summary, text = "text" if isinstance(value, str) else type(value).__name__, str(value)
+            if isinstance(value, str):
+                summary = "{} · {}".format(summary, format_size(len(value.encode())))
+
+        if language is not None and len(text) <= HIGHLIGHT_LIMIT:
+            area.language = language
+        area.load_text(text)
+        self.query_one("#cell-summary", Label).update(summary)
+        area.focus()
+
+    def show_error(self, message: str) -> None:
+        self.query_one("#cell-summary", Label).update(Text(message, style="red"))
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
@@ -18,7 +18,7 @@ class ConnectionModal(ModalScreen[Optional[Connection]]):
             background: $background;
             padding: 1 2;
             width: 50%;
-            height: 48%;
+            height: 60%;
             border: wide $background-lighten-2;
             border-title-color: $text;
             border-title-background: $background;
@@ -38,6 +38,14 @@ class ConnectionModal(ModalScreen[Optional[Connection]]):
             width: 1fr;
         }
 
+        & .timeout-group {
+            margin-bottom: 1;
+        }
+
+        & .statement-timeout, & .lock-timeout {
+            margin-right: 1;
+        }
+
         & Input {
             margin-bottom: 1;
             height: 1;
@@ -121,6 +129,34 @@ class ConnectionModal(ModalScreen[Optional[Connection]]):
                 id="password-input",
             )
 
+            with Horizontal(classes="timeout-group"):
+                with Vertical(classes="statement-timeout"):
+                    yield Label("Statement timeout (ms)")
+                    yield Input(
+                        str(self.connection.statement_timeout),
+                        placeholder="0 (disabled)",
+                        type="integer",
+                        id="statement-timeout-input",
+                    )
+
+                with Vertical(classes="lock-timeout"):
+                    yield Label("Lock timeout (ms)")
+                    yield Input(
+                        str(self.connection.lock_timeout),
+                        placeholder="0 (disabled)",
+                        type="integer",
+                        id="lock-timeout-input",
+                    )
+
+                with Vertical(classes="result-cache-ttl"):
+                    yield Label("Cache results for (s)")
+                    yield Input(
+                        str(self.connection.result_cache_ttl),
+                        placeholder="0 (disabled)",
+                        type="integer",
+                        id="result-cache-ttl-input",
+                    )
+
             yield Button.success("Save Connection", id="save-button")
 
         yield Footer()
@@ -144,6 +180,9 @@ class ConnectionModal(ModalScreen[Optional[Connection]]):
             self.connection.database = self.query_one("#database-input", Input).value
             self.connection.username = self.query_one("#username-input", Input).value
             self.connection.password = self.query_one("#password-input", Input).value
+            self.connection.statement_timeout = int(self.query_one("#statement-timeout-input", Input).value or 0)
+            self.connection.lock_timeout = int(self.query_one("#lock-timeout-input", Input).value or 0)
+            self.connection.result_cache_ttl = int(self.query_one("#result-cache-ttl-input", Input).value or 0)
             self.dismiss(self.connection)
         except ValidationError as e:
             log(e)
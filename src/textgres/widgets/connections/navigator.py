@@ -1,34 +1,56 @@
 from dataclasses import dataclass
 from rich.text import Text, TextType
-from textual import on, log
+from textual import on, log, work
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import Vertical, VerticalScroll
 from textual.message import Message
 from textual.reactive import Reactive, reactive
 from textual.widgets import Static, Tree
-from textual.widgets.tree import TreeNode
-from typing import Optional
+from textual.widgets.tree import TreeNode, UnknownNodeID
+from typing import TYPE_CHECKING, Any, Optional
 
-from textgres.connection import Connection
-from textgres.widgets.confirm_modal import ConfirmModal
+from textgres.catalog import TABLE_KINDS, Function, Index, Relation, Schema
+from textgres.statements import SAMPLE_INTERVAL
 from textgres.widgets.tree import TextgresTree
-from textgres.widgets.connections.connection_modal import (
-  ConnectionModal,
-)
 
-class ConnectionTree(TextgresTree[Connection]):
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# How often the idle sessions of connected connections are probed, in
+# seconds; more often than the pool's own health check, so that borrowing a
+# session never waits on one
+PROBE_INTERVAL = 15.0
+
+@dataclass
+class CatalogGroup:
+    """A folder of catalog objects which are already loaded.
+
+    Its children are only added to the tree once it is expanded, so schemas
+    with thousands of relations don't create thousands of nodes up front.
+    """
+
+    name: str
+    items: list[Any]
+
+class ConnectionTree(TextgresTree["Connection"]):
     BINDINGS = [
         Binding("ctrl+n", "new_connection", "New"),
         Binding("ctrl+e", "edit_connection", "Edit"),
         Binding("backspace", "delete_connection", "Delete"),
-        Binding("ctrl+d", "disconnect", "Disconnect")
+        Binding("ctrl+d", "disconnect", "Disconnect"),
+        Binding("r", "refresh_catalog", "Refresh"),
+        Binding("x", "export_relation", "Export"),
+        Binding("i", "import_relation", "Import"),
+        Binding("m", "monitor_activity", "Activity"),
+        Binding("t", "top_statements", "Top Statements"),
+        Binding("h", "show_health", "Health"),
     ]
 
     def __init__(
         self,
         label: TextType,
-        data: Optional[Connection] = None,
+        data: Optional["Connection"] = None,
         *,
         name: Optional[str] = None,
         id: Optional[str] = None,
@@ -43,11 +65,15 @@ class ConnectionTree(TextgresTree[Connection]):
             classes=classes,
             disabled=disabled,
         )
+        # The node of each connection, and what its label was last made of,
+        # by the connection's id; see `watch_connections`
+        self._nodes: dict[int, TreeNode["Connection"]] = {}
+        self._labels: dict[int, tuple] = {}
 
     @dataclass
     class ConnectionHighlighted(Message):
-        connection: Connection
-        node: TreeNode[Connection]
+        connection: "Connection"
+        node: TreeNode["Connection"]
         tree: "ConnectionTree"
 
         @property
@@ -56,51 +82,86 @@ class ConnectionTree(TextgresTree[Connection]):
 
     @dataclass
     class ConnectionAdded(Message):
-        connection: Connection
+        connection: "Connection"
 
     @dataclass
     class ConnectionUpdated(Message):
-        connection: Connection
+        connection: "Connection"
 
     @dataclass
     class ConnectionRemoved(Message):
-        connection: Connection
-
-    connections: Reactive[list[Connection]] = reactive(list)
-    highlighted_node: Reactive[Optional[TreeNode[Connection]]] = reactive(None)
-
-    def watch_connections(self, connections: list[Connection]) -> None:
-        # Loops through the root node's children and removes any which are not
-        # in the connections list
-        for node in self.root.children:
-            if node.data not in connections:
-                node.remove()
-
-        # Loops through the connections list and adds any which are not in the
-        # root node's children
-        #
-        # If the connection is already in the root node's children, check the
-        # node label against the connection name and update the node label if
-        # they are different
-        for i, connection in enumerate(connections):
-            node = next((n for n in self.root.children if n.data == connection), None)
+        connection: "Connection"
+
+    # Connections are edited in place, so the list after an edit compares
+    # equal to the one before it
+    connections: Reactive[list["Connection"]] = reactive(list, always_update=True)
+    highlighted_node: Reactive[Optional[TreeNode["Connection"]]] = reactive(None)
+
+    def watch_connections(self, connections: list["Connection"]) -> None:
+        # Diffs the connections against the nodes by id, so that a change to
+        # one of thousands of saved connections only touches its own node
+        ids = {connection.id for connection in connections}
+        for removed in [id for id in self._nodes if id not in ids]:
+            self._labels.pop(removed, None)
+            self._nodes.pop(removed).remove()
+
+        # Adds a node for each new connection, and relabels those whose name
+        # or state changed since their label was made
+        for connection in connections:
+            node = self._nodes.get(connection.id)
             if node is None:
-                node = self.add_connection(connection)
-            elif node.label != self.get_connection_label(connection):
+                self.add_connection(connection)
+                continue
+            node.data = connection
+            if self._labels.get(connection.id) != self.get_label_key(connection):
+                self.update_node_label(node)
+
+    def on_mount(self) -> None:
+        self.set_interval(PROBE_INTERVAL, self.probe_connections)
+        self.set_interval(SAMPLE_INTERVAL, self.sample_statements)
+
+    @work(thread=True, exclusive=True, group="statements")
+    def sample_statements(self) -> None:
+        # Fills the windows of the connections whose top statements were
+        # opened, whether or not they are still shown
+        for connection in [c for c in self.connections if c.statements.active]:
+            try:
+                connection.statements.sample()
+            except Exception as e:
+                log.error(e)
+
+    @work(thread=True, exclusive=True, group="probe")
+    def probe_connections(self) -> None:
+        # Keeps idle sessions alive, reconnects broken ones and measures the
+        # latencies shown in the labels
+        for connection in [c for c in self.connections if c.connected]:
+            connection.probe()
+        self.app.call_from_thread(self.refresh_connection_labels)
+
+    def refresh_connection_labels(self) -> None:
+        for connection in self.connections:
+            node = self._nodes.get(connection.id)
+            if node is not None and self._labels.get(connection.id) != self.get_label_key(connection):
                 self.update_node_label(node)
 
     @on(Tree.NodeExpanded)
-    def on_node_expanded(self, event: Tree.NodeExpanded[Connection]) -> None:
-        if isinstance(event.node.data, Connection):
-            connection = event.node.data
-            self.connect_connection(connection)
-            self.update_node_label(event.node)
-            if not connection.connected:
-                event.node.collapse()
+    def on_node_expanded(self, event: Tree.NodeExpanded["Connection"]) -> None:
+        node = event.node
+        if self.is_connection_node(node):
+            self.connect_connection(node)
+        elif node.children:
+            # Catalog nodes keep their children once loaded
+            return
+        elif isinstance(node.data, Schema):
+            self.load_schema_objects(node)
+        elif isinstance(node.data, Relation):
+            self.load_relation_details(node)
+        elif isinstance(node.data, CatalogGroup):
+            self.add_catalog_items(node, node.data.items)
 
     @on(Tree.NodeHighlighted)
-    def on_node_highlighted(self, event: Tree.NodeHighlighted[Connection]) -> None:
-        if isinstance(event.node.data, Connection):
+    def on_node_highlighted(self, event: Tree.NodeHighlighted["Connection"]) -> None:
+        if self.is_connection_node(event.node):
             self.highlighted_node = event.node
             self.post_message(
                 self.ConnectionHighlighted(
@@ -113,10 +174,13 @@ class ConnectionTree(TextgresTree[Connection]):
             self.highlighted_node = None
 
     async def action_new_connection(self) -> None:
+        # Modals are imported on first use to keep them off the startup path
+        from textgres.widgets.connections.connection_modal import ConnectionModal
+
         focused_before = self.screen.focused
         self.screen.set_focus(None)
 
-        def _handle_new_connection_data(new_connection: Optional[Connection]) -> None:
+        def _handle_new_connection_data(new_connection: Optional["Connection"]) -> None:
             if new_connection is None:
                 self.screen.set_focus(focused_before)
                 return
@@ -133,7 +197,9 @@ class ConnectionTree(TextgresTree[Connection]):
         if not self.highlighted_node:
             return
 
-        def _handle_updated_connection_data(connection: Optional[Connection]) -> None:
+        from textgres.widgets.connections.connection_modal import ConnectionModal
+
+        def _handle_updated_connection_data(connection: Optional["Connection"]) -> None:
             if connection is None:
                 return
 
@@ -148,6 +214,8 @@ class ConnectionTree(TextgresTree[Connection]):
         if not self.highlighted_node:
             return
 
+        from textgres.widgets.confirm_modal import ConfirmModal
+
         connection = self.highlighted_node.data
 
         def _handle_delete_connection_data(delete: bool) -> None:
@@ -171,6 +239,7 @@ class ConnectionTree(TextgresTree[Connection]):
         if connection.connected:
             connection.disconnect()
             self.highlighted_node.collapse()
+            self.highlighted_node.remove_children()
             self.update_node_label(self.highlighted_node)
             self.notify(
                 title="Disconnected",
@@ -178,19 +247,28 @@ class ConnectionTree(TextgresTree[Connection]):
                 timeout=5,
             )
 
-    def add_connection(self, connection: Connection) -> TreeNode[Connection]:
-        return self.root.add(self.get_connection_label(connection), data=connection)
+    def add_connection(self, connection: "Connection") -> TreeNode["Connection"]:
+        node = self.root.add(self.get_connection_label(connection), data=connection)
+        self._nodes[connection.id] = node
+        self._labels[connection.id] = self.get_label_key(connection)
+        return node
 
-    def connect_connection(self, connection: Connection) -> None:
+    @work(thread=True, group="connect")
+    def connect_connection(self, node: TreeNode["Connection"]) -> None:
+        connection = node.data
         try:
           connection.connect()
-          self.notify(
+          # Measures the latency shown in the label straight away
+          connection.probe()
+          self.app.call_from_thread(
+              self.notify,
               title="Connected",
               message=f"Connected to \"{connection.name}\".",
               timeout=5,
           )
         except Exception as e:
-          self.notify(
+          self.app.call_from_thread(
+              self.notify,
               title="Connection error",
               message=f"Could not connect to \"{connection.name}\".",
               severity="error",
@@ -198,14 +276,230 @@ class ConnectionTree(TextgresTree[Connection]):
           )
           log.error(e)
 
-    def get_connection_label(self, connection: Connection) -> Text:
+        self.app.call_from_thread(self.connection_settled, node)
+        if connection.connected and not node.children:
+            self.load_schemas(node)
+
+    def connection_settled(self, node: TreeNode["Connection"]) -> None:
+        self.update_node_label(node)
+        if not node.data.connected:
+            node.collapse()
+
+    def action_refresh_catalog(self) -> None:
+        node = self.get_connection_node(self.cursor_node)
+        if node is None or not node.data.connected:
+            return
+
+        node.data.catalog.invalidate()
+        node.remove_children()
+        if node.is_expanded:
+            self.reload_schemas(node)
+
+    async def action_monitor_activity(self) -> None:
+        node = self.get_connection_node(self.cursor_node)
+        if node is None:
+            return
+
+        from textgres.widgets.activity_modal import ActivityModal
+
+        await self.app.push_screen(ActivityModal(node.data))
+
+    async def action_top_statements(self) -> None:
+        node = self.get_connection_node(self.cursor_node)
+        if node is None:
+            return
+
+        from textgres.widgets.statements_modal import StatementsModal
+
+        await self.app.push_screen(StatementsModal(node.data))
+
+    async def action_show_health(self) -> None:
+        # Shows the schema of the node under the cursor, with the cursor on
+        # its relation when there is one
+        node = self.cursor_node
+        relation = node.data if node is not None and isinstance(node.data, Relation) else None
+        while node is not None and not isinstance(node.data, Schema):
+            node = node.parent
+        if node is None:
+            return
+
+        from textgres.widgets.health_modal import HealthModal
+
+        await self.app.push_screen(
+            HealthModal(
+                self.get_connection_node(node).data,
+                node.data,
+                relation_oid=relation.oid if relation is not None else None,
+            )
+        )
+
+    async def action_export_relation(self) -> None:
+        await self.transfer_relation(importing=False)
+
+    async def action_import_relation(self) -> None:
+        await self.transfer_relation(importing=True)
+
+    async def transfer_relation(self, importing: bool) -> None:
+        node = self.cursor_node
+        if node is None or not isinstance(node.data, Relation):
+            return
+
+        relation = node.data
+        if importing and relation.kind not in TABLE_KINDS:
+            self.notify("Only tables can be imported into.", timeout=5)
+            return
+
+        from textgres.transfer import query_source, relation_source
+        from textgres.widgets.transfer_modal import TransferModal
+
+        table = relation_source(relation.schema, relation.name)
+        # COPY TO only reads plain tables; anything else is copied through
+        # a query
+        if importing or relation.kind == "r":
+            source = table
+        else:
+            source = query_source("SELECT * FROM {}".format(table))
+
+        def _handle_transfer_result(message: Optional[str]) -> None:
+            if message is not None:
+                self.notify(title="Import" if importing else "Export", message=message, timeout=5)
+
+        await self.app.push_screen(
+            TransferModal(
+                self.get_connection_node(node).data,
+                source,
+                label=relation.qualified_name,
+                importing=importing,
+                path="" if importing else "{}.csv".format(relation.name),
+            ),
+            callback=_handle_transfer_result,
+        )
+
+    @work(thread=True, group="catalog")
+    def reload_schemas(self, node: TreeNode["Connection"]) -> None:
+        self.load_schemas(node)
+
+    def load_schemas(self, node: TreeNode["Connection"]) -> None:
+        # Blocks on the database; only called from worker threads
+        try:
+            schemas = node.data.catalog.schemas()
+        except Exception as e:
+            self.catalog_error(node.data, e)
+            return
+
+        self.app.call_from_thread(self.add_catalog_items, node, schemas)
+
+    @work(thread=True, group="catalog")
+    def load_schema_objects(self, node: TreeNode) -> None:
+        connection = self.get_connection_node(node).data
+        try:
+            objects = connection.catalog.objects(node.data)
+        except Exception as e:
+            self.catalog_error(connection, e)
+            return
+
+        groups = [
+            CatalogGroup("Tables", objects.tables),
+            CatalogGroup("Views", objects.views),
+            CatalogGroup("Functions", objects.functions),
+        ]
+        self.app.call_from_thread(
+            self.add_catalog_items,
+            node,
+            [group for group in groups if group.items],
+        )
+
+    @work(thread=True, group="catalog")
+    def load_relation_details(self, node: TreeNode) -> None:
+        connection = self.get_connection_node(node).data
+        try:
+            details = connection.catalog.details(node.data)
+        except Exception as e:
+            self.catalog_error(connection, e)
+            return
+
+        items: list[Any] = list(details.columns)
+        if details.indexes:
+            items.append(CatalogGroup("Indexes", details.indexes))
+        self.app.call_from_thread(self.add_catalog_items, node, items)
+
+    def catalog_error(self, connection: "Connection", error: Exception) -> None:
+        log.error(error)
+        self.app.call_from_thread(
+            self.notify,
+            title="Catalog error",
+            message=f"Could not load the catalog of \"{connection.name}\".",
+            severity="error",
+            timeout=5,
+        )
+
+    def add_catalog_items(self, node: TreeNode, items: list[Any]) -> None:
+        # The node may have been refreshed or removed while loading
+        try:
+            self.get_node_by_id(node.id)
+        except UnknownNodeID:
+            return
+        if node.children:
+            return
+
+        for item in items:
+            expandable = isinstance(item, (Schema, Relation, CatalogGroup))
+            node.add(self.get_catalog_label(item), data=item, allow_expand=expandable)
+
+    def get_catalog_label(self, item: Any) -> Text:
+        if isinstance(item, CatalogGroup):
+            return Text.assemble(item.name, (f" {len(item.items)}", "dim"))
+        if isinstance(item, Relation) and item.kind in ("v", "m"):
+            kind = "view" if item.kind == "v" else "materialized view"
+            return Text.assemble(item.name, (f" {kind}", "dim"))
+        if isinstance(item, Function):
+            return Text.assemble(item.name, (f"({item.arguments})", "dim"))
+        if isinstance(item, Index):
+            return Text.assemble(item.name, (" primary" if item.primary else "", "dim"))
+        if isinstance(item, (Schema, Relation)):
+            return Text(item.name)
+
+        # Columns
+        return Text.assemble(
+            item.name,
+            (f" {item.type}", "dim"),
+            (" not null" if item.not_null else "", "dim"),
+        )
+
+    def get_connection_node(self, node: Optional[TreeNode]) -> Optional[TreeNode["Connection"]]:
+        while node is not None and not self.is_connection_node(node):
+            node = node.parent
+        return node
+
+    def is_connection_node(self, node: TreeNode) -> bool:
+        # Connections are the top level of the tree; the connection module
+        # is loaded after startup, so nodes aren't recognized by type
+        return node.parent is self.root
+
+    def get_connection_label(self, connection: "Connection") -> Text:
         label = Text(connection.name)
-        if connection.connected:
+        health = connection.health
+        if health is None:
+            return label
+        if health.down:
+            label.append(" (unreachable)", style="red")
+        elif health.latency is not None:
+            label.append(" (connected, {:.0f} ms)".format(health.latency * 1000), style="green")
+        else:
             label.append(" (connected)", style="green")
         return label
 
-    def update_node_label(self, node: TreeNode[Connection]) -> None:
+    def get_label_key(self, connection: "Connection") -> tuple:
+        # What `get_connection_label` depends on, compared without building it
+        health = connection.health
+        if health is None:
+            return (connection.name,)
+        latency = None if health.latency is None else round(health.latency * 1000)
+        return (connection.name, health.down, latency)
+
+    def update_node_label(self, node: TreeNode["Connection"]) -> None:
         node.set_label(self.get_connection_label(node.data))
+        self._labels[node.data.id] = self.get_label_key(node.data)
 
 class ConnectionPreview(VerticalScroll):
     DEFAULT_CSS = """
@@ -224,13 +518,13 @@ class ConnectionPreview(VerticalScroll):
     }
     """
 
-    connection: Reactive[Optional[Connection]] = reactive(None)
+    connection: Reactive[Optional["Connection"]] = reactive(None)
 
     def compose(self) -> ComposeResult:
         self.can_focus = False
         yield Static("", id="host")
 
-    def watch_connection(self, connection: Optional[Connection]) -> None:
+    def watch_connection(self, connection: Optional["Connection"]) -> None:
         self.set_class(connection is None, "hidden")
         if connection:
             host = self.query_one("#host", Static)
@@ -261,8 +555,8 @@ class Navigator(Vertical):
     }
     """
 
-    connections: Reactive[list[Connection]] = reactive(list)
-    highlighted_connection: Reactive[Optional[Connection]] = reactive(None)
+    connections: Reactive[list["Connection"]] = reactive(list, always_update=True)
+    highlighted_connection: Reactive[Optional["Connection"]] = reactive(None)
 
     def compose(self) -> ComposeResult:
         self.border_title = "Navigator"
@@ -279,15 +573,12 @@ class Navigator(Vertical):
         yield tree
         yield ConnectionPreview()
 
-    def watch_highlighted_connection(self, connection: Optional[Connection]) -> None:
+    def watch_highlighted_connection(self, connection: Optional["Connection"]) -> None:
         self.connection_preview.connection = connection or None
 
     @on(ConnectionTree.ConnectionHighlighted)
-    def on_node_highlighted(self, event: Tree.NodeHighlighted[Connection]) -> None:
-        if isinstance(event.node.data, Connection):
-            self.highlighted_connection = event.node.data
-        else:
-            self.highlighted_connection = None
+    def on_node_highlighted(self, event: ConnectionTree.ConnectionHighlighted) -> None:
+        self.highlighted_connection = event.connection
 
     @property
     def connection_preview(self) -> ConnectionPreview:
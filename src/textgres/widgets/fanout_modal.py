@@ -0,0 +1,90 @@
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Label, SelectionList
+from typing import TYPE_CHECKING, Optional
+
+from textgres.fanout import FANOUT_MAX_WORKERS
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+class FanoutModal(ModalScreen[Optional[list["Connection"]]]):
+    """Chooses the connections to run the editor's query on at once.
+
+    Dismisses with the chosen connections, in the order they are saved, or
+    None when closed.
+    """
+
+    CSS = """
+    FanoutModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 60%;
+            height: 70%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+        }
+
+        & #fanout-help {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & SelectionList {
+            height: 1fr;
+            border: none;
+            padding: 0;
+            background: transparent;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Cancel"),
+        Binding("ctrl+s", "run", "Run"),
+        Binding("ctrl+a", "toggle_all", "Select All/None"),
+    ]
+
+    def __init__(self, connections: list["Connection"], selected: set[int]) -> None:
+        super().__init__()
+        self.connections = connections
+        self.selected = selected
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "Fan out"
+            yield Label(
+                "Runs the query on every chosen connection, {} at a time.".format(FANOUT_MAX_WORKERS),
+                id="fanout-help",
+            )
+            yield SelectionList[int](
+                *(
+                    (connection.name, index, connection.id in self.selected)
+                    for index, connection in enumerate(self.connections)
+                )
+            )
+        yield Footer()
+
+    def action_toggle_all(self) -> None:
+        selection_list = self.query_one(SelectionList)
+        if len(selection_list.selected) == len(self.connections):
+            selection_list.deselect_all()
+        else:
+            selection_list.select_all()
+
+    def action_run(self) -> None:
+        indexes = sorted(self.query_one(SelectionList).selected)
+        if not indexes:
+            self.notify("Choose at least one connection.", timeout=5)
+            return
+        self.dismiss([self.connections[index] for index in indexes])
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
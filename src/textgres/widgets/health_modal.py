@@ -0,0 +1,278 @@
+from datetime import datetime
+from rich.text import Text
+from textual import log, on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical, VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import DataTable, Footer, Label, Static
+from textual.widgets.data_table import CellDoesNotExist, RowDoesNotExist
+from typing import TYPE_CHECKING, Callable, Optional
+
+from textgres.catalog import Schema
+from textgres.health import SchemaHealth, TableHealth
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# Keys, labels and sort keys of the table's columns; sizes and counts sort
+# largest first
+HEALTH_COLUMNS: tuple[tuple[str, str, Optional[Callable[[TableHealth], float]]], ...] = (
+    ("name", "Table", None),
+    ("total_size", "Total", lambda table: table.total_size),
+    ("table_size", "Heap", lambda table: table.table_size),
+    ("toast_size", "TOAST", lambda table: table.toast_size),
+    ("indexes_size", "Indexes", lambda table: table.indexes_size),
+    ("wasted", "Wasted", lambda table: table.wasted),
+    ("bloat", "Bloat", lambda table: table.bloat_ratio or 0.0),
+    ("dead_tuples", "Dead", lambda table: table.dead_tuples or 0),
+    ("dead_ratio", "Dead %", lambda table: table.dead_ratio or 0.0),
+    ("last_vacuum", "Vacuumed", None),
+    ("last_analyze", "Analyzed", None),
+    ("flags", "", None),
+)
+
+def format_size(size: Optional[float]) -> str:
+    if size is None:
+        return "?"
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(size) < 1024:
+            return "{:.0f} {}".format(size, unit) if unit == "B" else "{:.1f} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} TB".format(size)
+
+def format_ratio(ratio: Optional[float]) -> str:
+    return "?" if ratio is None else "{:.0f}%".format(ratio * 100)
+
+def format_timestamp(timestamp: Optional[datetime]) -> str:
+    return "never" if timestamp is None else timestamp.strftime("%Y-%m-%d %H:%M")
+
+class HealthModal(ModalScreen[None]):
+    """Sizes, estimated bloat and vacuum statistics of a schema's tables.
+
+    The whole schema is loaded with two catalog queries and cached by the
+    connection's `Catalog`, so thousands of tables can be sorted by wasted
+    space without going back to the server. The indexes of the highlighted
+    table, with their usage, are shown below.
+    """
+
+    CSS = """
+    HealthModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 95%;
+            height: 90%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+            border-subtitle-color: $text-muted;
+            border-subtitle-background: $background;
+        }
+
+        & #health-summary {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & DataTable {
+            height: 2fr;
+            background: transparent;
+        }
+
+        & #health-details {
+            height: 1fr;
+            border-top: solid gray 35%;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Close"),
+        Binding("s", "cycle_sort", "Sort"),
+        Binding("r", "refresh_health", "Refresh"),
+    ]
+
+    def __init__(
+        self,
+        connection: "Connection",
+        schema: Schema,
+        relation_oid: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.connection = connection
+        self.schema = schema
+        # The table to put the cursor on once loaded
+        self.relation_oid = relation_oid
+        self.health: Optional[SchemaHealth] = None
+        self.sort_column = "wasted"
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "Health of {}".format(self.schema.name)
+            yield Label("Loading…", id="health-summary")
+            table = DataTable(cursor_type="row", zebra_stripes=True)
+            for key, label, _ in HEALTH_COLUMNS:
+                table.add_column(label, key=key)
+            yield table
+            with VerticalScroll(id="health-details"):
+                yield Static("", id="health-details-text")
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.update_subtitle()
+        self.load_health(refresh=False)
+
+    @work(thread=True, exclusive=True, group="health")
+    def load_health(self, refresh: bool) -> None:
+        try:
+            health = self.connection.catalog.health(self.schema, refresh=refresh)
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(
+                self.query_one("#health-summary", Label).update,
+                Text("Could not load sizes: {}".format(str(e).strip()), style="red"),
+            )
+            return
+
+        self.app.call_from_thread(self.show_health, health)
+
+    def show_health(self, health: SchemaHealth) -> None:
+        self.health = health
+        tables = health.tables.values()
+        vacuum = sum(1 for table in tables if table.vacuum_candidate)
+        reindex = sum(1 for table in tables for index in table.indexes if index.reindex_candidate)
+        self.query_one("#health-summary", Label).update(
+            "{} tables · {} total · {} estimated wasted · {} to vacuum · {} indexes to reindex · as of {}".format(
+                len(health.tables),
+                format_size(sum(table.total_size for table in tables)),
+                format_size(sum(table.wasted for table in tables)),
+                vacuum,
+                reindex,
+                datetime.fromtimestamp(health.loaded_at).strftime("%H:%M:%S"),
+            )
+        )
+        self.refresh_table()
+
+    def refresh_table(self) -> None:
+        if self.health is None:
+            return
+
+        table = self.query_one(DataTable)
+        selected = self.selected_oid
+        if selected is None:
+            selected = self.relation_oid
+        sort_key = next(key for column, _, key in HEALTH_COLUMNS if column == self.sort_column)
+
+        table.clear()
+        for health in sorted(self.health.tables.values(), key=sort_key, reverse=True):
+            table.add_row(*self.get_cells(health), key=str(health.oid))
+        if selected is not None:
+            try:
+                table.move_cursor(row=table.get_row_index(str(selected)))
+            except RowDoesNotExist:
+                pass
+
+    def get_cells(self, health: TableHealth) -> tuple:
+        flags = []
+        if health.vacuum_candidate:
+            flags.append("vacuum")
+        if any(index.reindex_candidate for index in health.indexes):
+            flags.append("reindex")
+        if any(index.unused for index in health.indexes):
+            flags.append("unused index")
+
+        return (
+            health.name,
+            format_size(health.total_size),
+            format_size(health.table_size),
+            format_size(health.toast_size),
+            format_size(health.indexes_size),
+            format_size(health.wasted),
+            format_ratio(health.bloat_ratio),
+            "?" if health.dead_tuples is None else "{:,}".format(health.dead_tuples),
+            format_ratio(health.dead_ratio),
+            format_timestamp(health.last_vacuum),
+            format_timestamp(health.last_analyze),
+            Text(", ".join(flags), style="magenta"),
+        )
+
+    @on(DataTable.RowHighlighted)
+    def on_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        if self.health is None or event.row_key.value is None:
+            return
+        health = self.health.tables.get(int(event.row_key.value))
+        if health is not None:
+            self.query_one("#health-details-text", Static).update(self.get_details(health))
+
+    def get_details(self, health: TableHealth) -> Text:
+        details = Text()
+        details.append("{} live, {} dead tuples".format(
+            "?" if health.live_tuples is None else "{:,}".format(health.live_tuples),
+            "?" if health.dead_tuples is None else "{:,}".format(health.dead_tuples),
+        ), style="dim")
+        details.append("\n")
+        if not health.indexes:
+            details.append("No indexes.", style="dim")
+            return details
+
+        for index in sorted(health.indexes, key=lambda index: index.size, reverse=True):
+            details.append(index.name, style="bold")
+            details.append(" {}{}".format(index.method, " primary" if index.primary else " unique" if index.unique else ""), style="dim")
+            details.append("  {} · bloat {} ({}) · {} scans, {} read, {} fetched".format(
+                format_size(index.size),
+                format_size(index.bloat),
+                format_ratio(index.bloat_ratio),
+                "?" if index.scans is None else "{:,}".format(index.scans),
+                "?" if index.tuples_read is None else "{:,}".format(index.tuples_read),
+                "?" if index.tuples_fetched is None else "{:,}".format(index.tuples_fetched),
+            ))
+            if index.reindex_candidate:
+                details.append("  ⚠ reindex", style="magenta")
+            if index.unused:
+                details.append("  ⚠ never scanned", style="magenta")
+            details.append("\n")
+        return details
+
+    def update_subtitle(self) -> None:
+        label = next(label for key, label, _ in HEALTH_COLUMNS if key == self.sort_column)
+        self.query_one(Vertical).border_subtitle = "by {}".format(label.lower())
+
+    @property
+    def selected_oid(self) -> Optional[int]:
+        table = self.query_one(DataTable)
+        if table.row_count == 0:
+            return None
+        try:
+            row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        except (CellDoesNotExist, RowDoesNotExist):
+            return None
+        return int(row_key.value)
+
+    @property
+    def sortable_columns(self) -> list[str]:
+        return [key for key, _, sort_key in HEALTH_COLUMNS if sort_key is not None]
+
+    @on(DataTable.HeaderSelected)
+    def on_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        if event.column_key.value in self.sortable_columns:
+            self.sort_by(event.column_key.value)
+
+    def action_cycle_sort(self) -> None:
+        columns = self.sortable_columns
+        self.sort_by(columns[(columns.index(self.sort_column) + 1) % len(columns)])
+
+    def sort_by(self, column: str) -> None:
+        self.sort_column = column
+        self.update_subtitle()
+        self.refresh_table()
+
+    def action_refresh_health(self) -> None:
+        self.query_one("#health-summary", Label).update("Refreshing…")
+        self.load_health(refresh=True)
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
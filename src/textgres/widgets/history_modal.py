@@ -0,0 +1,125 @@
+from datetime import datetime
+from rich.text import Text
+from textual import on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Input, OptionList
+from textual.widgets.option_list import Option
+from typing import Optional
+
+from textgres.history import HistoryEntry, QueryHistory
+
+class HistoryModal(ModalScreen[Optional[HistoryEntry]]):
+    """Searches the query history as you type.
+
+    Dismisses with the chosen entry, or None when closed.
+    """
+
+    CSS = """
+    HistoryModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 80%;
+            height: 80%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+        }
+
+        & Input {
+            margin-bottom: 1;
+            height: 1;
+            width: 1fr;
+        }
+
+        & OptionList {
+            height: 1fr;
+            border: none;
+            padding: 0;
+            background: transparent;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Cancel"),
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("up", "cursor_up", "Up", show=False),
+    ]
+
+    def __init__(self, history: QueryHistory, connection_names: dict[int, str]) -> None:
+        super().__init__()
+        self.history = history
+        self.connection_names = connection_names
+        self.entries: list[HistoryEntry] = []
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "History"
+            yield Input(placeholder="Search queries", id="search-input")
+            yield OptionList()
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.search("")
+
+    @on(Input.Changed)
+    def on_search_changed(self, event: Input.Changed) -> None:
+        self.search(event.value)
+
+    @work(thread=True, exclusive=True, group="history")
+    def search(self, text: str) -> None:
+        entries = self.history.search(text)
+        self.app.call_from_thread(self.show_entries, entries)
+
+    def show_entries(self, entries: list[HistoryEntry]) -> None:
+        self.entries = entries
+        option_list = self.query_one(OptionList)
+        option_list.clear_options()
+        option_list.add_options(Option(self.get_entry_prompt(entry)) for entry in entries)
+        if entries:
+            option_list.highlighted = 0
+
+    def get_entry_prompt(self, entry: HistoryEntry) -> Text:
+        details = [
+            self.connection_names.get(entry.connection_id, "deleted connection"),
+            datetime.fromtimestamp(entry.executed_at).strftime("%Y-%m-%d %H:%M:%S"),
+            "{:.2f}s".format(entry.duration),
+        ]
+        if entry.rows is not None:
+            details.append("{} rows".format(entry.rows))
+
+        return Text.assemble(
+            # Queries are shown on a single line
+            " ".join(entry.query.split()),
+            "\n",
+            (" · ".join(details), "dim"),
+            ("  {}".format(entry.error.splitlines()[0]) if entry.error else "", "red"),
+            no_wrap=True,
+            overflow="ellipsis",
+        )
+
+    def action_cursor_down(self) -> None:
+        self.query_one(OptionList).action_cursor_down()
+
+    def action_cursor_up(self) -> None:
+        self.query_one(OptionList).action_cursor_up()
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
+
+    @on(Input.Submitted)
+    def on_search_submitted(self, event: Input.Submitted) -> None:
+        highlighted = self.query_one(OptionList).highlighted
+        if highlighted is not None:
+            self.dismiss(self.entries[highlighted])
+
+    @on(OptionList.OptionSelected)
+    def on_option_selected(self, event: OptionList.OptionSelected) -> None:
+        self.dismiss(self.entries[event.option_index])
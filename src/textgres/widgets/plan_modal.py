@@ -0,0 +1,155 @@
+from rich.text import Text
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical, VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Label, Static, Tree
+from textual.widgets.tree import TreeNode
+
+from textgres.plan import DETAIL_KEYS, HOT_SHARE, WARM_SHARE, Plan, PlanNode
+from textgres.widgets.tree import TextgresTree
+
+def format_time(milliseconds: float) -> str:
+    if milliseconds >= 1000:
+        return "{:.2f}s".format(milliseconds / 1000)
+    return "{:.2f}ms".format(milliseconds)
+
+class PlanTree(TextgresTree[PlanNode]):
+    """The nodes of a query plan, fully expanded.
+
+    Each label shows the node's own share of the plan, with hot nodes in
+    red and warm ones in yellow, followed by its times, rows, buffers and
+    any flags.
+    """
+
+    def __init__(self, plan: Plan) -> None:
+        super().__init__("plan")
+        self.plan = plan
+        self.show_root = False
+        self.guide_depth = 3
+
+    def on_mount(self) -> None:
+        self.add_plan_node(self.root, self.plan.root)
+        self.root.expand_all()
+        self.cursor_line = 0
+
+    def add_plan_node(self, parent: TreeNode[PlanNode], node: PlanNode) -> None:
+        tree_node = parent.add(self.get_node_label(node), node, allow_expand=bool(node.children))
+        for child in node.children:
+            self.add_plan_node(tree_node, child)
+
+    def get_node_label(self, node: PlanNode) -> Text:
+        if node.share >= HOT_SHARE:
+            style = "bold red"
+        elif node.share >= WARM_SHARE:
+            style = "yellow"
+        else:
+            style = ""
+
+        label = Text.assemble(("{:>3.0f}% ".format(node.share * 100), style or "dim"), (node.node_type, style))
+        if node.relation:
+            label.append(" on {}".format(node.relation))
+
+        figures = []
+        if node.inclusive_time is not None:
+            figures.append("{} self, {} total".format(
+                format_time(node.exclusive_time or 0.0),
+                format_time(node.inclusive_time),
+            ))
+            if node.executed:
+                figures.append("rows {:,.0f} est, {:,.0f} actual".format(node.plan_rows, node.actual_rows))
+            else:
+                figures.append("never executed")
+            if node.shared_hit or node.shared_read:
+                figures.append("buffers {:,} hit, {:,} read".format(node.shared_hit, node.shared_read))
+        else:
+            figures.append("cost {:,.2f}..{:,.2f}".format(node.startup_cost, node.total_cost))
+            figures.append("rows {:,.0f} est".format(node.plan_rows))
+
+        label.append("  " + " · ".join(figures), style="dim")
+        for flag in node.flags:
+            label.append("  ⚠ {}".format(flag), style="magenta")
+        return label
+
+class PlanModal(ModalScreen[None]):
+    """Shows the plan of a query, with the details of the highlighted node."""
+
+    CSS = """
+    PlanModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 90%;
+            height: 90%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+        }
+
+        & #plan-summary {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & PlanTree {
+            height: 2fr;
+            background: transparent;
+        }
+
+        & #plan-details {
+            height: 1fr;
+            border-top: solid gray 35%;
+            color: $text-muted;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Close"),
+    ]
+
+    def __init__(self, plan: Plan, statement: str) -> None:
+        super().__init__()
+        self.plan = plan
+        self.statement = statement
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "Explain Analyze" if self.plan.analyzed else "Explain"
+            yield Label(self.get_summary(), id="plan-summary")
+            yield PlanTree(self.plan)
+            with VerticalScroll(id="plan-details"):
+                yield Static("", id="plan-details-text")
+        yield Footer()
+
+    def get_summary(self) -> str:
+        parts = [" ".join(self.statement.split())]
+        if self.plan.planning_time is not None:
+            parts.append("planned in {}".format(format_time(self.plan.planning_time)))
+        if self.plan.execution_time is not None:
+            parts.append("executed in {}".format(format_time(self.plan.execution_time)))
+        return " · ".join(parts)
+
+    @on(Tree.NodeHighlighted)
+    def on_node_highlighted(self, event: Tree.NodeHighlighted[PlanNode]) -> None:
+        node = event.node.data
+        if node is None:
+            return
+
+        details = Text()
+        for key in DETAIL_KEYS:
+            value = node.details.get(key)
+            if value is None or value == []:
+                continue
+            if isinstance(value, list):
+                value = ", ".join(str(item) for item in value)
+            details.append("{}: ".format(key), style="bold")
+            details.append("{}\n".format(value))
+        self.query_one("#plan-details-text", Static).update(details)
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
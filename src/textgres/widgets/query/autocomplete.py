@@ -0,0 +1,132 @@
+import re
+from rich.text import Text
+from textual import events
+from textual.widgets import TextArea
+from textual_autocomplete import AutoComplete, DropdownItem, TargetState
+from typing import Callable, Optional
+
+from textgres.completion import Completion, CompletionIndex
+
+# The (possibly qualified) identifier being typed just before the cursor
+IDENTIFIER_BEFORE_CURSOR = re.compile(r'(?:[\w$"]+\.)*[\w$"]*$')
+
+KIND_LABELS = {
+    "schema": "sch",
+    "table": "tbl",
+    "view": "vw ",
+    "column": "col",
+    "function": "fn ",
+}
+
+class SqlAutoComplete(AutoComplete):
+    """Completes schema, relation, column and function names in the editor.
+
+    Candidates come from the `CompletionIndex` returned by `index`, which is
+    only ever searched by prefix so typing stays fast on large catalogs.
+
+    The target forwards its key presses to `handle_key` before handling them
+    itself, as textual-autocomplete only sees a TextArea's keys after they
+    have already been applied.
+
+    `_listen_to_messages` and `_complete` override private methods of
+    textual-autocomplete, which is pinned to the release they were written
+    against in pyproject.toml.
+    """
+
+    # The most candidates shown in the dropdown at once
+    MAX_MATCHES = 50
+
+    def __init__(
+        self,
+        target: TextArea | str,
+        index: Callable[[], Optional[CompletionIndex]],
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+        disabled: bool = False,
+    ) -> None:
+        super().__init__(
+            target,
+            candidates=[],
+            name=name,
+            id=id,
+            classes=classes,
+            disabled=disabled,
+        )
+        self.index = index
+        self._matches: list[Completion] = []
+
+    def on_mount(self) -> None:
+        self.target.autocomplete = self
+
+    def _listen_to_messages(self, event: events.Event) -> None:
+        # Keys are handled in `handle_key` instead
+        if isinstance(event, TextArea.Changed):
+            self._handle_target_update()
+
+    def handle_key(self, event: events.Key) -> bool:
+        option_list = self.option_list
+        if not self.display or not option_list.option_count:
+            return False
+
+        highlighted = option_list.highlighted or 0
+        if event.key == "down":
+            option_list.highlighted = (highlighted + 1) % option_list.option_count
+        elif event.key == "up":
+            option_list.highlighted = (highlighted - 1) % option_list.option_count
+        elif event.key in ("tab", "enter"):
+            self._complete(highlighted)
+        elif event.key == "escape":
+            self.action_hide()
+        else:
+            return False
+
+        event.stop()
+        event.prevent_default()
+        return True
+
+    def get_search_string(self, target_state: TargetState) -> str:
+        row, column = target_state.selection.end
+        line = self.target.document.get_line(row)[:column]
+        match = IDENTIFIER_BEFORE_CURSOR.search(line)
+        return match.group(0) if match else ""
+
+    def get_matches(
+        self,
+        target_state: TargetState,
+        candidates: list[DropdownItem],
+        search_string: str,
+    ) -> list[DropdownItem]:
+        index = self.index()
+        if index is None or not search_string:
+            self._matches = []
+            return []
+
+        self._matches = index.lookup(search_string, self.MAX_MATCHES)
+        match_style = self.get_component_rich_style("autocomplete--highlight-match")
+        return [
+            DropdownItem(
+                main=Text.assemble(
+                    (completion.text[:len(search_string)], match_style),
+                    completion.text[len(search_string):],
+                    (f" {completion.detail}" if completion.detail else "", "dim"),
+                ),
+                left_meta=KIND_LABELS.get(completion.kind, completion.kind),
+            )
+            for completion in self._matches
+        ]
+
+    def _complete(self, option_index: int) -> None:
+        # textual-autocomplete doesn't apply completions to a TextArea yet, so
+        # the identifier before the cursor is replaced here
+        if not self.display or not 0 <= option_index < len(self._matches):
+            return
+
+        value = self._matches[option_index].text
+        target = self.target
+        row, column = target.selection.end
+        search_string = self.get_search_string(self._get_target_state())
+        target.replace(value, (row, column - len(search_string)), (row, column))
+
+        self._last_action_was_completion = True
+        self.action_hide()
@@ -1,17 +1,47 @@
-from textual import log
+from dataclasses import dataclass
+from textual import events, log, on, work
 from textual.app import ComposeResult
+from textual.binding import Binding
 from textual.containers import Vertical
+from textual.message import Message
 from textual.reactive import Reactive, reactive
 from textual.widgets import Select
+from textual.timer import Timer
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
 
-from textgres.connection import Connection
+from textgres.completion import CompletionIndex
+from textgres.executor import (
+    FanoutCompleted,
+    QueryCompleted,
+    QueryFailed,
+    QueryProgress,
+    QueryStarted,
+    ScriptCompleted,
+)
+from textgres.sql import split_statements
 from textgres.widgets.text_area import (
   TextgresTextArea,
   TextAreaFooter,
   TextEditor,
 )
 
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+    from textgres.plan import Plan
+    from textgres.widgets.query.autocomplete import SqlAutoComplete
+
+# SQLSTATE of statements cancelled by the user or a timeout
+QUERY_CANCELED = "57014"
+
 class QueryTextArea(TextgresTextArea):
+    # Set by the autocomplete dropdown attached to this editor
+    autocomplete: Optional["SqlAutoComplete"] = None
+
+    def on_key(self, event: events.Key) -> None:
+        if self.autocomplete is not None:
+            self.autocomplete.handle_key(event)
+
     def on_mount(self):
         self.tab_behavior = "indent"
         self.show_line_numbers = True
@@ -19,13 +49,69 @@ class QueryTextArea(TextgresTextArea):
 class QueryArea(Vertical):
     DEFAULT_CSS = """
     QueryArea {
+        border-subtitle-color: $text-muted;
+
         & TextEditor {
             height: 1fr;
         }
     }
     """
 
-    connections: Reactive[list[Connection]] = reactive([])
+    BINDINGS = [
+        Binding("ctrl+r", "run_query", "Run"),
+        Binding("ctrl+b", "run_query(False)", "Run Uncached"),
+        Binding("ctrl+g", "cancel_query", "Cancel"),
+        Binding("ctrl+t", "explain_query(False)", "Explain"),
+        Binding("ctrl+l", "explain_query(True)", "Explain Analyze"),
+        Binding("f6", "toggle_autocommit", "Autocommit"),
+        Binding("f7", "toggle_batch", "Batch"),
+        Binding("f8", "fanout_query", "Fan Out"),
+        Binding("f9", "toggle_previews", "Previews"),
+    ]
+
+    @dataclass
+    class QuerySubmitted(Message):
+        connection: "Connection"
+        query: str
+        # Whether a cached result may be shown instead of running the query
+        use_cache: bool = True
+        # Whether only the start of large values is fetched
+        previews: bool = False
+
+    @dataclass
+    class FanoutSubmitted(Message):
+        connections: list["Connection"]
+        query: str
+
+    @dataclass
+    class ScriptSubmitted(Message):
+        connection: "Connection"
+        statements: list[str]
+        autocommit: bool = False
+        batch: bool = False
+
+    # How often the completion index of the selected connection is brought up
+    # to date with its catalog, in seconds
+    COMPLETIONS_REFRESH_INTERVAL = 60.0
+
+    connections: Reactive[list["Connection"]] = reactive([], always_update=True)
+    running: Reactive[bool] = reactive(False)
+    # How scripts of several statements are run; see `run_script`
+    autocommit: Reactive[bool] = reactive(False)
+    batch: Reactive[bool] = reactive(False)
+    # Whether large text, JSON and bytea values are fetched in part, to be
+    # loaded whole by the cell inspector; see `preview_query`. Off by
+    # default, as it costs a round-trip to describe each query first
+    previews: Reactive[bool] = reactive(False)
+
+    # The connections running the current statement, which are sent a
+    # cancel request by ctrl+g
+    _running_connections: list["Connection"] = []
+    # The connections last chosen to fan out to, by id
+    _fanout_ids: set[int] = set()
+    _status: str = ""
+    _started: float = 0.0
+    _elapsed_timer: Optional[Timer] = None
 
     def compose(self) -> ComposeResult:
         yield Select(options=[("No connections", -1)], allow_blank=False, id="placeholder-select")
@@ -41,6 +127,7 @@ class QueryArea(Vertical):
     def on_mount(self):
         self.border_title = "Query"
         self.add_class("section")
+        self.set_interval(self.COMPLETIONS_REFRESH_INTERVAL, self.refresh_completions)
 
     def watch_connections(self):
         if len(self.connections) == 0:
@@ -50,6 +137,256 @@ class QueryArea(Vertical):
             self.connection_select.set_options(options)
             self.connection_select.disabled = False
 
+    def watch_running(self, running: bool) -> None:
+        if self._elapsed_timer is not None:
+            self._elapsed_timer.stop()
+            self._elapsed_timer = None
+
+        if running:
+            self._started = monotonic()
+            self._elapsed_timer = self.set_interval(0.1, self.update_status)
+
+    def update_status(self) -> None:
+        self.border_subtitle = "{} {:.1f}s".format(self._status, monotonic() - self._started)
+
+    @on(QueryStarted)
+    def on_query_started(self, event: QueryStarted) -> None:
+        self._status = "Running"
+        self.running = True
+        self.update_status()
+
+    @on(QueryProgress)
+    def on_query_progress(self, event: QueryProgress) -> None:
+        self._status = event.status
+        self.update_status()
+
+    @on(QueryCompleted)
+    def on_query_completed(self, event: QueryCompleted) -> None:
+        self._running_connections = []
+        self.running = False
+        if event.cached:
+            self.border_subtitle = "Served from cache in {:.2f}s".format(event.elapsed)
+        else:
+            self.border_subtitle = "Completed in {:.2f}s".format(event.elapsed)
+        # The query may have changed the schema, or connected for the first
+        # time
+        self.refresh_completions()
+
+    @on(ScriptCompleted)
+    def on_script_completed(self, event: ScriptCompleted) -> None:
+        self._running_connections = []
+        self.running = False
+        failed = event.failed
+        if failed is None:
+            self.border_subtitle = "{} statements completed in {:.2f}s".format(len(event.results), event.elapsed)
+        else:
+            # Under autocommit only a failed batch is rolled back, as a whole
+            if not event.autocommit:
+                rolled_back = ", rolled back"
+            elif failed.batch is not None:
+                rolled_back = ", batch rolled back"
+            else:
+                rolled_back = ""
+            self.border_subtitle = "{} failed after {:.2f}s{}".format(
+                event.describe_failure().capitalize(),
+                event.elapsed,
+                rolled_back,
+            )
+        self.refresh_completions()
+
+    @on(FanoutCompleted)
+    def on_fanout_completed(self, event: FanoutCompleted) -> None:
+        self._running_connections = []
+        self.running = False
+        failed = len(event.result.failed)
+        self.border_subtitle = "{} connections in {:.2f}s{}".format(
+            len(event.connections),
+            event.elapsed,
+            ", {} failed".format(failed) if failed else "",
+        )
+
+    @on(Select.Changed)
+    def on_connection_selected(self, event: Select.Changed) -> None:
+        self.refresh_completions()
+
+    def refresh_completions(self) -> None:
+        connection = self.selected_connection
+        if connection is not None and connection.connected:
+            self.refresh_catalog_snapshot(connection)
+
+    @work(thread=True, exclusive=True, group="completions")
+    def refresh_catalog_snapshot(self, connection: "Connection") -> None:
+        try:
+            connection.catalog.refresh_snapshot()
+        except Exception as e:
+            log.error(e)
+
+    @on(QueryFailed)
+    def on_query_failed(self, event: QueryFailed) -> None:
+        self._running_connections = []
+        self.running = False
+        if getattr(event.error, "pgcode", None) == QUERY_CANCELED:
+            self.border_subtitle = "Cancelled after {:.2f}s".format(event.elapsed)
+        else:
+            self.border_subtitle = "Failed after {:.2f}s".format(event.elapsed)
+
+    def action_cancel_query(self) -> None:
+        if not self._running_connections:
+            return
+
+        self._status = "Cancelling"
+        self.update_status()
+        self.cancel_query(self._running_connections)
+
+    @work(thread=True, group="cancel")
+    def cancel_query(self, connections: list["Connection"]) -> None:
+        # The cancel request opens its own connection to the server, so it is
+        # sent off the event loop
+        try:
+            for connection in connections:
+                connection.cancel()
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(
+                self.notify,
+                title="Cancel error",
+                message=str(e),
+                severity="error",
+                timeout=5,
+            )
+
+    def action_run_query(self, use_cache: bool = True) -> None:
+        connection = self.selected_connection
+        query = self.query_one(TextEditor).text.strip()
+        if connection is None or not query:
+            return
+
+        # Set on every submission, so that ctrl+g never cancels the
+        # connections of an earlier query
+        self._running_connections = [connection]
+        statements = split_statements(query)
+        if len(statements) > 1:
+            self.post_message(
+                self.ScriptSubmitted(
+                    connection=connection,
+                    statements=statements,
+                    autocommit=self.autocommit,
+                    batch=self.batch,
+                )
+            )
+            return
+
+        self.post_message(
+            self.QuerySubmitted(connection=connection, query=query, use_cache=use_cache, previews=self.previews)
+        )
+
+    async def action_fanout_query(self) -> None:
+        query = self.query_one(TextEditor).text.strip()
+        if not self.connections or not query or self.running:
+            return
+
+        from textgres.widgets.fanout_modal import FanoutModal
+
+        def _handle_fanout_connections(connections: Optional[list["Connection"]]) -> None:
+            if not connections:
+                return
+
+            self._fanout_ids = {connection.id for connection in connections}
+            self._running_connections = connections
+            self.post_message(self.FanoutSubmitted(connections=connections, query=query))
+
+        selected = self._fanout_ids or {
+            connection.id for connection in [self.selected_connection] if connection is not None
+        }
+        await self.app.push_screen(
+            FanoutModal(self.connections, selected),
+            callback=_handle_fanout_connections,
+        )
+
+    def action_toggle_autocommit(self) -> None:
+        self.autocommit = not self.autocommit
+        self.border_subtitle = "Scripts run in {}".format("autocommit" if self.autocommit else "one transaction")
+
+    def action_toggle_batch(self) -> None:
+        self.batch = not self.batch
+        if self.batch:
+            self.border_subtitle = "Statements without results are sent in batches"
+        else:
+            self.border_subtitle = "Statements are sent one at a time"
+
+    def action_toggle_previews(self) -> None:
+        self.previews = not self.previews
+        if self.previews:
+            self.border_subtitle = "Only the start of large values is fetched"
+        else:
+            self.border_subtitle = "Values are fetched whole"
+
+    def action_explain_query(self, analyze: bool = False) -> None:
+        connection = self.selected_connection
+        query = self.query_one(TextEditor).text.strip()
+        if connection is None or not query or self.running:
+            return
+
+        self._status = "Explaining"
+        self._running_connections = [connection]
+        self.running = True
+        self.update_status()
+        self.explain_query(connection, query, analyze)
+
+    @work(thread=True, exclusive=True, group="explain")
+    def explain_query(self, connection: "Connection", query: str, analyze: bool) -> None:
+        # Explained on a pooled connection of its own, so the query can be
+        # cancelled like any other
+        started = monotonic()
+        try:
+            plan = connection.explain(query, analyze)
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(self.explain_failed, e, monotonic() - started)
+            return
+
+        self.app.call_from_thread(self.show_plan, plan, query, monotonic() - started)
+
+    def show_plan(self, plan: "Plan", query: str, elapsed: float) -> None:
+        from textgres.widgets.plan_modal import PlanModal
+
+        self._running_connections = []
+        self.running = False
+        self.border_subtitle = "Explained in {:.2f}s".format(elapsed)
+        self.app.push_screen(PlanModal(plan, query))
+
+    def explain_failed(self, error: Exception, elapsed: float) -> None:
+        self._running_connections = []
+        self.running = False
+        self.border_subtitle = "Explain failed after {:.2f}s".format(elapsed)
+        self.notify(
+            title="Explain error",
+            message=str(error).strip(),
+            severity="error",
+            timeout=5,
+        )
+
+    def load_query(self, query: str, connection_id: Optional[int] = None) -> None:
+        self.query_one(QueryTextArea).load_text(query)
+        index = next(
+            (i for i, connection in enumerate(self.connections) if connection.id == connection_id),
+            None,
+        )
+        if index is not None:
+            self.connection_select.value = index
+
     @property
     def connection_select(self) -> Select:
-        return self.query_one(Select)
\ No newline at end of file
+        return self.query_one(Select)
+
+    @property
+    def completion_index(self) -> Optional[CompletionIndex]:
+        connection = self.selected_connection
+        return None if connection is None else connection.catalog.completion_index
+
+    @property
+    def selected_connection(self) -> Optional["Connection"]:
+        index = self.connection_select.value
+        if not isinstance(index, int) or not 0 <= index < len(self.connections):
+            return None
+        return self.connections[index]
@@ -1,10 +1,27 @@
+from rich.text import Text
+from time import time
+from textual import on
 from textual.app import ComposeResult
+from textual.binding import Binding
 from textual.containers import Vertical
-from textual.widgets import Label
+from textual.widgets import DataTable, Input, Label, Tab, Tabs
+from typing import TYPE_CHECKING, Optional
 
+from textgres.executor import (
+    FanoutCompleted,
+    QueryCompleted,
+    QueryFailed,
+    QueryStarted,
+    ScriptCompleted,
+)
+from textgres.result_cache import CachedResult, CachedStream
 from textgres.widgets.center_middle import CenterMiddle
 from textgres.widgets.results.results_table import ResultsTable
 
+if TYPE_CHECKING:
+    from textgres.connection import Connection, ResultStream
+    from textgres.script import StatementResult
+
 class ResultsArea(Vertical):
     DEFAULT_CSS = """
     ResultsArea {
@@ -28,9 +45,63 @@ class ResultsArea(Vertical):
                 display: block;
             }
         }
+
+        & #script-tabs {
+            display: none;
+        }
+
+        & #script-summary {
+            display: none;
+        }
+
+        &.script #script-tabs {
+            display: block;
+        }
+
+        & #results-prompt {
+            display: none;
+            border: none;
+            height: 1;
+            padding: 0 1;
+        }
+
+        &.prompting #results-prompt {
+            display: block;
+        }
+
+        &.summary {
+            & ResultsTable {
+                display: none;
+            }
+
+            & #empty-message {
+                display: none;
+            }
+
+            & #script-summary {
+                display: block;
+                height: 1fr;
+            }
+        }
     }
     """
 
+    BINDINGS = [
+        Binding("ctrl+s", "export_results", "Export"),
+        Binding("escape", "close_prompt", "Close", show=False),
+    ]
+
+    # What the prompt below the results is for: "filter" or "search"
+    _prompt: Optional[str] = None
+
+    # The statement and connection which produced the displayed results
+    _query: Optional[tuple["Connection", str]] = None
+    # The results of the last script, shown in a tab each
+    _script: Optional[ScriptCompleted] = None
+    _script_result: Optional["StatementResult"] = None
+    # The last query run on several connections at once
+    _fanout: Optional[FanoutCompleted] = None
+
     def __init__(
         self,
         name: str | None = None,
@@ -47,5 +118,274 @@ class ResultsArea(Vertical):
 
     def compose(self) -> ComposeResult:
         self.set_class(self.table.row_count == 0, "empty")
-        yield CenterMiddle(Label("No results."), id="empty-message")
-        yield self.table
\ No newline at end of file
+        yield Tabs(id="script-tabs")
+        yield CenterMiddle(Label("No results.", id="empty-label"), id="empty-message")
+        yield self.table
+        yield Input(id="results-prompt")
+        # The statements of a script, or the connections of a fanned out
+        # query, with how each fared
+        yield DataTable(id="script-summary", cursor_type="row", zebra_stripes=True)
+
+    def show_results(self, stream: "ResultStream | CachedStream") -> None:
+        self.table.load_stream(stream)
+        self.set_class(len(stream.columns) == 0, "empty")
+        if len(stream.columns) == 0:
+            self.border_subtitle = "{} rows affected".format(max(stream.rowcount, 0))
+
+    def show_message(self, message: str) -> None:
+        self.table.clear()
+        self.add_class("empty")
+        self.query_one("#empty-label", Label).update(message)
+
+    async def action_export_results(self) -> None:
+        if self._query is None or self.has_class("empty"):
+            self.notify("There are no results to export.", timeout=5)
+            return
+
+        from textgres.connection import is_streamable
+        from textgres.transfer import query_source
+        from textgres.widgets.transfer_modal import TransferModal
+
+        connection, query = self._query
+        # COPY only accepts a single query returning rows
+        if not is_streamable(query):
+            self.notify("Only the results of a query can be exported.", timeout=5)
+            return
+
+        def _handle_transfer_result(message: Optional[str]) -> None:
+            if message is not None:
+                self.notify(title="Export", message=message, timeout=5)
+
+        await self.app.push_screen(
+            TransferModal(
+                connection,
+                query_source(query),
+                label="results",
+                path="results.csv",
+            ),
+            callback=_handle_transfer_result,
+        )
+
+    @on(QueryStarted)
+    def on_query_started(self, event: QueryStarted) -> None:
+        self.loading = True
+        self._query = (event.connection, event.query)
+        self._script = None
+        self._script_result = None
+        self._fanout = None
+        self.remove_class("script", "summary")
+
+    @on(ScriptCompleted)
+    async def on_script_completed(self, event: ScriptCompleted) -> None:
+        self.loading = False
+        self._script = event
+        self.add_class("script")
+        self.show_summary(event)
+
+        tabs = self.query_one("#script-tabs", Tabs)
+        await tabs.clear()
+        await tabs.add_tab(Tab("Summary", id="script-tab-summary"))
+        for index, result in enumerate(event.results):
+            if result.has_rows:
+                await tabs.add_tab(Tab("#{}".format(index + 1), id="script-tab-{}".format(index)))
+
+        # Opens on the last result set, unless a statement failed
+        with_rows = [index for index, result in enumerate(event.results) if result.has_rows]
+        if event.failed is None and with_rows:
+            tabs.active = "script-tab-{}".format(with_rows[-1])
+        else:
+            tabs.active = "script-tab-summary"
+
+    def show_summary(self, event: ScriptCompleted) -> None:
+        summary = self.query_one("#script-summary", DataTable)
+        summary.clear(columns=True)
+        summary.add_columns("#", "Time", "Rows", "Status", "Statement")
+        failed = event.failed
+        for index, result in enumerate(event.results):
+            if result.error is not None and result.batch is not None:
+                # Which statement of a batch failed isn't known, and the
+                # whole batch was rolled back
+                status = Text(
+                    "batch {} rolled back: {}".format(result.batch + 1, str(result.error).strip().splitlines()[0]),
+                    style="red",
+                )
+            elif result.error is not None:
+                status = Text(str(result.error).strip().splitlines()[0], style="red")
+            elif not result.executed:
+                status = Text("not run", style="dim")
+            elif failed is not None and not event.autocommit:
+                status = Text("rolled back", style="yellow")
+            elif result.batch is not None:
+                status = Text("ok, batch {}".format(result.batch + 1))
+            else:
+                status = Text("ok")
+            summary.add_row(
+                str(index + 1),
+                "{:.3f}s".format(result.elapsed) if result.executed else "",
+                "" if result.rowcount is None else "{:,}{}".format(result.rowcount, "+" if result.truncated else ""),
+                status,
+                # Statements are shown on a single line
+                Text(" ".join(result.statement.split()), no_wrap=True, overflow="ellipsis"),
+            )
+
+    @on(FanoutCompleted)
+    async def on_fanout_completed(self, event: FanoutCompleted) -> None:
+        self.loading = False
+        # The merged rows can't be exported by re-running the query
+        self._query = None
+        self._fanout = event
+        self.add_class("script")
+
+        summary = self.query_one("#script-summary", DataTable)
+        summary.clear(columns=True)
+        summary.add_columns("#", "Time", "Rows", "Status", "Connection")
+        for index, shard in enumerate(event.result.shards):
+            if shard.error is not None:
+                status = Text(str(shard.error).strip().splitlines()[0], style="red")
+            elif not shard.executed:
+                status = Text("not run", style="dim")
+            else:
+                status = Text("ok")
+            summary.add_row(
+                str(index + 1),
+                "{:.3f}s".format(shard.elapsed) if shard.executed else "",
+                "" if shard.rowcount is None else "{:,}{}".format(shard.rowcount, "+" if shard.truncated else ""),
+                status,
+                shard.connection.name,
+            )
+
+        tabs = self.query_one("#script-tabs", Tabs)
+        await tabs.clear()
+        await tabs.add_tab(Tab("Results", id="fanout-tab-results"))
+        await tabs.add_tab(Tab("Connections", id="fanout-tab-connections"))
+        # Statements without rows only have the connections to show
+        if len(event.result.columns) > 1:
+            tabs.active = "fanout-tab-results"
+        else:
+            tabs.active = "fanout-tab-connections"
+
+    @on(Tabs.TabActivated, "#script-tabs")
+    def on_script_tab_activated(self, event: Tabs.TabActivated) -> None:
+        if event.tab is None:
+            return
+
+        if self._fanout is not None:
+            result = self._fanout.result
+            failed = len(result.failed)
+            if event.tab.id == "fanout-tab-connections":
+                self.add_class("summary")
+                self.border_subtitle = "{} connections{}".format(
+                    len(result.shards),
+                    ", {} failed".format(failed) if failed else "",
+                )
+            else:
+                self.remove_class("summary")
+                self.show_results(
+                    CachedStream(
+                        CachedResult(columns=result.columns, buffer=result.buffer, cached_at=time(), nbytes=0)
+                    )
+                )
+            return
+
+        if self._script is None:
+            return
+
+        if event.tab.id == "script-tab-summary":
+            self._script_result = None
+            self.add_class("summary")
+            failed = self._script.failed
+            self.border_subtitle = "{} statements{}".format(
+                len(self._script.results),
+                "" if failed is None else ", {} failed".format(self._script.describe_failure()),
+            )
+            return
+
+        result = self._script.results[int(event.tab.id.rsplit("-", 1)[1])]
+        self._script_result = result
+        self._query = (self._script.connection, result.statement)
+        self.remove_class("summary")
+        self.show_results(result.stream())
+
+    @on(QueryCompleted)
+    def on_query_completed(self, event: QueryCompleted) -> None:
+        self.loading = False
+        self.show_results(event.stream)
+        if len(event.stream.columns) == 0:
+            self.query_one("#empty-label", Label).update("Query returned no results.")
+
+    @on(QueryFailed)
+    def on_query_failed(self, event: QueryFailed) -> None:
+        self.loading = False
+        self._query = None
+        self.border_subtitle = ""
+        self.show_message(str(event.error).strip() or "Query failed.")
+
+    @on(ResultsTable.PageLoaded)
+    def on_page_loaded(self, event: ResultsTable.PageLoaded) -> None:
+        if self.has_class("empty"):
+            return
+        self.show_row_count(event.rows, event.exhausted, event.truncated)
+
+    def show_row_count(self, rows: int, exhausted: bool, truncated: bool = False) -> None:
+        if truncated:
+            self.border_subtitle = "first {:,} rows, export the query for the rest".format(rows)
+        elif self._script_result is not None and self._script_result.truncated:
+            self.border_subtitle = "first {} rows".format(rows)
+        elif exhausted:
+            self.border_subtitle = "{} rows".format(rows)
+        else:
+            self.border_subtitle = "{}+ rows".format(rows)
+
+    @on(ResultsTable.ViewChanged)
+    def on_view_changed(self, event: ResultsTable.ViewChanged) -> None:
+        if not event.description:
+            self.show_row_count(event.loaded, event.exhausted, event.truncated)
+            return
+        self.border_subtitle = "{:,} of {:,}{} loaded rows, {}".format(
+            event.rows,
+            event.loaded,
+            "" if event.exhausted else "+",
+            event.description,
+        )
+
+    @on(ResultsTable.CellInspected)
+    async def on_cell_inspected(self, event: ResultsTable.CellInspected) -> None:
+        from textgres.widgets.cell_modal import CellModal
+
+        await self.app.push_screen(CellModal(event.value, event.column, self._query))
+
+    @on(ResultsTable.PromptRequested)
+    def on_prompt_requested(self, event: ResultsTable.PromptRequested) -> None:
+        self._prompt = event.kind
+        prompt = self.query_one("#results-prompt", Input)
+        if event.kind == "filter":
+            prompt.placeholder = "Filter the loaded rows, e.g. total >= 100 and name ~ smith"
+        else:
+            prompt.placeholder = "Search the loaded rows"
+        prompt.value = event.value
+        self.add_class("prompting")
+        prompt.focus()
+
+    @on(Input.Changed, "#results-prompt")
+    def on_prompt_changed(self, event: Input.Changed) -> None:
+        # Searches as the text is typed
+        if self._prompt == "search":
+            self.table.search(event.value, quiet=True)
+
+    @on(Input.Submitted, "#results-prompt")
+    def on_prompt_submitted(self, event: Input.Submitted) -> None:
+        if self._prompt == "filter":
+            self.table.apply_filter(event.value)
+        elif self._prompt == "search":
+            self.table.search(event.value)
+        self.action_close_prompt()
+
+    def action_close_prompt(self) -> None:
+        self._prompt = None
+        self.remove_class("prompting")
+        self.table.focus()
+
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> Optional[bool]:
+        if action == "close_prompt":
+            return self._prompt is not None
+        return True
@@ -1,5 +1,634 @@
-from textgres.widgets.data_table import TextgresDataTable
+from dataclasses import dataclass
+from decimal import Decimal
+from rich.cells import cell_len, set_cell_size
+from rich.segment import Segment
+from textual import events, log, work
+from textual.binding import Binding
+from textual.geometry import Size
+from textual.message import Message
+from textual.reactive import Reactive, reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Optional
 
-class ResultsTable(TextgresDataTable):
-  def on_mount(self):
-    self.zebra_stripes = True
\ No newline at end of file
+from textgres.large_values import format_bytes
+from textgres.result_view import Predicate, parse_filter
+from textgres.row_source import RowSource
+
+if TYPE_CHECKING:
+    from textgres.connection import ResultStream
+    from textgres.result_cache import CachedStream
+
+def format_cell(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bytes, memoryview)):
+        return format_bytes(value)
+    # Cells are a single line, so line breaks are shown as a visible marker
+    return str(value).replace("\r\n", "↵").replace("\n", "↵")
+
+def is_numeric(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+class ResultsTable(ScrollView, can_focus=True):
+    """A results grid which only renders the rows in the viewport.
+
+    Rows are read on demand from a `RowSource`, so the cost of drawing and
+    scrolling doesn't depend on how many rows have been loaded. Column widths
+    are computed from a sample of each page as it arrives and only ever grow.
+
+    The loaded rows can be sorted, filtered and searched without going back
+    to the server; see `ResultView`. No more pages are fetched while they
+    are sorted or filtered. The value under the cursor opens in a
+    `CellModal`, which loads it whole when only its start was fetched.
+    """
+
+    DEFAULT_CSS = """
+    ResultsTable {
+        height: 1fr;
+        background: $surface;
+        scrollbar-gutter: stable;
+
+        &.empty {
+            display: none;
+        }
+
+        & > .results-table--header {
+            text-style: bold;
+            background: $boost;
+            color: $text;
+        }
+
+        & > .results-table--odd-row {
+            background: $primary 10%;
+        }
+
+        & > .results-table--null {
+            color: $text-muted;
+            text-style: italic;
+        }
+
+        & > .results-table--cursor {
+            background: $primary-lighten-1 10%;
+            color: $text;
+        }
+
+        &:focus > .results-table--cursor {
+            background: $accent;
+            color: $text;
+        }
+    }
+    """
+
+    COMPONENT_CLASSES = {
+        "results-table--header",
+        "results-table--odd-row",
+        "results-table--null",
+        "results-table--cursor",
+    }
+
+    BINDINGS = [
+        Binding("up", "cursor_up", "Cursor up", show=False),
+        Binding("down", "cursor_down", "Cursor down", show=False),
+        Binding("left", "cursor_left", "Cursor left", show=False),
+        Binding("right", "cursor_right", "Cursor right", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("home", "cursor_first", "First row", show=False),
+        Binding("end", "cursor_last", "Last row", show=False),
+        Binding("s", "sort", "Sort"),
+        Binding("f", "filter", "Filter"),
+        Binding("slash", "search", "Search"),
+        Binding("n", "next_match", "Next match", show=False),
+        Binding("N", "previous_match", "Previous match", show=False),
+        Binding("escape", "clear_view", "Clear view", show=False),
+        Binding("enter", "inspect_cell", "Inspect"),
+    ]
+
+    # The next page is fetched once the viewport or cursor gets this many rows
+    # away from the last loaded row
+    FETCH_THRESHOLD = 20
+    # The number of rows from each page used to size the columns
+    SAMPLE_SIZE = 200
+    MAX_COLUMN_WIDTH = 40
+    CELL_PADDING = 1
+
+    @dataclass
+    class PageLoaded(Message):
+        rows: int
+        exhausted: bool
+        table: "ResultsTable"
+        # Whether the rest of the rows were left at the row limit
+        truncated: bool = False
+
+        @property
+        def control(self) -> "ResultsTable":
+            return self.table
+
+    @dataclass
+    class ViewChanged(Message):
+        # Rows shown, and rows loaded
+        rows: int
+        loaded: int
+        exhausted: bool
+        # The sort and filters, or "" when the rows are shown as loaded
+        description: str
+        table: "ResultsTable"
+        truncated: bool = False
+
+        @property
+        def control(self) -> "ResultsTable":
+            return self.table
+
+    @dataclass
+    class PromptRequested(Message):
+        # "filter" or "search"
+        kind: str
+        value: str
+        table: "ResultsTable"
+
+        @property
+        def control(self) -> "ResultsTable":
+            return self.table
+
+    @dataclass
+    class CellInspected(Message):
+        value: Any
+        column: str
+        table: "ResultsTable"
+
+        @property
+        def control(self) -> "ResultsTable":
+            return self.table
+
+    cursor_row: Reactive[int] = reactive(0)
+    cursor_column: Reactive[int] = reactive(0)
+
+    source: Optional[RowSource] = None
+    fetching: bool = False
+
+    def __init__(
+        self,
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+        disabled: bool = False,
+    ) -> None:
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.column_widths: list[int] = []
+        self.column_offsets: list[int] = []
+        self.numeric_columns: set[int] = set()
+        # The text last searched for, and the buffer rows containing it
+        self.search_text = ""
+        self._matches: Optional[tuple[str, bytes]] = None
+        self.filter_text = ""
+
+    def on_mount(self) -> None:
+        self.add_class("empty")
+
+    @property
+    def row_count(self) -> int:
+        return 0 if self.source is None else len(self.source)
+
+    @property
+    def body_height(self) -> int:
+        # The first line of the viewport is taken by the fixed header
+        return max(self.scrollable_content_region.height - 1, 0)
+
+    def load_stream(self, stream: "ResultStream | CachedStream") -> None:
+        self.load_source(RowSource(stream))
+
+    def load_source(self, source: RowSource) -> None:
+        self.close_source()
+        self.source = source
+        self.set_class(len(source.columns) == 0, "empty")
+        # The first page is already buffered by the stream, so it is added
+        # without a round-trip
+        source.fetch_page()
+        self.column_widths = [cell_len(column) for column in source.columns]
+        self.numeric_columns = set(range(len(source.columns)))
+        self.cursor_row = 0
+        self.cursor_column = 0
+        self._matches = None
+        self.filter_text = ""
+        self.scroll_to(0, 0, animate=False)
+        self.page_added(source, 0)
+
+    def clear(self) -> None:
+        self.close_source()
+        self.column_widths = []
+        self.column_offsets = []
+        self.virtual_size = Size(0, 0)
+        self.refresh()
+
+    def close_source(self) -> None:
+        if self.source is not None:
+            # Closing is deferred while a page is in flight so the cursor isn't
+            # closed under the worker; the stale page is discarded instead
+            if not self.fetching:
+                self.source.close()
+            self.source = None
+
+    def measure_columns(self, start: int) -> None:
+        sample = self.source.sample(self.SAMPLE_SIZE, start)
+        for index in range(len(self.column_widths)):
+            values = [row[index] for row in sample]
+            width = max(cell_len(format_cell(value)) for value in values) if values else 0
+            self.column_widths[index] = min(
+                max(self.column_widths[index], width),
+                self.MAX_COLUMN_WIDTH,
+            )
+            if not all(value is None or is_numeric(value) for value in values):
+                self.numeric_columns.discard(index)
+        self.update_column_offsets()
+
+    def update_column_offsets(self) -> None:
+        self.column_offsets = []
+        offset = 0
+        for width in self.column_widths:
+            self.column_offsets.append(offset)
+            offset += width + 2 * self.CELL_PADDING
+
+    def update_virtual_size(self) -> None:
+        width = sum(self.column_widths) + 2 * self.CELL_PADDING * len(self.column_widths)
+        self.virtual_size = Size(width, self.row_count + 1)
+
+    def fetch_page(self) -> None:
+        if self.source is None or self.source.exhausted or self.fetching:
+            return
+
+        self.fetching = True
+        self.fetch_rows(self.source)
+
+    @work(thread=True, group="fetch")
+    def fetch_rows(self, source: RowSource) -> None:
+        start = len(source)
+        try:
+            source.fetch_page()
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(self.fetch_failed, source, e)
+            return
+
+        self.app.call_from_thread(self.page_fetched, source, start)
+
+    def page_fetched(self, source: RowSource, start: int) -> None:
+        self.fetching = False
+        # The source was replaced while this page was being fetched
+        if source is not self.source:
+            source.close()
+            return
+
+        self.page_added(source, start)
+
+    def page_added(self, source: RowSource, start: int) -> None:
+        self.measure_columns(start)
+        self.update_virtual_size()
+        self.refresh()
+        self.post_message(
+            self.PageLoaded(
+                rows=len(source),
+                exhausted=source.exhausted,
+                table=self,
+                truncated=source.truncated,
+            )
+        )
+
+    def fetch_failed(self, source: RowSource, error: Exception) -> None:
+        self.fetching = False
+        source.close()
+        if source is self.source:
+            self.notify(
+                title="Fetch error",
+                message=str(error),
+                severity="error",
+                timeout=5,
+            )
+
+    def fetch_if_needed(self) -> None:
+        # A sorted or filtered view only covers the rows it was made from
+        if self.source is None or self.source.exhausted or self.source.view.active:
+            return
+
+        last_visible_row = self.scroll_offset.y + self.body_height
+        near_viewport_end = self.row_count - last_visible_row < self.FETCH_THRESHOLD
+        near_cursor_end = self.row_count - self.cursor_row < self.FETCH_THRESHOLD
+        if near_viewport_end or near_cursor_end:
+            self.fetch_page()
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        self.fetch_if_needed()
+
+    def on_resize(self, event: events.Resize) -> None:
+        self.fetch_if_needed()
+
+    def validate_cursor_row(self, row: int) -> int:
+        return max(0, min(row, self.row_count - 1))
+
+    def validate_cursor_column(self, column: int) -> int:
+        return max(0, min(column, len(self.column_widths) - 1))
+
+    def watch_cursor_row(self, row: int) -> None:
+        top = round(self.scroll_y)
+        if row < top:
+            self.scroll_to(y=row, animate=False)
+        elif row >= top + self.body_height:
+            self.scroll_to(y=row - self.body_height + 1, animate=False)
+        self.refresh()
+        self.fetch_if_needed()
+
+    def watch_cursor_column(self, column: int) -> None:
+        if not self.column_offsets:
+            return
+
+        start = self.column_offsets[column]
+        end = start + self.column_widths[column] + 2 * self.CELL_PADDING
+        left = round(self.scroll_x)
+        width = self.scrollable_content_region.width
+        if start < left:
+            self.scroll_to(x=start, animate=False)
+        elif end > left + width:
+            self.scroll_to(x=end - width, animate=False)
+        self.refresh()
+
+    def action_cursor_up(self) -> None:
+        self.cursor_row -= 1
+
+    def action_cursor_down(self) -> None:
+        self.cursor_row += 1
+
+    def action_cursor_left(self) -> None:
+        self.cursor_column -= 1
+
+    def action_cursor_right(self) -> None:
+        self.cursor_column += 1
+
+    def action_page_up(self) -> None:
+        self.cursor_row -= self.body_height
+
+    def action_page_down(self) -> None:
+        self.cursor_row += self.body_height
+
+    def action_cursor_first(self) -> None:
+        self.cursor_row = 0
+
+    def action_cursor_last(self) -> None:
+        self.cursor_row = self.row_count - 1
+
+    def on_click(self, event: events.Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None or self.source is None:
+            return
+
+        x = self.scroll_offset.x + offset.x
+        column = next(
+            (
+                index
+                for index in reversed(range(len(self.column_offsets)))
+                if self.column_offsets[index] <= x
+            ),
+            0,
+        )
+        if offset.y == 0:
+            self.cycle_sort(column)
+            return
+
+        row = self.scroll_offset.y + offset.y - 1
+        if row < self.row_count:
+            self.cursor_row = row
+            self.cursor_column = column
+
+    def render_line(self, y: int) -> Strip:
+        width = self.scrollable_content_region.width
+        if self.source is None or not self.column_widths:
+            return Strip.blank(width, self.rich_style)
+
+        scroll_x, scroll_y = self.scroll_offset
+        if y == 0:
+            strip = self.render_header()
+        else:
+            index = scroll_y + y - 1
+            if index >= self.row_count:
+                return Strip.blank(width, self.rich_style)
+            strip = self.render_row(index)
+
+        return strip.crop_extend(scroll_x, scroll_x + width, self.rich_style)
+
+    def render_header(self) -> Strip:
+        style = self.rich_style + self.get_component_rich_style("results-table--header")
+        sort = self.source.view.sort
+        labels = list(self.source.columns)
+        if sort is not None:
+            column, descending = sort
+            labels[column] = "{} {}".format(labels[column], "▼" if descending else "▲")
+        return Strip(
+            [
+                Segment(self.pad_cell(label, index, numeric=False), style)
+                for index, label in enumerate(labels)
+            ]
+        )
+
+    def action_sort(self) -> None:
+        if self.source is not None and self.column_widths:
+            self.cycle_sort(self.cursor_column)
+
+    def cycle_sort(self, column: int) -> None:
+        # Ascending, then descending, then as loaded
+        sort = self.source.view.sort
+        if sort is None or sort[0] != column:
+            sort = (column, False)
+        elif not sort[1]:
+            sort = (column, True)
+        else:
+            sort = None
+        self.update_view(sort, self.source.view.filters)
+
+    def action_filter(self) -> None:
+        if self.source is not None and self.column_widths:
+            self.post_message(self.PromptRequested("filter", self.filter_text, self))
+
+    def apply_filter(self, text: str) -> None:
+        if self.source is None:
+            return
+        try:
+            filters = parse_filter(text, self.source.columns)
+        except ValueError as e:
+            self.notify(title="Filter", message=str(e), severity="error", timeout=5)
+            return
+        self.filter_text = text
+        self.update_view(self.source.view.sort, filters)
+
+    def action_clear_view(self) -> None:
+        if self.source is not None and self.source.view.active:
+            self.filter_text = ""
+            self.update_view(None, [])
+
+    def update_view(self, sort: Optional[tuple[int, bool]], filters: list[Predicate]) -> None:
+        self.compute_view(self.source, sort, filters)
+
+    @work(thread=True, exclusive=True, group="view")
+    def compute_view(
+        self,
+        source: RowSource,
+        sort: Optional[tuple[int, bool]],
+        filters: list[Predicate],
+    ) -> None:
+        started = monotonic()
+        try:
+            rows = source.view.compute(sort, filters)
+        except ValueError as e:
+            self.app.call_from_thread(self.notify, title="Filter", message=str(e), severity="error", timeout=5)
+            return
+        except TypeError as e:
+            # An error in the worker would otherwise take the app down
+            log.error(e)
+            self.app.call_from_thread(
+                self.notify,
+                title="View",
+                message="Values of this result can't be compared: {}".format(e),
+                severity="error",
+                timeout=5,
+            )
+            return
+        log("Computed view of {} rows in {:.3f}s".format(len(source.buffer), monotonic() - started))
+        self.app.call_from_thread(self.view_computed, source, sort, filters, rows)
+
+    def view_computed(
+        self,
+        source: RowSource,
+        sort: Optional[tuple[int, bool]],
+        filters: list[Predicate],
+        rows,
+    ) -> None:
+        if source is not self.source:
+            return
+
+        source.view.apply(sort, filters, rows)
+        if sort is not None:
+            # Makes room for the direction shown in the header
+            column = sort[0]
+            width = min(cell_len(source.columns[column]) + 2, self.MAX_COLUMN_WIDTH)
+            if self.column_widths[column] < width:
+                self.column_widths[column] = width
+                self.update_column_offsets()
+        self.cursor_row = 0
+        self.scroll_to(y=0, animate=False)
+        self.update_virtual_size()
+        self.refresh()
+
+        description = []
+        if sort is not None:
+            description.append("sorted by {}{}".format(source.columns[sort[0]], " desc" if sort[1] else ""))
+        if filters:
+            description.append("where {}".format(" and ".join(f.describe(source.columns) for f in filters)))
+        self.post_message(
+            self.ViewChanged(
+                rows=len(source),
+                loaded=len(source.buffer),
+                exhausted=source.exhausted,
+                description=", ".join(description),
+                table=self,
+                truncated=source.truncated,
+            )
+        )
+        # Resumes fetching once the rows are shown as loaded again
+        self.fetch_if_needed()
+
+    def action_inspect_cell(self) -> None:
+        if self.source is None or not self.column_widths or self.row_count == 0:
+            return
+        value = self.source.row(self.cursor_row)[self.cursor_column]
+        self.post_message(self.CellInspected(value, self.source.columns[self.cursor_column], self))
+
+    def action_search(self) -> None:
+        if self.source is not None and self.column_widths:
+            self.post_message(self.PromptRequested("search", self.search_text, self))
+
+    def search(
+        self,
+        text: str,
+        start: Optional[int] = None,
+        backward: bool = False,
+        quiet: bool = False,
+    ) -> None:
+        # Moves the cursor to the next row containing `text`, from `start`
+        # or the cursor; rows are matched as they were loaded when searched
+        if self.source is None:
+            return
+        self.search_text = text
+        if not text:
+            return
+        self.search_rows(self.source, text, self.cursor_row if start is None else start, backward, quiet)
+
+    @work(thread=True, exclusive=True, group="search")
+    def search_rows(self, source: RowSource, text: str, start: int, backward: bool, quiet: bool) -> None:
+        matches = self._matches
+        if matches is None or matches[0] != text or len(matches[1]) < len(source.buffer):
+            matches = (text, source.view.search(text))
+        self.app.call_from_thread(self.rows_searched, source, matches, start, backward, quiet)
+
+    def rows_searched(
+        self,
+        source: RowSource,
+        matches: tuple[str, bytes],
+        start: int,
+        backward: bool,
+        quiet: bool,
+    ) -> None:
+        if source is not self.source or matches[0] != self.search_text:
+            return
+
+        self._matches = matches
+        row = source.view.find(matches[1], start, backward)
+        if row is None:
+            # Wraps around once
+            row = source.view.find(matches[1], len(source) - 1 if backward else 0, backward)
+        if row is None:
+            if not quiet:
+                self.notify("No loaded rows contain \"{}\".".format(matches[0]), timeout=3)
+            return
+
+        needle = matches[0].lower()
+        values = source.row(row)
+        self.cursor_row = row
+        self.cursor_column = next(
+            (i for i, value in enumerate(values) if value is not None and needle in str(value).lower()),
+            self.cursor_column,
+        )
+
+    def action_next_match(self) -> None:
+        self.search(self.search_text, self.cursor_row + 1)
+
+    def action_previous_match(self) -> None:
+        self.search(self.search_text, self.cursor_row - 1, backward=True)
+
+    def render_row(self, index: int) -> Strip:
+        row = self.source.row(index)
+        base_style = self.rich_style
+        if index % 2:
+            base_style += self.get_component_rich_style("results-table--odd-row")
+
+        null_style = self.get_component_rich_style("results-table--null")
+        cursor_style = self.get_component_rich_style("results-table--cursor")
+
+        segments = []
+        for column, value in enumerate(row):
+            style = base_style
+            if value is None:
+                style += null_style
+            if index == self.cursor_row and column == self.cursor_column:
+                style += cursor_style
+            text = self.pad_cell(format_cell(value), column, column in self.numeric_columns)
+            segments.append(Segment(text, style))
+        return Strip(segments)
+
+    def pad_cell(self, text: str, column: int, numeric: bool) -> str:
+        width = self.column_widths[column]
+        if numeric and cell_len(text) < width:
+            text = " " * (width - cell_len(text)) + text
+        elif cell_len(text) > width:
+            text = set_cell_size(text, width - 1) + "…"
+        padding = " " * self.CELL_PADDING
+        return padding + set_cell_size(text, width) + padding
@@ -0,0 +1,252 @@
+from rich.text import Text
+from textual import log, on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import DataTable, Footer, Label
+from textual.widgets.data_table import CellDoesNotExist, RowDoesNotExist
+from typing import TYPE_CHECKING, Callable, Optional
+
+from textgres.statements import SAMPLE_INTERVAL, StatementActivity, StatementsUnavailable
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+# The windows stepped through with w, in seconds
+STATEMENTS_WINDOWS = (60.0, 300.0, 900.0)
+DEFAULT_STATEMENTS_WINDOW = 300.0
+
+# The most statements shown at once, after sorting
+STATEMENTS_LIMIT = 100
+
+SPARK_CHARACTERS = "▁▂▃▄▅▆▇█"
+
+# Keys, labels and sort keys of the table's columns; the statement text and
+# its trend aren't sortable
+STATEMENTS_COLUMNS: tuple[tuple[str, str, Optional[Callable[[StatementActivity], float]]], ...] = (
+    ("total_time", "Total", lambda activity: activity.totals.total_time),
+    ("mean_time", "Mean", lambda activity: activity.totals.mean_time),
+    ("calls", "Calls", lambda activity: activity.totals.calls),
+    ("rows", "Rows", lambda activity: activity.totals.rows),
+    ("shared_hit", "Hit", lambda activity: activity.totals.shared_hit),
+    ("shared_read", "Read", lambda activity: activity.totals.shared_read),
+    ("temp_blocks", "Temp", lambda activity: activity.totals.temp_blocks),
+    ("trend", "Trend", None),
+    ("query", "Statement", None),
+)
+
+def sparkline(values: list[float]) -> str:
+    peak = max(values, default=0.0)
+    if peak <= 0:
+        return SPARK_CHARACTERS[0] * len(values)
+    top = len(SPARK_CHARACTERS) - 1
+    return "".join(SPARK_CHARACTERS[round(value / peak * top)] for value in values)
+
+def format_milliseconds(milliseconds: float) -> str:
+    if milliseconds >= 1000:
+        return "{:,.2f}s".format(milliseconds / 1000)
+    return "{:.2f}ms".format(milliseconds)
+
+def format_window(seconds: float) -> str:
+    return "{:g}m".format(seconds / 60)
+
+class StatementsModal(ModalScreen[None]):
+    """The statements which were busiest over a recent window.
+
+    pg_stat_statements is sampled every few seconds by the connection's
+    `StatementSampler`, and the table shows the sum of each statement's
+    deltas over the window rather than its totals since the last stats
+    reset. Opening the view starts the sampler, which keeps sampling in the
+    background once it is closed; the view only reads its window.
+    """
+
+    CSS = """
+    StatementsModal {
+        align: center middle;
+
+        & > Vertical {
+            background: $background;
+            padding: 1 2;
+            width: 95%;
+            height: 90%;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+            border-subtitle-color: $text-muted;
+            border-subtitle-background: $background;
+        }
+
+        & #statements-summary {
+            margin-bottom: 1;
+            color: $text-muted;
+        }
+
+        & DataTable {
+            height: 1fr;
+            background: transparent;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Close"),
+        Binding("s", "cycle_sort", "Sort"),
+        Binding("w", "cycle_window", "Window"),
+    ]
+
+    def __init__(self, connection: "Connection") -> None:
+        super().__init__()
+        self.connection = connection
+        self.sampler = connection.statements
+        self.window = DEFAULT_STATEMENTS_WINDOW
+        self.sort_column = "total_time"
+        self.activity: list[StatementActivity] = []
+
+    def compose(self) -> ComposeResult:
+        with Vertical() as vertical:
+            vertical.border_title = "Top statements of {}".format(self.connection.name)
+            yield Label("Taking the first sample…", id="statements-summary")
+            table = DataTable(cursor_type="row", zebra_stripes=True)
+            for key, label, _ in STATEMENTS_COLUMNS:
+                table.add_column(label, key=key)
+            yield table
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.update_subtitle()
+        self.set_interval(SAMPLE_INTERVAL, self.read_window)
+        self.start_sampling()
+
+    @work(thread=True, group="statements")
+    def start_sampling(self) -> None:
+        # Takes the baseline right away the first time, rather than waiting
+        # for the background sampler
+        self.sampler.start()
+        try:
+            if not self.sampler.has_baseline:
+                self.sampler.sample()
+        except Exception as e:
+            # StatementsUnavailable is expected on servers without the
+            # extension, and isn't logged
+            if not isinstance(e, StatementsUnavailable):
+                log.error(e)
+            self.app.call_from_thread(self.sampling_failed, e)
+            return
+
+        activity = self.sampler.window(self.window)
+        self.app.call_from_thread(self.show_activity, activity)
+
+    def read_window(self) -> None:
+        error = self.sampler.error
+        if error is not None:
+            self.sampling_failed(error)
+        else:
+            self.window_statements(self.window)
+
+    def sampling_failed(self, error: Exception) -> None:
+        self.query_one("#statements-summary", Label).update(
+            Text("Sampling failed: {}".format(str(error).strip()), style="red")
+        )
+
+    def show_activity(self, activity: list[StatementActivity]) -> None:
+        self.activity = activity
+        if not self.is_attached:
+            return
+
+        samples = len(self.sampler.samples)
+        if samples == 0:
+            summary = "Waiting for the next sample to compute deltas…"
+        else:
+            summary = "{} statements called in the last {} · {} samples".format(
+                len(activity),
+                format_window(self.window),
+                samples,
+            )
+        self.query_one("#statements-summary", Label).update(summary)
+        self.refresh_table()
+
+    def refresh_table(self) -> None:
+        # The table is small and re-sorted on every sample, so it is rebuilt
+        # rather than updated in place; the cursor follows its statement
+        table = self.query_one(DataTable)
+        selected = self.selected_key
+        sort_key = next(key for column, _, key in STATEMENTS_COLUMNS if column == self.sort_column)
+        ranked = sorted(self.activity, key=sort_key, reverse=True)[:STATEMENTS_LIMIT]
+
+        table.clear()
+        for activity in ranked:
+            table.add_row(*self.get_cells(activity), key=str(activity.key))
+        if selected is not None:
+            try:
+                table.move_cursor(row=table.get_row_index(selected))
+            except RowDoesNotExist:
+                pass
+
+    def get_cells(self, activity: StatementActivity) -> tuple:
+        totals = activity.totals
+        return (
+            format_milliseconds(totals.total_time),
+            format_milliseconds(totals.mean_time),
+            "{:,}".format(totals.calls),
+            "{:,}".format(totals.rows),
+            "{:,}".format(totals.shared_hit),
+            "{:,}".format(totals.shared_read),
+            "{:,}".format(totals.temp_blocks),
+            Text(sparkline(activity.series), style="green"),
+            # Statements are shown on a single line
+            Text(" ".join(activity.query.split()), no_wrap=True, overflow="ellipsis"),
+        )
+
+    def update_subtitle(self) -> None:
+        label = next(label for key, label, _ in STATEMENTS_COLUMNS if key == self.sort_column)
+        self.query_one(Vertical).border_subtitle = "last {} by {}, sampled every {:g}s".format(
+            format_window(self.window),
+            label.lower(),
+            SAMPLE_INTERVAL,
+        )
+
+    @property
+    def selected_key(self) -> Optional[str]:
+        table = self.query_one(DataTable)
+        if table.row_count == 0:
+            return None
+        try:
+            row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        except (CellDoesNotExist, RowDoesNotExist):
+            return None
+        return row_key.value
+
+    @on(DataTable.HeaderSelected)
+    def on_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        if event.column_key.value in self.sortable_columns:
+            self.sort_by(event.column_key.value)
+
+    def action_cycle_sort(self) -> None:
+        columns = self.sortable_columns
+        self.sort_by(columns[(columns.index(self.sort_column) + 1) % len(columns)])
+
+    def sort_by(self, column: str) -> None:
+        self.sort_column = column
+        self.update_subtitle()
+        self.refresh_table()
+
+    @property
+    def sortable_columns(self) -> list[str]:
+        return [key for key, _, sort_key in STATEMENTS_COLUMNS if sort_key is not None]
+
+    def action_cycle_window(self) -> None:
+        index = STATEMENTS_WINDOWS.index(self.window)
+        self.window = STATEMENTS_WINDOWS[(index + 1) % len(STATEMENTS_WINDOWS)]
+        self.update_subtitle()
+        # The samples are already held, so only the window is recomputed
+        self.window_statements(self.window)
+
+    @work(thread=True, exclusive=True, group="statements-window")
+    def window_statements(self, window: float) -> None:
+        activity = self.sampler.window(window)
+        self.app.call_from_thread(self.show_activity, activity)
+
+    def action_close_screen(self) -> None:
+        self.dismiss(None)
@@ -0,0 +1,241 @@
+import os
+from textual import log, on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Horizontal, VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import Button, Checkbox, Footer, Input, Label, ProgressBar, Select
+from textual.worker import get_current_worker
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+from textgres.transfer import (
+    COPY_FORMATS,
+    CopyOptions,
+    TransferCancelled,
+    export_to_file,
+    import_from_file,
+)
+
+if TYPE_CHECKING:
+    from textgres.connection import Connection
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} TB".format(size)
+
+class TransferModal(ModalScreen[Optional[str]]):
+    """Exports to or imports from a local file with COPY.
+
+    The transfer runs in a worker while the modal shows its progress, and
+    can be cancelled with escape. Dismisses with a summary of the transfer,
+    or None when closed before starting.
+    """
+
+    CSS = """
+    TransferModal {
+        align: center middle;
+
+        & > VerticalScroll {
+            background: $background;
+            padding: 1 2;
+            width: 50%;
+            height: 16;
+            border: wide $background-lighten-2;
+            border-title-color: $text;
+            border-title-background: $background;
+            border-title-style: bold;
+        }
+
+        & Input {
+            margin-bottom: 1;
+            height: 1;
+            width: 1fr;
+        }
+
+        & .options {
+            height: 1;
+            margin-bottom: 1;
+
+            & Select {
+                width: 16;
+                margin-right: 2;
+            }
+
+            & Checkbox {
+                height: 1;
+                border: none;
+                padding: 0;
+                margin-right: 2;
+                background: transparent;
+            }
+        }
+
+        & ProgressBar {
+            margin-bottom: 1;
+        }
+
+        & Button {
+            width: 1fr;
+            dock: bottom;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close_screen", "Cancel"),
+    ]
+
+    def __init__(
+        self,
+        connection: "Connection",
+        source: str,
+        label: str,
+        importing: bool = False,
+        path: str = "",
+    ) -> None:
+        super().__init__()
+        self.connection = connection
+        # The table or query (in parentheses) to copy
+        self.source = source
+        self.label = label
+        self.importing = importing
+        self.path = path
+        self.running = False
+
+    def compose(self) -> ComposeResult:
+        with VerticalScroll() as vs:
+            vs.can_focus = False
+            vs.border_title = (
+                "Import into {}".format(self.label)
+                if self.importing
+                else "Export {}".format(self.label)
+            )
+
+            yield Label("File")
+            yield Input(self.path, placeholder="Path of the file", id="path-input")
+
+            with Horizontal(classes="options"):
+                yield Select(
+                    [(format.upper(), format) for format in COPY_FORMATS],
+                    value="csv",
+                    allow_blank=False,
+                    id="format-select",
+                )
+                yield Checkbox("Header", value=True, id="header-checkbox")
+                yield Checkbox("Gzip", value=self.path.endswith(".gz"), id="gzip-checkbox")
+
+            yield ProgressBar(show_eta=False, classes="hidden", id="progress-bar")
+            yield Label("", id="progress-label")
+            yield Button.success("Import" if self.importing else "Export", id="start-button")
+
+        yield Footer()
+
+    @on(Input.Changed, selector="#path-input")
+    def on_path_changed(self, event: Input.Changed) -> None:
+        if event.value.endswith(".gz"):
+            self.query_one("#gzip-checkbox", Checkbox).value = True
+
+    def action_close_screen(self) -> None:
+        if self.running:
+            self.progress_label.update("Cancelling…")
+            self.workers.cancel_group(self, "transfer")
+        else:
+            self.dismiss(None)
+
+    @on(Input.Submitted)
+    @on(Button.Pressed, selector="#start-button")
+    def on_start(self) -> None:
+        if self.running:
+            return
+
+        path = os.path.expanduser(self.query_one("#path-input", Input).value.strip())
+        if not path:
+            self.progress_label.update("Enter the path of the file.")
+            return
+        if self.importing and not os.path.isfile(path):
+            self.progress_label.update("No such file.")
+            return
+
+        options = CopyOptions(
+            format=self.query_one("#format-select", Select).value,
+            header=self.query_one("#header-checkbox", Checkbox).value,
+            compress=self.query_one("#gzip-checkbox", Checkbox).value,
+        )
+
+        self.running = True
+        for widget in self.query("Input, Select, Checkbox, Button"):
+            widget.disabled = True
+        progress_bar = self.query_one(ProgressBar)
+        progress_bar.remove_class("hidden")
+        # The size of an export isn't known up front
+        progress_bar.update(total=os.path.getsize(path) if self.importing else None, progress=0)
+        self.started = monotonic()
+        self.run_transfer(path, options)
+
+    @work(thread=True, exclusive=True, group="transfer")
+    def run_transfer(self, path: str, options: CopyOptions) -> None:
+        worker = get_current_worker()
+
+        def progress(size: int) -> None:
+            self.app.call_from_thread(self.update_progress, size)
+
+        transfer = import_from_file if self.importing else export_to_file
+        try:
+            rows = transfer(
+                self.connection,
+                self.source,
+                path,
+                options,
+                progress,
+                lambda: worker.is_cancelled,
+            )
+        except TransferCancelled:
+            self.app.call_from_thread(self.dismiss, "Cancelled; nothing was {}.".format(
+                "imported" if self.importing else "exported"
+            ))
+            return
+        except Exception as e:
+            log.error(e)
+            self.app.call_from_thread(self.transfer_failed, e)
+            return
+
+        elapsed = monotonic() - self.started
+        self.app.call_from_thread(
+            self.dismiss,
+            "{} {} rows {} \"{}\" in {:.2f}s.".format(
+                "Imported" if self.importing else "Exported",
+                rows,
+                "from" if self.importing else "to",
+                path,
+                elapsed,
+            ),
+        )
+
+    def update_progress(self, size: int) -> None:
+        progress_bar = self.query_one(ProgressBar)
+        if progress_bar.total is not None:
+            progress_bar.update(progress=size)
+
+        elapsed = monotonic() - self.started
+        self.progress_label.update(
+            "{} {} ({}/s)".format(
+                format_bytes(size),
+                "read" if self.importing else "received",
+                format_bytes(size / elapsed if elapsed else 0),
+            )
+        )
+
+    def transfer_failed(self, error: Exception) -> None:
+        self.running = False
+        for widget in self.query("Input, Select, Checkbox, Button"):
+            widget.disabled = False
+        self.query_one(ProgressBar).add_class("hidden")
+        self.progress_label.update(str(error).strip() or "Transfer failed.")
+
+    @property
+    def progress_label(self) -> Label:
+        return self.query_one("#progress-label", Label)
@@ -0,0 +1,41 @@
+from textgres.activity import Backend, compute_blocking
+
+def backend(pid: int, *blocked_by: int) -> Backend:
+    return Backend(
+        pid=pid,
+        user=None,
+        database=None,
+        application=None,
+        client=None,
+        backend_type=None,
+        state="active",
+        wait_event_type="Lock" if blocked_by else None,
+        wait_event=None,
+        xact_age=None,
+        query_age=None,
+        query=None,
+        blocked_by=list(blocked_by),
+    )
+
+def tree(*backends: Backend) -> list[tuple[int, int]]:
+    ordered = compute_blocking({b.pid: b for b in backends})
+    return [(b.pid, b.depth) for b in ordered.values()]
+
+def test_waiters_follow_their_blockers_recursively():
+    backends = [backend(1, 30), backend(2), backend(10, 30), backend(20), backend(30, 20), backend(40, 1)]
+    assert tree(*backends) == [(2, 0), (20, 0), (30, 1), (1, 2), (40, 3), (10, 2)]
+
+    counts = {b.pid: b.blocking for b in backends}
+    assert counts == {1: 1, 2: 0, 10: 0, 20: 4, 30: 3, 40: 0}
+    assert backends[3].root_blocker and not backends[4].root_blocker
+
+def test_backends_waiting_on_several_are_shown_once():
+    assert tree(backend(1), backend(2), backend(3, 1, 2)) == [(1, 0), (3, 1), (2, 0)]
+
+def test_lock_cycles_are_shown_from_their_lowest_pid():
+    backends = [backend(5, 7), backend(7, 5), backend(9, 7)]
+    assert tree(*backends) == [(5, 0), (7, 1), (9, 2)]
+    assert [b.blocking for b in backends] == [2, 2, 0]
+
+def test_blockers_outside_the_snapshot_are_roots():
+    assert tree(backend(3, 99), backend(4, 3)) == [(3, 0), (4, 1)]
@@ -0,0 +1,121 @@
+from textgres.catalog import (
+    CHANGED_COLUMNS_QUERY,
+    FINGERPRINT_QUERY,
+    RELATION_DETAILS_QUERY,
+    SCHEMA_OBJECTS_QUERY,
+    SCHEMAS_QUERY,
+    SNAPSHOT_COLUMNS_QUERY,
+    SNAPSHOT_QUERY,
+    Catalog,
+    CatalogSnapshot,
+)
+from textgres.connection import Connection
+
+class FakeCatalog(Catalog):
+    """Answers the snapshot queries from `rows` and `columns`, recording
+    each query run."""
+
+    def __init__(self) -> None:
+        super().__init__(Connection(name="test"))
+        self.fingerprint_value = "f1"
+        self.rows = [
+            ("schema", 10, None, "public", None, None),
+            ("relation", 100, "public", "users", "r", "5:20"),
+            ("relation", 101, "public", "orders", "r", "6:30"),
+            ("function", 200, "public", "now_utc", None, ""),
+        ]
+        self.columns = {
+            100: [("id", "integer"), ("name", "text")],
+            101: [("id", "integer")],
+        }
+        self.queries = []
+
+    def fetch(self, query, params=None):
+        self.queries.append((query, params))
+        if query == FINGERPRINT_QUERY:
+            return [(self.fingerprint_value,)]
+        if query == SNAPSHOT_QUERY:
+            return list(self.rows)
+        relations = params["relations"] if query == CHANGED_COLUMNS_QUERY else sorted(self.columns)
+        assert query in (SNAPSHOT_COLUMNS_QUERY, CHANGED_COLUMNS_QUERY)
+        return [(oid, name, type) for oid in relations for name, type in self.columns[oid]]
+
+def test_snapshot_round_trips_through_json():
+    catalog = FakeCatalog()
+    snapshot = catalog.refresh_snapshot()
+    assert CatalogSnapshot.from_json(snapshot.to_json()) == snapshot
+    assert snapshot.columns[100] == [("id", "integer"), ("name", "text")]
+
+def test_unchanged_fingerprint_skips_the_reload():
+    catalog = FakeCatalog()
+    catalog.refresh_snapshot()
+    catalog.queries.clear()
+
+    catalog.refresh_snapshot()
+    assert [query for query, _ in catalog.queries] == [FINGERPRINT_QUERY]
+
+def test_reload_only_reads_the_columns_of_changed_relations():
+    catalog = FakeCatalog()
+    catalog.refresh_snapshot()
+    catalog.queries.clear()
+
+    # A column of orders was renamed: its relation row is untouched, but the
+    # xmins of its columns changed
+    catalog.fingerprint_value = "f2"
+    catalog.rows[2] = ("relation", 101, "public", "orders", "r", "6:31")
+    catalog.columns[101] = [("order_id", "integer")]
+    snapshot = catalog.refresh_snapshot()
+
+    assert catalog.queries[-1] == (CHANGED_COLUMNS_QUERY, {"relations": [101]})
+    assert snapshot.columns[101] == [("order_id", "integer")]
+    assert snapshot.columns[100] == [("id", "integer"), ("name", "text")]
+    assert catalog.fingerprint == "f2"
+    assert "order_id" in [completion.text for completion in catalog.completion_index.lookup("ord")]
+
+def test_schema_tree_is_served_from_the_snapshot():
+    catalog = FakeCatalog()
+    catalog.refresh_snapshot()
+    catalog.restore_snapshot = lambda: True
+
+    [schema] = catalog.schemas()
+    objects = catalog.objects(schema)
+    assert [relation.name for relation in objects.tables] == ["orders", "users"]
+    assert [function.name for function in objects.functions] == ["now_utc"]
+
+class BrowsedCatalog(Catalog):
+    """Answers the queries of the schema tree, counting each query run."""
+
+    def __init__(self) -> None:
+        super().__init__(Connection(name="test"))
+        self.queries = []
+
+    def fetch(self, query, params=None):
+        self.queries.append(query)
+        if query == SCHEMAS_QUERY:
+            return [(10, "public")]
+        if query == SCHEMA_OBJECTS_QUERY:
+            return [(100, "users", "r", None), (102, "active_users", "v", None), (200, "now_utc", "function", "")]
+        assert query == RELATION_DETAILS_QUERY
+        return [("column", "id", "integer", True, None), ("index", "users_pkey", "btree (id)", True, None)]
+
+def test_each_level_is_loaded_once_when_expanded():
+    catalog = BrowsedCatalog()
+    [schema] = catalog.schemas()
+    objects = catalog.objects(schema)
+    assert [relation.name for relation in objects.tables] == ["users"]
+    assert [relation.name for relation in objects.views] == ["active_users"]
+    assert [function.name for function in objects.functions] == ["now_utc"]
+
+    details = catalog.details(objects.tables[0])
+    assert [(column.name, column.type) for column in details.columns] == [("id", "integer")]
+    assert [index.name for index in details.indexes] == ["users_pkey"]
+
+    catalog.schemas()
+    catalog.objects(schema)
+    catalog.details(objects.tables[0])
+    assert catalog.queries == [SCHEMAS_QUERY, SCHEMA_OBJECTS_QUERY, RELATION_DETAILS_QUERY]
+
+    catalog.invalidate()
+    catalog.schemas()
+    assert catalog.queries[-1] == SCHEMAS_QUERY
+    assert len(catalog.queries) == 4
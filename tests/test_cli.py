@@ -0,0 +1,44 @@
+import pytest
+from click.testing import CliRunner
+
+from textgres.__main__ import cli
+from textgres.store import ConnectionStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ConnectionStore, "_default", None)
+    store = ConnectionStore.default()
+    yield store
+    store.close()
+
+def test_run_reports_a_failed_connection_without_a_traceback(store):
+    # Nothing listens on port 1
+    store.save({"name": "down", "host": "127.0.0.1", "port": 1, "database": "postgres", "username": "postgres",
+                "password": "", "statement_timeout": 0, "lock_timeout": 0, "result_cache_ttl": 0})
+
+    result = CliRunner().invoke(cli, ["run", "down", "-"], input="select 1")
+    assert result.exit_code == 1
+    assert result.output.startswith("Error: ")
+    assert "Traceback" not in result.output
+    assert store._conn is None
+
+def test_run_rejects_an_unknown_connection(store):
+    result = CliRunner().invoke(cli, ["run", "missing", "-"], input="select 1")
+    assert result.exit_code == 2
+    assert "no saved connection named" in result.output
+
+def test_export_leaves_passwords_out_unless_asked_for(store):
+    store.save({"name": "local", "host": "localhost", "port": 5432, "database": "postgres", "username": "postgres",
+                "password": "secret", "statement_timeout": 0, "lock_timeout": 0, "result_cache_ttl": 0})
+
+    result = CliRunner().invoke(cli, ["export", "--format", "pgpass", "-"])
+    assert result.output == "localhost:5432:postgres:postgres:\n"
+    result = CliRunner().invoke(cli, ["export", "--format", "pgpass", "--passwords", "-"])
+    assert result.output == "localhost:5432:postgres:postgres:secret\n"
+
+def test_import_rejects_duplicate_names(store):
+    result = CliRunner().invoke(cli, ["import", "--format", "yaml", "-"], input="- name: a\n- name: a\n")
+    assert result.exit_code == 1
+    assert "more than one connection is named 'a'" in result.output
@@ -0,0 +1,52 @@
+from textgres.catalog import CatalogSnapshot, Function, Schema, SnapshotRelation
+from textgres.completion import Completion, CompletionIndex, quote_identifier
+
+def snapshot() -> CatalogSnapshot:
+    return CatalogSnapshot(
+        schemas=[Schema(10, "public"), Schema(11, "Sales")],
+        relations={
+            100: SnapshotRelation("public", "users", "r", "1"),
+            101: SnapshotRelation("Sales", "Orders", "r", "1"),
+            102: SnapshotRelation("public", "active_users", "v", "1"),
+        },
+        columns={
+            100: [("id", "integer"), ("user_name", "text")],
+            101: [("id", "bigint")],
+        },
+        functions=[Function(200, "public", "upper_snake", "text")],
+    )
+
+def test_quote_identifier():
+    assert quote_identifier("users") == "users"
+    assert quote_identifier("Orders") == '"Orders"'
+    assert quote_identifier('say "hi"') == '"say ""hi"""'
+
+def test_lookup_matches_prefixes_case_insensitively():
+    index = CompletionIndex.from_snapshot(snapshot())
+    assert index.lookup("US") == [
+        Completion("user_name", "column"),
+        Completion("users", "table", "public"),
+        Completion("users.id", "column", "integer"),
+        Completion("users.user_name", "column", "text"),
+    ]
+    assert index.lookup("up") == [Completion("upper_snake", "function")]
+    assert index.lookup("active") == [Completion("active_users", "view", "public")]
+    assert index.lookup("missing") == []
+
+def test_qualified_names_are_quoted():
+    index = CompletionIndex.from_snapshot(snapshot())
+    assert index.lookup('"sales".') == [Completion('"Sales"."Orders"', "table", "Sales")]
+    # Unquoted, the name would be folded to lower case and not resolve
+    assert index.lookup("sales.") == []
+    assert index.lookup('"orders".') == [Completion('"Orders".id', "column", "bigint")]
+    assert index.lookup("sa") == [Completion('"Sales"', "schema")]
+
+def test_bare_columns_shared_by_relations_are_one_entry():
+    index = CompletionIndex.from_snapshot(snapshot())
+    assert index.lookup("id") == [Completion("id", "column")]
+
+def test_lookup_is_limited():
+    index = CompletionIndex(("name{:03}".format(i), Completion("name{:03}".format(i), "column")) for i in range(200))
+    assert len(index) == 200
+    assert [c.text for c in index.lookup("name", limit=3)] == ["name000", "name001", "name002"]
+    assert len(index.lookup("")) == 50
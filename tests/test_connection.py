@@ -0,0 +1,153 @@
+from collections import namedtuple
+
+import pytest
+
+from textgres.connection import Connection, ResultStream
+from textgres.large_values import Preview
+
+Column = namedtuple("Column", "name type_code")
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.connection = conn
+        self.name = name
+        self.itersize = 0
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, query):
+        self.connection.executed.append(query)
+        if self.connection.error is not None:
+            raise self.connection.error
+        if "LIMIT 0" in query:
+            self.description = self.connection.described
+            self._rows = []
+        else:
+            self.description = self.connection.description
+            self._rows = list(self.connection.rows)
+        self.rowcount = len(self._rows)
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+class FakeConn:
+    closed = False
+
+    def __init__(self, described=(), description=(), rows=(), error=None):
+        self.described = list(described)
+        self.description = list(description)
+        self.rows = list(rows)
+        self.error = error
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.borrowed = 0
+
+    def getconn(self):
+        self.borrowed += 1
+        return self.conn
+
+    def putconn(self, conn):
+        self.borrowed -= 1
+
+    def closeall(self):
+        self.closed = True
+
+def connect(conn) -> tuple[Connection, FakePool]:
+    connection = Connection(id=1, name="test")
+    pool = FakePool(conn)
+    connection._pool = pool
+    connection._opened_with = connection.parameters
+    return connection, pool
+
+def test_stream_returns_rows_and_the_connection():
+    conn = FakeConn(description=[Column("id", 23)], rows=[(1,), (2,)])
+    connection, pool = connect(conn)
+
+    stream = connection.stream("select id from t")
+    assert isinstance(stream, ResultStream)
+    assert stream.columns == ["id"]
+    assert stream.fetch() == [(1,), (2,)]
+    assert stream.closed
+    assert pool.borrowed == 0
+
+def test_stream_previews_large_values():
+    conn = FakeConn(
+        described=[Column("id", 23), Column("body", 25)],
+        description=[Column("id", 23), Column("body", 25), Column("size", 23)],
+        rows=[(1, "x" * 256, 1000), (2, "short", 5)],
+    )
+    connection, pool = connect(conn)
+
+    stream = connection.stream("select * from docs", previews=True)
+    assert stream.columns == ["id", "body"]
+    assert stream.previews == {1: "text"}
+    assert "left(" in conn.executed[-1]
+
+    first, second = stream.fetch()
+    assert first[1] == Preview("x" * 256, 1000, "text", 0, "body")
+    assert second == (2, "short")
+    assert stream.truncated
+    assert pool.borrowed == 0
+
+def test_stream_is_only_truncated_once_a_value_was_cut_short():
+    conn = FakeConn(
+        described=[Column("body", 25)],
+        description=[Column("body", 25), Column("size", 23)],
+        rows=[("short", 5), (None, None)],
+    )
+    connection, _ = connect(conn)
+
+    stream = connection.stream("select body from docs", previews=True)
+    assert stream.previews == {0: "text"}
+    assert stream.fetch() == [("short",), (None,)]
+    assert not stream.truncated
+
+def test_stream_releases_the_connection_when_it_fails():
+    conn = FakeConn(error=RuntimeError("broken"))
+    connection, pool = connect(conn)
+
+    with pytest.raises(RuntimeError):
+        connection.stream("select 1")
+    assert pool.borrowed == 0
+
+def test_reconfigure_keeps_the_pool_when_nothing_it_uses_changed():
+    connection, pool = connect(FakeConn())
+    catalog = connection.catalog
+
+    connection.name = "renamed"
+    connection.reconfigure()
+    assert connection._pool is pool
+    assert connection.catalog is catalog
+
+def test_reconfigure_drops_the_pool_and_catalog_of_an_edited_connection():
+    connection, pool = connect(FakeConn())
+    catalog = connection.catalog
+
+    connection.database = "other"
+    connection.reconfigure()
+    assert pool.closed
+    assert not connection.connected
+    assert connection.catalog is not catalog
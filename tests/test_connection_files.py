@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from textgres.connection import Connection
+from textgres.connection_files import guess_format, read_connections, write_connections
+
+def connections() -> list[Connection]:
+    return [
+        Connection(name="local", password="secret"),
+        Connection(name="reports", host="db.example.com", port=6432, database="sales", username="analyst",
+                   password="p:ss\\word"),
+    ]
+
+def round_trip(format: str, passwords: bool = True) -> list[Connection]:
+    file = io.StringIO()
+    write_connections(connections(), file, format, passwords=passwords)
+    file.seek(0)
+    return read_connections(file, format)
+
+def test_yaml_round_trips():
+    read = round_trip("yaml")
+    assert [c.values for c in read] == [{**c.values, "id": None} for c in connections()]
+
+def test_service_files_round_trip():
+    read = round_trip("service")
+    assert [(c.name, c.host, c.port, c.database, c.username, c.password) for c in read] == [
+        ("local", "localhost", 5432, "postgres", "postgres", "secret"),
+        ("reports", "db.example.com", 6432, "sales", "analyst", "p:ss\\word"),
+    ]
+
+def test_pgpass_files_round_trip():
+    read = round_trip("pgpass")
+    assert [(c.name, c.password) for c in read] == [
+        ("postgres@localhost:5432/postgres", "secret"),
+        ("analyst@db.example.com:6432/sales", "p:ss\\word"),
+    ]
+
+@pytest.mark.parametrize("format", ["yaml", "pgpass", "service"])
+def test_passwords_are_only_written_when_asked_for(format):
+    file = io.StringIO()
+    write_connections(connections(), file, format)
+    assert "secret" not in file.getvalue()
+    assert all(c.password == "" for c in round_trip(format, passwords=False))
+
+def test_pgpass_wildcard_entries_are_skipped():
+    text = "*:*:*:postgres:secret\nlocalhost:*:*:postgres:secret\n"
+    read = read_connections(io.StringIO(text), "pgpass")
+    assert [(c.host, c.port, c.database) for c in read] == [("localhost", 5432, "postgres")]
+
+@pytest.mark.parametrize("format, text", [
+    ("yaml", "connections:\n  - name: ok\n  - just a string\n"),
+    ("yaml", "- name: ok\n- port: not a number\n"),
+    ("yaml", "connections: 1"),
+    ("yaml", "- [unclosed"),
+    ("pgpass", "localhost:5432:postgres\n"),
+    ("service", "[local]\nport = not a number\n"),
+    ("service", "no section\n"),
+    ("csv", ""),
+])
+def test_malformed_files_raise_value_errors(format, text):
+    with pytest.raises(ValueError):
+        read_connections(io.StringIO(text), format)
+
+def test_yaml_errors_name_the_connection():
+    with pytest.raises(ValueError, match="connection 2 "):
+        read_connections(io.StringIO("- name: ok\n- 1\n"), "yaml")
+
+def test_guess_format():
+    assert guess_format("backup/connections.yml") == "yaml"
+    assert guess_format("/home/me/.pgpass") == "pgpass"
+    assert guess_format("pg_service.conf") == "service"
+    assert guess_format("connections.txt") is None
@@ -0,0 +1,114 @@
+import io
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+
+from textgres.export import ColumnarReader, ColumnarWriter, CsvWriter, JsonLinesWriter
+from textgres.result_buffer import ColumnarBuffer
+
+COLUMNS = ["i", "f", "b", "d", "ts", "tz", "t", "o", "empty"]
+
+ROWS = [
+    (1, 0.5, True, date(2024, 2, 29), datetime(2024, 2, 29, 1, 2, 3, 4),
+     datetime(2024, 2, 29, 1, tzinfo=timezone(timedelta(hours=-5))), "ünïcode", {"a": 1}, None),
+    (None, None, None, None, None, None, None, None, None),
+    (-7, -1e300, False, date(1970, 1, 1), datetime(1900, 1, 1),
+     datetime(2000, 1, 1, tzinfo=timezone(timedelta(hours=-5))), "", [1, "x"], None),
+]
+
+def write_columnar(batches) -> io.BytesIO:
+    file = io.BytesIO()
+    writer = ColumnarWriter(file)
+    writer.write_header(COLUMNS)
+    for rows in batches:
+        writer.write_rows(rows)
+    writer.close()
+    file.seek(0)
+    return file
+
+def test_columnar_round_trips_rows_across_batches():
+    reader = ColumnarReader(write_columnar([ROWS[:2], [], ROWS[2:]]))
+    assert reader.columns == COLUMNS
+    assert list(reader) == ROWS
+
+def test_columnar_round_trips_a_buffer():
+    buffer = ColumnarBuffer(COLUMNS)
+    buffer.extend(ROWS)
+    file = io.BytesIO()
+    writer = ColumnarWriter(file)
+    writer.write_header(COLUMNS)
+    writer.write_buffer(buffer)
+    writer.close()
+    file.seek(0)
+
+    read = ColumnarReader(file).read_buffer()
+    assert len(read) == len(buffer)
+    assert [read.row(i) for i in range(len(read))] == ROWS
+    assert [type(column) for column in read.columns] == [type(column) for column in buffer.columns]
+
+class Point:
+    def __str__(self):
+        return "(1,2)"
+
+def write_values(values, exact=False) -> io.BytesIO:
+    file = io.BytesIO()
+    writer = ColumnarWriter(file, exact=exact)
+    writer.write_header(["v"])
+    writer.write_rows([(value,) for value in values])
+    writer.close()
+    file.seek(0)
+    return file
+
+def test_columnar_keeps_the_types_of_object_values():
+    values = [
+        Decimal("1.10"),
+        UUID("12345678-1234-5678-1234-567812345678"),
+        time(12, 30, 1, 5, tzinfo=timezone.utc),
+        timedelta(days=-1, seconds=5, microseconds=7),
+        b"\x00\xff",
+        memoryview(b"\x01"),
+        {"a": [1, Decimal("2.5"), None, {"b": "c"}], "d": {"l": 1}},
+        [[1, 2], [3, 4]],
+        "text",
+        None,
+    ]
+    assert list(ColumnarReader(write_values(values))) == [(value,) for value in values]
+
+def test_columnar_writes_other_values_as_their_text_unless_exact():
+    assert list(ColumnarReader(write_values([Point()]))) == [("(1,2)",)]
+    with pytest.raises(TypeError):
+        write_values([Decimal(1), [Point()]], exact=True)
+
+def test_columnar_reader_rejects_other_files():
+    with pytest.raises(ValueError):
+        ColumnarReader(io.BytesIO(b"i,f\n1,2\n"))
+
+    truncated = write_columnar([ROWS]).getvalue()[:-20]
+    with pytest.raises(ValueError):
+        list(ColumnarReader(io.BytesIO(truncated)))
+
+def test_text_writers():
+    rows = [(1, True, None, b"\x01", {"a": 1})]
+    columns = ["i", "b", "n", "bytes", "json"]
+
+    file = io.StringIO()
+    writer = CsvWriter(file)
+    writer.write_header(columns)
+    writer.write_rows(rows)
+    assert file.getvalue() == 'i,b,n,bytes,json\n1,t,,\\x01,"{""a"": 1}"\n'
+
+    file = io.StringIO()
+    writer = JsonLinesWriter(file)
+    writer.write_header(columns)
+    writer.write_rows(rows)
+    assert json.loads(file.getvalue()) == {"i": 1, "b": True, "n": None, "bytes": "\\x01", "json": {"a": 1}}
+
+def test_json_lines_keep_columns_sharing_a_name():
+    file = io.StringIO()
+    writer = JsonLinesWriter(file)
+    writer.write_header(["id", "id", "id_2", "id"])
+    writer.write_rows([(1, 2, 3, 4)])
+    assert json.loads(file.getvalue()) == {"id": 1, "id_3": 2, "id_2": 3, "id_4": 4}
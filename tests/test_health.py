@@ -0,0 +1,67 @@
+from textgres.health import (
+    BLOCK_SIZE_QUERY,
+    SCHEMA_INDEXES_HEALTH_QUERY,
+    SCHEMA_TABLES_HEALTH_QUERY,
+    estimate_bloat,
+    load_schema_health,
+)
+
+PAGE = 8192
+
+TABLES = [
+    # oid, name, total, table, indexes, toast, tuples, pages, width, fillfactor, live, dead, vacuum, analyze
+    (100, "orders", 30 * PAGE, 15 * PAGE, 15 * PAGE, 0, 1200.0, 15, 36, 100, 1000, 300, None, None),
+    (101, "fresh", PAGE, PAGE, 0, 0, -1.0, 1, None, 100, None, None, None, None),
+]
+
+INDEXES = [
+    # oid, table, name, method, unique, primary, size, tuples, pages, width, fillfactor, scans, read, fetched
+    (200, 100, "orders_pkey", "btree", True, True, 6 * PAGE, 1200.0, 6, 4, 90, 0, 0, 0),
+    (201, 100, "orders_note", "hash", False, False, 9 * PAGE, 1200.0, 9, 20, 75, 0, 0, 0),
+    # Of a table left out of the schema, e.g. created meanwhile
+    (202, 999, "other_pkey", "btree", True, True, PAGE, 0.0, 1, 4, 90, 5, 5, 5),
+]
+
+def fetch(query, params):
+    if query == BLOCK_SIZE_QUERY:
+        return [(PAGE,)]
+    assert params == {"schema": 10, "schema_name": "public"}
+    if query == SCHEMA_TABLES_HEALTH_QUERY:
+        return TABLES
+    if query == SCHEMA_INDEXES_HEALTH_QUERY:
+        return INDEXES
+    raise AssertionError(query)
+
+def test_estimate_bloat():
+    # 120 tuples of 68 bytes fit a page, so 1200 need 10 of the 15 pages
+    assert estimate_bloat(15, 1200, 36, 100, PAGE, 24) == 5 * PAGE
+    assert estimate_bloat(5, 1200, 36, 100, PAGE, 24) == 0
+    # Unknown until the table has been analyzed
+    assert estimate_bloat(15, 1200, None, 100, PAGE, 24) is None
+    assert estimate_bloat(15, -1, 36, 100, PAGE, 24) is None
+    assert estimate_bloat(0, 0, 36, 100, PAGE, 24) is None
+
+def test_load_schema_health():
+    health = load_schema_health(fetch, 10, "public")
+    assert health.schema == "public"
+    assert list(health.tables) == [100, 101]
+
+    orders = health.tables[100]
+    assert orders.bloat == 5 * PAGE
+    assert round(orders.dead_ratio, 3) == 0.231
+    assert orders.vacuum_candidate
+
+    pkey, note = orders.indexes
+    # The metapage is left out: 367 tuples fit a page, so 1200 need 4 of 5
+    assert pkey.bloat == PAGE
+    assert not pkey.reindex_candidate
+    assert not pkey.unused
+    # Only B-tree bloat is estimated
+    assert note.bloat is None
+    assert note.unused
+    assert orders.wasted == 6 * PAGE
+
+    fresh = health.tables[101]
+    assert fresh.bloat is None and fresh.dead_ratio is None
+    assert not fresh.vacuum_candidate
+    assert fresh.indexes == []
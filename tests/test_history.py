@@ -0,0 +1,58 @@
+import sqlite3
+
+from textgres.history import HistoryEntry, QueryHistory
+from textgres.store import MIGRATIONS, ConnectionStore
+
+def entry(query: str, executed_at: float = 0.0) -> HistoryEntry:
+    return HistoryEntry(query=query, connection_id=1, executed_at=executed_at, duration=0.1, rows=1)
+
+def test_recorded_entries_are_searchable(tmp_path):
+    store = ConnectionStore(tmp_path / "store.db")
+    history = QueryHistory(store)
+    assert history.search("") == []
+
+    history.record(entry("select * from users_archive", 1.0))
+    history.record(entry("update orders set paid = true", 2.0))
+    history.close()
+
+    assert [e.query for e in history.search("")] == [
+        "update orders set paid = true",
+        "select * from users_archive",
+    ]
+    assert [e.query for e in history.search("use sel")] == ["select * from users_archive"]
+    assert history.search("users_arch")[0].rows == 1
+    assert history.search("delete") == []
+    store.close()
+
+def test_searches_share_a_connection(tmp_path):
+    store = ConnectionStore(tmp_path / "store.db")
+    history = QueryHistory(store)
+    history.search("a")
+    reader = history._reader
+    history.search("b")
+    assert history._reader is reader
+
+    history.close()
+    assert history._reader is None
+    store.close()
+
+def test_stores_of_earlier_versions_gain_the_history(tmp_path):
+    path = tmp_path / "store.db"
+    conn = sqlite3.connect(path)
+    for statement in [*MIGRATIONS[0], *MIGRATIONS[1]]:
+        conn.execute(statement)
+    conn.execute("PRAGMA user_version = 2")
+    conn.execute("INSERT INTO connections (name) VALUES ('kept')")
+    conn.commit()
+    conn.close()
+
+    store = ConnectionStore(path)
+    history = QueryHistory(store)
+    history.record(entry("select 1"))
+    history.close()
+
+    assert [e.query for e in history.search("sel")] == ["select 1"]
+    assert [c["name"] for c in store.connections()] == ["kept"]
+    assert store.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    history.close()
+    store.close()
@@ -0,0 +1,100 @@
+import json
+
+from textgres.plan import Plan, explain_statement
+
+def scan(time, loops=1, **extra):
+    return {
+        "Node Type": "Seq Scan",
+        "Relation Name": "t",
+        "Total Cost": 10.0,
+        "Plan Rows": 100,
+        "Actual Rows": 100,
+        "Actual Total Time": time,
+        "Actual Loops": loops,
+        **extra,
+    }
+
+def test_plan_without_analyze_shares_cost():
+    plan = Plan.from_json(json.dumps([{
+        "Plan": {
+            "Node Type": "Hash Join",
+            "Total Cost": 40.0,
+            "Plan Rows": 10,
+            "Plans": [
+                {"Node Type": "Seq Scan", "Total Cost": 10.0, "Plan Rows": 10},
+                {"Node Type": "Index Scan", "Index Name": "t_pkey", "Total Cost": 10.0, "Plan Rows": 1},
+            ],
+        },
+        "Planning Time": 0.5,
+    }]))
+
+    root = plan.root
+    assert not plan.analyzed
+    assert plan.planning_time == 0.5
+    assert root.exclusive_cost == 20.0
+    assert [node.share for node in root.walk()] == [0.5, 0.25, 0.25]
+    assert root.children[1].relation == "t_pkey"
+    assert root.inclusive_time is None and not root.executed
+
+def test_analyzed_plan_times_are_exclusive_of_children_and_summed_over_loops():
+    plan = Plan.from_json([{
+        "Plan": {
+            "Node Type": "Nested Loop",
+            "Total Cost": 100.0,
+            "Plan Rows": 100,
+            "Actual Rows": 100,
+            "Actual Total Time": 10.0,
+            "Actual Loops": 1,
+            "Plans": [scan(2.0), scan(0.06, loops=100)],
+        },
+        "Execution Time": 10.5,
+    }])
+
+    root, outer, inner = plan.root.walk()
+    assert plan.analyzed
+    assert plan.execution_time == 10.5
+    assert inner.inclusive_time == 6.0
+    assert root.exclusive_time == 2.0
+    assert [node.share for node in plan.root.walk()] == [0.2, 0.2, 0.6]
+
+def test_parallel_times_count_once_for_processes_running_together():
+    # Two workers and the leader each scanned for about 90ms, averaged per
+    # loop, while the Gather took 100ms in all
+    plan = Plan.from_json([{
+        "Plan": {
+            "Node Type": "Gather",
+            "Total Cost": 100.0,
+            "Plan Rows": 300,
+            "Workers Launched": 2,
+            "Actual Rows": 300,
+            "Actual Total Time": 100.0,
+            "Actual Loops": 1,
+            "Plans": [{
+                "Node Type": "Hash Join",
+                "Total Cost": 90.0,
+                "Plan Rows": 100,
+                "Actual Rows": 100,
+                "Actual Total Time": 90.0,
+                "Actual Loops": 3,
+                "Plans": [scan(60.0, loops=3), scan(0.01, loops=300)],
+            }],
+        },
+    }])
+
+    gather, join, outer, inner = plan.root.walk()
+    assert join.inclusive_time == 90.0
+    assert outer.inclusive_time == 60.0
+    assert inner.inclusive_time == 1.0
+    assert gather.exclusive_time == 10.0
+    assert join.exclusive_time == 29.0
+    assert sum(node.exclusive_time for node in plan.root.walk()) == gather.inclusive_time
+
+def test_flags_seq_scans_and_misestimates():
+    plan = Plan.from_json([{"Plan": scan(1.0, **{"Plan Rows": 5, "Rows Removed by Filter": 2000})}])
+    assert plan.root.seq_scan
+    assert plan.root.misestimate == 20.0
+    assert plan.root.flags == ["seq scan, filter removed 2,000 rows", "rows underestimated 20×"]
+
+def test_explain_statement():
+    assert explain_statement("select 1;\n", False) == "EXPLAIN (FORMAT JSON) select 1"
+    assert explain_statement("select 1", True) == "EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS) select 1"
@@ -0,0 +1,199 @@
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import PoolError
+
+from textgres import pool
+from textgres.pool import ConnectionPool
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConn") -> None:
+        self.conn = conn
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def execute(self, query: str) -> None:
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+class FakeConn:
+    def __init__(self) -> None:
+        self.closed = 0
+        self.broken = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def get_transaction_status(self) -> int:
+        return self.status
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pool, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def opened():
+    return []
+
+@pytest.fixture
+def connect(opened):
+    def connect() -> FakeConn:
+        conn = FakeConn()
+        opened.append(conn)
+        return conn
+    return connect
+
+def test_returned_connections_are_reused(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=1, maxconn=2)
+    assert len(opened) == 1
+
+    conn = connections.getconn()
+    assert conn is opened[0]
+    connections.putconn(conn)
+    assert connections.getconn() is conn
+    assert len(opened) == 1
+
+def test_connections_are_opened_up_to_maxconn(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=0, maxconn=2)
+    first, second = connections.getconn(), connections.getconn()
+    assert first is not second
+    assert connections.size == 2
+    with pytest.raises(PoolError, match="exhausted"):
+        connections.getconn(timeout=0.01)
+
+    connections.putconn(first)
+    assert connections.getconn(timeout=0.01) is first
+
+def test_failed_connects_free_their_slot(clock, opened):
+    def connect():
+        raise psycopg2.OperationalError("could not connect to server")
+
+    connections = ConnectionPool(connect, minconn=0, maxconn=1)
+    with pytest.raises(psycopg2.OperationalError):
+        connections.getconn()
+    assert connections.size == 0
+
+def test_open_transactions_are_rolled_back_when_returned(clock, connect):
+    connections = ConnectionPool(connect, minconn=0)
+    conn = connections.getconn()
+    conn.status = TRANSACTION_STATUS_INTRANS
+    connections.putconn(conn)
+    assert conn.rollbacks == 1
+    assert not conn.closed
+    assert connections.getconn() is conn
+
+def test_connections_in_an_unknown_state_are_closed_when_returned(clock, connect):
+    connections = ConnectionPool(connect, minconn=0)
+    conn = connections.getconn()
+    conn.status = TRANSACTION_STATUS_UNKNOWN
+    connections.putconn(conn)
+    assert conn.closed
+    assert connections.size == 0
+
+def test_stale_broken_connections_are_replaced(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=1)
+    opened[0].broken = True
+
+    # Not checked until it has been idle for a while
+    assert connections.getconn() is opened[0]
+    connections.putconn(opened[0])
+    clock.now += pool.HEALTH_CHECK_INTERVAL + 1
+    conn = connections.getconn()
+    assert conn is opened[1]
+    assert opened[0].closed
+
+def test_idle_connections_beyond_minconn_are_evicted(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=1, maxconn=3, max_idle=60.0)
+    borrowed = [connections.getconn() for _ in range(3)]
+    for conn in borrowed:
+        connections.putconn(conn)
+    assert connections.size == 3
+
+    clock.now += 61
+    connections.evict_idle()
+    assert connections.size == 1
+    # The most recently returned connection is kept
+    assert [conn.closed for conn in borrowed] == [1, 1, 0]
+
+def test_closeall_closes_borrowed_connections(clock, connect):
+    connections = ConnectionPool(connect, minconn=0)
+    borrowed, idle = connections.getconn(), connections.getconn()
+    connections.putconn(idle)
+    connections.closeall()
+
+    assert borrowed.closed and idle.closed
+    with pytest.raises(PoolError, match="closed"):
+        connections.getconn()
+
+def test_probe_replaces_broken_idle_connections(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=2)
+    opened[0].broken = True
+    connections.probe()
+
+    assert opened[0].closed
+    assert connections.size == 2
+    assert not connections.health.down
+    assert connections.health.latency is not None
+
+    # Probed connections aren't checked again when borrowed
+    opened[1].broken = True
+    clock.now += pool.HEALTH_CHECK_INTERVAL - 1
+    assert opened[1] in [connections.getconn(), connections.getconn()]
+
+def test_probe_backs_off_while_the_server_is_down(clock, connect, opened):
+    connections = ConnectionPool(connect, minconn=1)
+    opened[0].broken = True
+    down = [True]
+
+    def reconnect():
+        if down[0]:
+            raise psycopg2.OperationalError("could not connect to server")
+        return connect()
+
+    connections._connect = reconnect
+    connections.probe()
+    assert connections.health.failures == 1
+    assert connections.health.retry_at == clock.now + pool.RECONNECT_BACKOFF
+    assert connections.size == 0
+
+    # Not tried again until the backoff has passed, which then doubles
+    connections.probe()
+    assert connections.health.failures == 1
+    clock.now += pool.RECONNECT_BACKOFF
+    connections.probe()
+    assert connections.health.failures == 2
+    assert connections.health.retry_at == clock.now + 2 * pool.RECONNECT_BACKOFF
+
+    for _ in range(10):
+        clock.now = connections.health.retry_at
+        connections.probe()
+    assert connections.health.retry_at - clock.now == pool.RECONNECT_BACKOFF_MAX
+
+    down[0] = False
+    clock.now = connections.health.retry_at
+    connections.probe()
+    assert not connections.health.down
+    assert connections.health.error is None
+    assert connections.size == 1
@@ -0,0 +1,92 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from textgres.result_buffer import (
+    BoolColumn,
+    ColumnarBuffer,
+    DateColumn,
+    DatetimeColumn,
+    FloatColumn,
+    IntColumn,
+    ObjectColumn,
+    TextColumn,
+)
+
+ROWS = [
+    (1, 1.5, True, date(2024, 1, 31), datetime(2024, 1, 31, 12, 30, 1, 5), "héllo", Decimal("1.10")),
+    (None, None, None, None, None, None, None),
+    (-(1 << 62), -0.25, False, date(1, 1, 1), datetime(1969, 12, 31, 23, 59, 59), "", {"a": [1]}),
+]
+
+def test_buffer_round_trips_rows():
+    buffer = ColumnarBuffer(["i", "f", "b", "d", "ts", "t", "o"])
+    buffer.extend(ROWS[:1])
+    buffer.extend(ROWS[1:])
+
+    assert len(buffer) == 3
+    assert [buffer.row(i) for i in range(3)] == ROWS
+    assert [type(column) for column in buffer.columns] == [
+        IntColumn,
+        FloatColumn,
+        BoolColumn,
+        DateColumn,
+        DatetimeColumn,
+        TextColumn,
+        ObjectColumn,
+    ]
+    assert buffer.get(0, 5) == "héllo"
+
+def test_buffer_keeps_the_time_zone_of_aware_timestamps():
+    zone = timezone(timedelta(hours=2))
+    values = [datetime(2024, 5, 1, 8, tzinfo=zone), datetime(2024, 5, 1, 9, tzinfo=zone)]
+    buffer = ColumnarBuffer(["ts"])
+    buffer.extend([(value,) for value in values])
+
+    assert isinstance(buffer.columns[0], DatetimeColumn)
+    assert [buffer.get(i, 0) for i in range(2)] == values
+    assert buffer.get(0, 0).utcoffset() == timedelta(hours=2)
+
+def test_column_types_are_chosen_after_leading_nulls():
+    buffer = ColumnarBuffer(["n"])
+    buffer.extend([(None,), (None,)])
+    assert buffer.columns[0] is None
+    assert buffer.column(0).get(1) is None
+
+    buffer.extend([(3,)])
+    assert isinstance(buffer.columns[0], IntColumn)
+    assert [buffer.get(i, 0) for i in range(3)] == [None, None, 3]
+
+def test_columns_fall_back_to_objects_for_values_that_dont_fit():
+    buffer = ColumnarBuffer(["n", "ts", "t"])
+    buffer.extend([(1, datetime(2024, 1, 1), "a")])
+    buffer.extend([
+        (1 << 70, datetime(2024, 1, 1, tzinfo=timezone.utc), 5),
+        ("x", None, None),
+    ])
+
+    assert all(isinstance(column, ObjectColumn) for column in buffer.columns)
+    assert buffer.row(0) == (1, datetime(2024, 1, 1), "a")
+    assert buffer.row(1) == (1 << 70, datetime(2024, 1, 1, tzinfo=timezone.utc), 5)
+    assert buffer.row(2) == ("x", None, None)
+
+def test_column_statistics_skip_nulls():
+    buffer = ColumnarBuffer(["i", "t"])
+    buffer.extend([(3, "b"), (None, None), (1, "a"), (3, "b")])
+
+    ints, texts = buffer.columns
+    assert (ints.min(), ints.max(), ints.distinct_count()) == (1, 3, 2)
+    assert (texts.min(), texts.max(), texts.distinct_count()) == ("a", "b", 2)
+    assert ints.sort_indices() == [2, 0, 3, 1]
+    assert ints.sort_indices(reverse=True) == [0, 3, 2, 1]
+
+def test_object_columns_sort_mixed_values():
+    buffer = ColumnarBuffer(["v"])
+    buffer.extend([(Decimal("1.5"),), ("b",), ({"k": 1},), (date(2024, 1, 1),), (2,), (datetime(2024, 1, 1),), ("a",)])
+    column = buffer.columns[0]
+
+    assert isinstance(column, ObjectColumn)
+    assert [column.get(i) for i in column.sort_indices()] == [
+        Decimal("1.5"), 2, "a", "b", date(2024, 1, 1), datetime(2024, 1, 1), {"k": 1},
+    ]
+    assert column.min() == Decimal("1.5")
+    assert column.max() == {"k": 1}
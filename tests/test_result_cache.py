@@ -0,0 +1,85 @@
+import os
+import time
+from decimal import Decimal
+
+import pytest
+
+from textgres.export import COLUMNAR_MAGIC
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_cache import ResultCache
+
+COLUMNS = ["id", "name", "amount"]
+
+def make_buffer(rows: int) -> ColumnarBuffer:
+    buffer = ColumnarBuffer(COLUMNS)
+    buffer.extend([(i, "row {}".format(i), None if i % 3 else Decimal("1.5")) for i in range(rows)])
+    return buffer
+
+def wait_for_spill(cache: ResultCache, count: int = 1) -> None:
+    deadline = time.monotonic() + 5
+    while len(cache._spilled) < count:
+        assert time.monotonic() < deadline, "the result was never spilled"
+        time.sleep(0.01)
+
+@pytest.fixture
+def cache(tmp_path):
+    # Room for a single result in memory
+    return ResultCache(memory_budget=make_buffer(100).nbytes + 1, spill_dir=str(tmp_path))
+
+def test_get_returns_a_fresh_result(cache):
+    cache.put(1, "select 1", COLUMNS, make_buffer(10))
+    assert len(cache.get(1, "select  1;", ttl=60).buffer) == 10
+    assert cache.get(2, "select 1", ttl=60) is None
+
+def test_evicted_results_are_spilled_as_columnar_files_and_read_back(cache, tmp_path):
+    cache.put(1, "select 1", COLUMNS, make_buffer(100))
+    cache.put(1, "select 2", COLUMNS, make_buffer(100))
+    wait_for_spill(cache)
+
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].endswith(".tgcol")
+    with open(tmp_path / files[0], "rb") as file:
+        assert file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+    result = cache.get(1, "select 1", ttl=60)
+    assert result.columns == COLUMNS
+    assert result.buffer.row(0) == (0, "row 0", Decimal("1.5"))
+    assert result.buffer.row(1) == (1, "row 1", None)
+    assert len(result.buffer) == 100
+
+def test_spill_started_before_an_invalidation_is_dropped(cache, tmp_path):
+    buffer = make_buffer(100)
+    cache.put(1, "select 1", COLUMNS, buffer)
+    with cache._lock:
+        result = cache._entries.pop(cache.key(1, "select 1"))
+        generation = cache._generation(1)
+
+    # A write on the connection invalidates its results while the evicted
+    # one is still being written
+    cache.invalidate(1)
+    cache._spill([(cache.key(1, "select 1"), result, generation)])
+
+    assert cache.get(1, "select 1", ttl=60) is None
+    assert os.listdir(tmp_path) == []
+
+def test_invalidate_removes_spilled_results(cache, tmp_path):
+    cache.put(1, "select 1", COLUMNS, make_buffer(100))
+    cache.put(2, "select 2", COLUMNS, make_buffer(100))
+    wait_for_spill(cache)
+
+    cache.invalidate(1)
+    assert cache.get(1, "select 1", ttl=60) is None
+    assert os.listdir(tmp_path) == []
+
+def test_results_which_cant_be_spilled_exactly_are_dropped(cache, tmp_path):
+    buffer = ColumnarBuffer(["v"])
+    buffer.extend([(complex(1, 2),)])
+    cache.put(1, "select 1", ["v"], buffer)
+    with cache._lock:
+        result = cache._entries.pop(cache.key(1, "select 1"))
+        generation = cache._generation(1)
+
+    cache._spill([(cache.key(1, "select 1"), result, generation)])
+
+    assert cache.get(1, "select 1", ttl=60) is None
+    assert os.listdir(tmp_path) == []
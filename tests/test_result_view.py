@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+import pytest
+
+from textgres.result_buffer import ColumnarBuffer
+from textgres.result_view import Predicate, ResultView, parse_filter
+
+NAMES = ["id", "name", "score"]
+
+ROWS = [
+    (1, "Alice Smith", 3.5),
+    (2, "bob", None),
+    (3, "Carol SMITH", 1.0),
+    (4, None, 2.0),
+]
+
+def make_view() -> ResultView:
+    buffer = ColumnarBuffer(NAMES)
+    buffer.extend(ROWS)
+    return ResultView(buffer)
+
+def view_rows(view: ResultView, sort=None, filters=()) -> list[int]:
+    view.apply(sort, list(filters), view.compute(sort, list(filters)))
+    return [view.buffer.get(view.buffer_row(i), 0) for i in range(len(view))]
+
+def test_parse_filter():
+    assert parse_filter("""ID >= 2 and "name" ~ 'o''b' AND score is not null""", NAMES) == [
+        Predicate(0, ">=", "2"),
+        Predicate(1, "~", "o'b"),
+        Predicate(2, "is not null"),
+    ]
+    assert parse_filter("name <> bob", NAMES) == [Predicate(1, "!=", "bob")]
+
+@pytest.mark.parametrize("text", ["missing = 1", "id", "= 1"])
+def test_parse_filter_rejects_bad_clauses(text):
+    with pytest.raises(ValueError):
+        parse_filter(text, NAMES)
+
+def test_sorting_puts_nulls_last_in_both_directions():
+    view = make_view()
+    assert view_rows(view, sort=(2, False)) == [3, 4, 1, 2]
+    assert view_rows(view, sort=(2, True)) == [1, 4, 3, 2]
+    assert view_rows(view, sort=(1, False)) == [1, 3, 2, 4]
+
+def test_no_sort_or_filter_shows_the_rows_as_loaded():
+    view = make_view()
+    assert view_rows(view) == [1, 2, 3, 4]
+    assert not view.active
+
+def test_filters_compare_as_the_column_type_and_skip_nulls():
+    view = make_view()
+    assert view_rows(view, filters=parse_filter("score > 1.5", NAMES)) == [1, 4]
+    assert view_rows(view, filters=parse_filter("id != 2 and score < 3", NAMES)) == [3, 4]
+    assert view_rows(view, filters=parse_filter("name is null", NAMES)) == [4]
+    assert view_rows(view, filters=parse_filter("name ~ smith", NAMES)) == [1, 3]
+    assert view_rows(view, filters=parse_filter("name !~ smith", NAMES)) == [2]
+
+def test_filters_and_sort_combine():
+    view = make_view()
+    rows = view_rows(view, sort=(0, True), filters=parse_filter("name ~ smith", NAMES))
+    assert rows == [3, 1]
+
+def test_filter_values_must_fit_the_column():
+    view = make_view()
+    with pytest.raises(ValueError):
+        view.compute(None, parse_filter("id = abc", NAMES))
+
+def test_search_finds_rows_in_view_order():
+    view = make_view()
+    mask = view.search("SMITH")
+    assert list(mask) == [1, 0, 1, 0]
+
+    view_rows(view, sort=(0, True))
+    # Row 0 of the view is id 4, so the first match is id 3 at row 1
+    assert view.find(mask, 0) == 1
+    assert view.find(mask, 2) == 3
+    assert view.find(mask, 2, backward=True) == 1
+    assert view.find(view.search("nobody"), 0) is None
+
+def test_search_matches_formatted_numbers():
+    view = make_view()
+    assert list(view.search("3.5")) == [1, 0, 0, 0]
+
+def test_sorting_and_filtering_mixed_object_columns():
+    buffer = ColumnarBuffer(["v"])
+    buffer.extend([(Decimal("2.5"),), ("text",), ({"a": 1},), (Decimal("-1"),), ([1, "x"],), (None,)])
+    view = ResultView(buffer)
+
+    ordered = [buffer.get(i, 0) for i in view.compute((0, False), [])]
+    assert ordered == [Decimal("-1"), Decimal("2.5"), "text", [1, "x"], {"a": 1}, None]
+    ordered = [buffer.get(i, 0) for i in view.compute((0, True), [])]
+    assert ordered == [{"a": 1}, [1, "x"], "text", Decimal("2.5"), Decimal("-1"), None]
+
+    rows = view.compute(None, parse_filter("v < 2", ["v"]))
+    assert [buffer.get(i, 0) for i in rows] == [Decimal("-1")]
@@ -0,0 +1,90 @@
+import asyncio
+
+from textual.app import App, ComposeResult
+
+from textgres.widgets.results.results_table import ResultsTable
+
+class FakeStream:
+    def __init__(self, rows: int, itersize: int = 100) -> None:
+        self.columns = ["n", "label"]
+        self.rowcount = -1
+        self.itersize = itersize
+        self._rows = [(n, "row {}".format(n)) for n in range(rows)]
+        self.exhausted = False
+        self.on_complete = None
+        self.fetches = 0
+
+    def fetch(self) -> list[tuple]:
+        self.fetches += 1
+        rows, self._rows = self._rows[:self.itersize], self._rows[self.itersize:]
+        self.exhausted = not self._rows
+        return rows
+
+    def close(self) -> None:
+        pass
+
+class TableApp(App):
+    def compose(self) -> ComposeResult:
+        yield ResultsTable()
+
+def line(table: ResultsTable, y: int) -> str:
+    return "".join(segment.text for segment in table.render_line(y)).strip()
+
+def run(test) -> None:
+    async def main():
+        app = TableApp()
+        async with app.run_test(size=(60, 20)) as pilot:
+            await test(pilot, app.query_one(ResultsTable))
+    asyncio.run(main())
+
+def test_rows_are_fetched_as_the_cursor_nears_the_end():
+    async def test(pilot, table):
+        stream = FakeStream(1000)
+        table.load_stream(stream)
+        await pilot.pause()
+        assert table.row_count == 100
+        assert stream.fetches == 1
+        # One line for the header
+        assert table.virtual_size.height == 101
+
+        await pilot.press("end")
+        await table.workers.wait_for_complete()
+        await pilot.pause()
+        assert table.row_count == 200
+        assert table.cursor_row == 99
+
+        while not table.source.exhausted:
+            await pilot.press("end")
+            await table.workers.wait_for_complete()
+            await pilot.pause()
+        assert table.row_count == 1000
+        assert stream.fetches == 10
+    run(test)
+
+def test_only_the_viewport_is_rendered():
+    async def test(pilot, table):
+        table.load_stream(FakeStream(300, itersize=300))
+        await pilot.pause()
+        assert line(table, 0).split() == ["n", "label"]
+        assert line(table, 1).split() == ["0", "row", "0"]
+
+        table.scroll_to(y=250, animate=False)
+        await pilot.pause()
+        assert line(table, 1).split() == ["250", "row", "250"]
+        # Past the last row
+        assert line(table, 60) == ""
+    run(test)
+
+def test_column_widths_only_grow():
+    async def test(pilot, table):
+        stream = FakeStream(2000, itersize=1000)
+        table.load_stream(stream)
+        await pilot.pause()
+        assert table.column_widths == [len("999"), len("row 999")]
+
+        table.fetch_page()
+        await table.workers.wait_for_complete()
+        await pilot.pause()
+        assert table.column_widths == [len("1999"), len("row 1999")]
+        assert table.numeric_columns == {0}
+    run(test)
@@ -0,0 +1,44 @@
+from textgres.result_buffer import ColumnarBuffer
+from textgres.row_source import RowSource
+
+class FakeStream:
+    def __init__(self, rows: int, itersize: int = 10) -> None:
+        self.columns = ["n"]
+        self.rowcount = -1
+        self.itersize = itersize
+        self._rows = [(n,) for n in range(rows)]
+        self.exhausted = False
+        self.closed = False
+        self.completed = None
+        self.on_complete = lambda buffer: setattr(self, "completed", buffer)
+
+    def fetch(self) -> list[tuple]:
+        rows, self._rows = self._rows[:self.itersize], self._rows[self.itersize:]
+        self.exhausted = not self._rows
+        return rows
+
+    def close(self) -> None:
+        self.closed = True
+
+def test_every_row_is_buffered_under_the_limit():
+    stream = FakeStream(25)
+    source = RowSource(stream, limit=100)
+    while not source.exhausted:
+        source.fetch_page()
+
+    assert len(source) == 25
+    assert not source.truncated
+    assert isinstance(stream.completed, ColumnarBuffer)
+
+def test_fetching_stops_at_the_limit():
+    stream = FakeStream(1000)
+    source = RowSource(stream, limit=25)
+    while not source.exhausted:
+        source.fetch_page()
+
+    assert len(source) == 25
+    assert source.row(24) == (24,)
+    assert source.truncated
+    assert stream.closed
+    # Only complete results are cached
+    assert stream.completed is None
@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+import psycopg2
+import pytest
+
+from textgres.script import plan_batches, run_script
+
+Column = namedtuple("Column", "name type_code")
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = 0
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        if self.name and self.conn.autocommit:
+            # As psycopg2, which can't declare a cursor outside a transaction
+            raise psycopg2.ProgrammingError("can't use a named cursor outside of transactions")
+        self.conn.executed.append((statement, self.conn.autocommit))
+        if "fail" in statement:
+            raise psycopg2.DataError("failed")
+        if statement.startswith("select"):
+            self.description = [Column("n", 23)]
+            self._rows = [(1,), (2,)]
+        self.rowcount = len(self._rows) if self.description else 1
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+class FakeConn:
+    closed = False
+
+    def __init__(self):
+        self._autocommit = False
+        self.in_transaction = False
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.in_transaction:
+            raise psycopg2.ProgrammingError("set_session cannot be used inside a transaction")
+        self._autocommit = value
+
+    def cursor(self, name=None):
+        if not self._autocommit:
+            self.in_transaction = True
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+def test_plan_batches_keeps_row_returning_statements_apart():
+    statements = ["insert 1", "insert 2", "select 1", "insert 3", "insert 4"]
+    assert plan_batches(statements, batch=True) == [[0, 1], [2], [3, 4]]
+    assert plan_batches(statements, batch=False) == [[0], [1], [2], [3], [4]]
+
+def test_transaction_commits_once_at_the_end():
+    conn = FakeConn()
+    results = run_script(conn, ["insert 1", "select 1", "insert 2"])
+    assert [autocommit for _, autocommit in conn.executed] == [False, False, False]
+    assert conn.commits == 1
+    assert results[1].rowcount == 2
+    assert all(result.executed and result.error is None for result in results)
+
+def test_transaction_stops_and_rolls_back_on_error():
+    conn = FakeConn()
+    results = run_script(conn, ["insert 1", "fail", "insert 2"])
+    assert conn.commits == 0
+    assert results[1].error is not None
+    assert not results[2].executed
+
+def test_autocommit_runs_statements_outside_a_transaction_block():
+    conn = FakeConn()
+    results = run_script(conn, ["vacuum t", "select 1", "create index concurrently i on t (a)"], autocommit=True)
+    assert conn.executed == [
+        ("vacuum t", True),
+        # Queries are declared in a short transaction of their own
+        ("select 1", False),
+        ("create index concurrently i on t (a)", True),
+    ]
+    assert results[1].rowcount == 2
+    assert all(result.error is None for result in results)
+    # The session goes back to its pool as it was lent
+    assert conn.autocommit is False
+
+def test_autocommit_failed_batch_is_reported_on_each_of_its_statements():
+    conn = FakeConn()
+    results = run_script(conn, ["insert 1", "fail", "insert 2", "select 1"], autocommit=True, batch=True)
+    assert [result.batch for result in results] == [0, 0, 0, None]
+    assert all(result.error is not None for result in results[:3])
+    assert not results[3].executed
+    assert conn.autocommit is False
+
+@pytest.mark.parametrize("autocommit", [False, True])
+def test_session_mode_is_restored_after_an_error(autocommit):
+    conn = FakeConn()
+    conn.autocommit = True
+    run_script(conn, ["fail"], autocommit=autocommit)
+    assert conn.autocommit is True
@@ -0,0 +1,79 @@
+import pytest
+
+from textgres.sql import is_read_only, normalize_query, returns_rows, split_statements
+
+def test_split_at_semicolons():
+    assert split_statements("select 1; select 2;\n\n") == ["select 1", "select 2"]
+
+def test_split_drops_empty_and_comment_only_statements():
+    assert split_statements("select 1;; -- done\n;/* nothing */") == ["select 1"]
+
+@pytest.mark.parametrize("script, expected", [
+    ("select 'a;b'; select 2", ["select 'a;b'", "select 2"]),
+    ("select 'it''s;'; select 2", ["select 'it''s;'", "select 2"]),
+    ("select \"a;b\" from t; select 2", ["select \"a;b\" from t", "select 2"]),
+    ("select 1 -- a; comment\n; select 2", ["select 1 -- a; comment", "select 2"]),
+    ("select /* a; b */ 1; select 2", ["select /* a; b */ 1", "select 2"]),
+])
+def test_split_ignores_semicolons_in_literals_and_comments(script, expected):
+    assert split_statements(script) == expected
+
+def test_split_handles_backslash_escapes_in_e_strings():
+    assert split_statements("select E'\\';'; select 2") == ["select E'\\';'", "select 2"]
+    assert split_statements("select e'a\\\\'; select 2") == ["select e'a\\\\'", "select 2"]
+
+def test_backslashes_in_standard_strings_are_literal():
+    assert split_statements("select 'a\\'; select 2") == ["select 'a\\'", "select 2"]
+
+def test_split_keeps_dollar_quoted_bodies_whole():
+    function = (
+        "create function f() returns int as $body$\n"
+        "begin\n  perform 1; return 2;\nend;\n$body$ language plpgsql"
+    )
+    assert split_statements(function + "; select $$a;b$$") == [function, "select $$a;b$$"]
+
+def test_split_keeps_begin_atomic_bodies_whole():
+    function = (
+        "create function f(a int) returns int language sql begin atomic\n"
+        "  select case when a > 0 then 1 else 0 end;\n"
+        "  select 2;\n"
+        "end"
+    )
+    assert split_statements(function + "; select 3") == [function, "select 3"]
+
+@pytest.mark.parametrize("query", [
+    "select * from t",
+    "  SELECT 1;",
+    "with a as (select 1) select * from a",
+    "values (1)",
+    "table t",
+    "select 'insert into t' from t",
+    "show search_path",
+    # A single literal, as the backslash escapes the quote
+    "select E'\\'; delete from t; select '",
+])
+def test_read_only(query):
+    assert is_read_only(query)
+
+@pytest.mark.parametrize("query", [
+    "insert into t values (1)",
+    "select * into u from t",
+    "select * from t for update",
+    "select * from t for no key update",
+    "select nextval('s')",
+    "with d as (delete from t returning *) select * from d",
+    "select 1; delete from t",
+    # The escaped backslash doesn't escape the quote
+    "select E'\\\\'; delete from t",
+    "",
+])
+def test_not_read_only(query):
+    assert not is_read_only(query)
+
+def test_normalize_query_ignores_formatting():
+    assert normalize_query("select  1 -- why\n from t;") == normalize_query("select 1 from t")
+
+def test_returns_rows():
+    assert returns_rows("select 1")
+    assert returns_rows("insert into t values (1) returning id")
+    assert not returns_rows("insert into t values (1)")
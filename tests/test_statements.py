@@ -0,0 +1,86 @@
+import pytest
+
+from textgres.connection import Connection
+from textgres.statements import StatementCounters, StatementsUnavailable, counters_delta
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        if "pg_extension" in query:
+            self._rows = [(1,)] if self.conn.installed else []
+        elif "pg_stat_statements(false)" in query:
+            self._rows = [(10, 1, 42, self.conn.calls, self.conn.calls * 2.0, self.conn.calls, 0, 0, 0)]
+        else:
+            self._rows = [(10, 1, 42, "select 1")]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+class FakeConn:
+    server_version = 160000
+    autocommit = False
+    closed = False
+
+    def __init__(self, installed=True):
+        self.installed = installed
+        self.calls = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+def sampled_connection(conn: FakeConn, monkeypatch) -> Connection:
+    monkeypatch.setattr(Connection, "open", lambda self: conn)
+    return Connection(id=1, name="test")
+
+def test_counters_delta_treats_a_reset_as_new():
+    previous = StatementCounters(calls=10, total_time=5.0)
+    assert counters_delta(StatementCounters(calls=12, total_time=6.0), previous).calls == 2
+    assert counters_delta(StatementCounters(calls=3, total_time=1.0), previous).calls == 3
+
+def test_sampler_belongs_to_the_connection_and_keeps_its_window(monkeypatch):
+    conn = FakeConn()
+    connection = sampled_connection(conn, monkeypatch)
+    sampler = connection.statements
+    assert connection.statements is sampler
+
+    sampler.start()
+    assert sampler.sample() is None
+    assert sampler.has_baseline
+    conn.calls = 5
+    sampler.sample()
+    conn.calls = 8
+    sampler.sample()
+
+    # A later view of the same connection reads the samples already taken
+    activity = connection.statements.window(900.0)
+    assert [entry.totals.calls for entry in activity] == [8]
+    assert activity[0].series == [10.0, 6.0]
+    assert activity[0].query == "select 1"
+
+    connection.disconnect()
+    assert conn.closed
+    assert connection.statements is not sampler
+
+def test_sampler_stops_without_the_extension(monkeypatch):
+    connection = sampled_connection(FakeConn(installed=False), monkeypatch)
+    sampler = connection.statements
+    sampler.start()
+    with pytest.raises(StatementsUnavailable):
+        sampler.sample()
+    assert not sampler.active
+    assert isinstance(sampler.error, StatementsUnavailable)
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from textgres.store import MIGRATIONS, ConnectionStore
+
+DEFAULTS = {
+    "host": "localhost", "port": 5432, "database": "postgres", "username": "postgres", "password": "",
+    "statement_timeout": 0, "lock_timeout": 0, "result_cache_ttl": 0,
+}
+
+def values(name: str, **fields) -> dict:
+    return {**DEFAULTS, "name": name, **fields}
+
+def test_new_stores_are_fully_migrated(tmp_path):
+    store = ConnectionStore(tmp_path / "store.db")
+    assert store.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert store.connections() == []
+    store.close()
+
+def test_every_version_migrates_to_the_latest(tmp_path):
+    for version in range(len(MIGRATIONS)):
+        path = tmp_path / "store-{}.db".format(version)
+        conn = sqlite3.connect(path)
+        for statements in MIGRATIONS[:version]:
+            for statement in statements:
+                conn.execute(statement)
+        conn.execute("PRAGMA user_version = {:d}".format(version))
+        conn.commit()
+        conn.close()
+
+        store = ConnectionStore(path)
+        assert store.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        store.save(values("local"))
+        assert [c["name"] for c in store.connections()] == ["local"]
+        store.close()
+
+def test_save_many_updates_connections_by_name(tmp_path):
+    store = ConnectionStore(tmp_path / "store.db")
+    id = store.save(values("local"))
+    store.save_snapshot(id, "fingerprint", "{}")
+
+    assert store.save_many([values("local", port=6432), values("reports")]) == (1, 1)
+    assert [(c["id"], c["name"], c["port"]) for c in store.connections()] == [
+        (id, "local", 6432),
+        (id + 1, "reports", 5432),
+    ]
+    # The updated connection may point at another database
+    assert store.snapshot(id) is None
+    store.close()
+
+def test_save_many_rejects_duplicate_names(tmp_path):
+    store = ConnectionStore(tmp_path / "store.db")
+    with pytest.raises(ValueError, match="'local'"):
+        store.save_many([values("local"), values("reports"), values("local", port=6432)])
+    assert store.connections() == []
+    store.close()